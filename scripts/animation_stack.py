@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""Animation frames as one (N, H, W, 4) uint8 array, cached as a memory-mapped .npy.
+
+A frame folder such as frames_dir/<anim>/raw gets a sibling cache frames_dir/<anim>/raw.npy
+plus raw.stack.json (frame labels and the name/mtime/size of every PNG it was built from).
+Later stages call load_stack() and read frames straight out of the mapping instead of
+decoding the PNGs again; the cache is rebuilt whenever the folder no longer matches.
+PNGs stay the interchange format at the edges (ffmpeg output, fal uploads, game sprites).
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+from PIL import Image
+
+STACK_VERSION = 1
+
+
+@dataclass(frozen=True)
+class AnimationStack:
+    labels: tuple[int, ...]
+    # (N, H, W, 4) uint8; read-only np.memmap when loaded from the cache.
+    frames: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return (int(self.frames.shape[2]), int(self.frames.shape[1]))
+
+    def index(self, label: int) -> int:
+        try:
+            return self.labels.index(label)
+        except ValueError:
+            raise SystemExit(f"Frame label not found: {label}") from None
+
+    def frame(self, label: int) -> np.ndarray:
+        """(H, W, 4) view of one frame; no copy is made."""
+        return self.frames[self.index(label)]
+
+    def image(self, label: int) -> Image.Image:
+        return Image.fromarray(self.frame(label), "RGBA")
+
+    def export_png(self, label: int, dest: Path) -> None:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(f".{dest.name}.{os.getpid()}.tmp.png")
+        self.image(label).save(tmp)
+        tmp.replace(dest)
+
+
+def frame_label(path: Path) -> int:
+    match = re.search(r"(\d+)", path.stem)
+    return int(match.group(1)) if match else 0
+
+
+def stack_paths(frame_dir: Path) -> tuple[Path, Path]:
+    """(array, sidecar) cache paths next to the frame folder."""
+    return (
+        frame_dir.parent / f"{frame_dir.name}.npy",
+        frame_dir.parent / f"{frame_dir.name}.stack.json",
+    )
+
+
+def frame_files(frame_dir: Path) -> list[Path]:
+    if not frame_dir.is_dir():
+        raise SystemExit(f"Frame folder not found: {frame_dir}")
+    files = sorted(
+        [p for p in frame_dir.iterdir() if p.suffix.lower() == ".png" and not p.name.startswith(".")],
+        key=frame_label,
+    )
+    if not files:
+        raise SystemExit(f"No PNG frames found in {frame_dir}")
+    labels = [frame_label(p) for p in files]
+    if len(set(labels)) != len(labels):
+        raise SystemExit(f"Duplicate frame numbers in {frame_dir}")
+    return files
+
+
+def _fingerprint(files: list[Path]) -> list[list]:
+    out = []
+    for p in files:
+        stat = p.stat()
+        out.append([p.name, stat.st_mtime_ns, stat.st_size])
+    return out
+
+
+def write_stack(
+    frame_dir: Path, files: list[Path], size: tuple[int, int], frames: Iterable[Image.Image]
+) -> AnimationStack:
+    """Stream frames into the cache for frame_dir; `files` must exist once `frames` is exhausted.
+
+    Frames are written into the mapped file one at a time, so the whole animation is never
+    held in memory.
+    """
+    array_path, _ = stack_paths(frame_dir)
+    width, height = size
+    tmp = array_path.with_name(f".{array_path.name}.{os.getpid()}.tmp.npy")
+    out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.uint8, shape=(len(files), height, width, 4))
+    try:
+        count = 0
+        for i, img in enumerate(frames):
+            if img.size != size:
+                raise SystemExit(f"Frame size mismatch in {frame_dir}: {files[i].name} is {img.size}, expected {size}")
+            out[i] = np.asarray(img.convert("RGBA") if img.mode != "RGBA" else img)
+            count += 1
+        if count != len(files):
+            raise SystemExit(f"Expected {len(files)} frames for {frame_dir}, got {count}")
+        out.flush()
+    except BaseException:
+        del out
+        tmp.unlink(missing_ok=True)
+        raise
+    del out
+    return _commit(frame_dir, tmp, files, (len(files), height, width, 4))
+
+
+def stream_stack(frame_dir: Path, frames: Iterable[tuple[Path, np.ndarray]]) -> AnimationStack:
+    """write_stack() for a stream of unknown length, e.g. frames piped from ffmpeg.
+
+    Each (PNG path, (H, W, 4) frame) pair is appended to a spool file as it arrives; the PNG
+    must exist by then. The .npy is assembled from the spool once the stream ends, so only one
+    frame is in memory at a time.
+    """
+    array_path, _ = stack_paths(frame_dir)
+    spool_path = array_path.with_name(f".{array_path.name}.{os.getpid()}.spool")
+    tmp = array_path.with_name(f".{array_path.name}.{os.getpid()}.tmp.npy")
+    files: list[Path] = []
+    frame_shape: tuple[int, ...] | None = None
+    try:
+        with open(spool_path, "w+b") as spool:
+            for path, frame in frames:
+                if frame_shape is None:
+                    frame_shape = frame.shape
+                if frame.ndim != 3 or frame.shape[2] != 4 or frame.shape != frame_shape:
+                    raise SystemExit(f"Frame shape mismatch in {frame_dir}: {path.name} is {frame.shape}, expected {frame_shape}")
+                spool.write(np.ascontiguousarray(frame, dtype=np.uint8).data)
+                files.append(path)
+            if frame_shape is None:
+                raise SystemExit(f"No frames to stack for {frame_dir}")
+            shape = (len(files), *frame_shape)
+            spool.seek(0)
+            with open(tmp, "wb") as out:
+                np.lib.format.write_array_header_1_0(
+                    out, {"descr": np.lib.format.dtype_to_descr(np.dtype(np.uint8)), "fortran_order": False, "shape": shape}
+                )
+                shutil.copyfileobj(spool, out)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    finally:
+        spool_path.unlink(missing_ok=True)
+    return _commit(frame_dir, tmp, files, shape)
+
+
+def _commit(frame_dir: Path, array_tmp: Path, files: list[Path], shape: tuple[int, ...]) -> AnimationStack:
+    """Move a finished array into place and write its sidecar."""
+    array_path, meta_path = stack_paths(frame_dir)
+    array_tmp.replace(array_path)
+    meta = {
+        "version": STACK_VERSION,
+        "labels": [frame_label(p) for p in files],
+        "shape": list(shape),
+        "sources": _fingerprint(files),
+    }
+    meta_tmp = meta_path.with_name(f".{meta_path.name}.{os.getpid()}.tmp")
+    meta_tmp.write_text(json.dumps(meta), encoding="utf-8")
+    meta_tmp.replace(meta_path)
+    return _open_stack(array_path, meta)
+
+
+def build_stack(frame_dir: Path) -> AnimationStack:
+    """Decode every PNG in frame_dir once and write the cache."""
+    files = frame_files(frame_dir)
+    with Image.open(files[0]) as first:
+        size = first.size
+
+    def decode() -> Iterable[Image.Image]:
+        for p in files:
+            with Image.open(p) as img:
+                yield img.convert("RGBA")
+
+    return write_stack(frame_dir, files, size, decode())
+
+
+def _open_stack(array_path: Path, meta: dict) -> AnimationStack:
+    frames = np.load(array_path, mmap_mode="r")
+    return AnimationStack(labels=tuple(meta["labels"]), frames=frames)
+
+
+def _cached_meta(frame_dir: Path, files: list[Path]) -> dict | None:
+    array_path, meta_path = stack_paths(frame_dir)
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if meta.get("version") != STACK_VERSION or not array_path.exists():
+        return None
+    if meta.get("sources") != _fingerprint(files):
+        return None
+    return meta
+
+
+def cached_stack(frame_dir: Path) -> AnimationStack | None:
+    """The stack for frame_dir if its cache is up to date, without building one."""
+    meta = _cached_meta(frame_dir, frame_files(frame_dir))
+    if meta is None:
+        return None
+    return _open_stack(stack_paths(frame_dir)[0], meta)
+
+
+def load_stack(frame_dir: Path) -> AnimationStack:
+    """Memory-mapped stack for frame_dir, rebuilt first if any PNG was added, removed or changed."""
+    stack = cached_stack(frame_dir)
+    return stack if stack is not None else build_stack(frame_dir)
@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""Benchmark the vectorized reskin_imaging helpers against the per-pixel code they replaced.
+
+Every benchmark checks that both implementations produce identical output before timing them.
+Pass real frames with --frames; --synthetic WxH generates a greenscreen frame when none are at hand.
+"""
+from __future__ import annotations
+
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+import reskin_imaging
+from build_snakeoil_intro_assets import key_image
+from prepare_anchor_image import ensure_transparency
+from slice_spaceport_prop_sheets import connected_components
+from tori_gate_combined import _key_greenscreen
+from tori_gate_scene_plate import _clear_near_black
+
+DEFAULT_KEY_COLOR = (0, 177, 64)
+DEFAULT_TOL = 12
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    bbox = sub.add_parser("visible-bbox", help="Greenscreen mask + bbox (prepare_walk_frames/prepare_anchor_image)")
+    add_input_args(bbox)
+    corner = sub.add_parser("corner-fill", help="Corner flood fill (prepare_anchor_image.ensure_transparency)")
+    add_input_args(corner)
+    border = sub.add_parser("border-key", help="Border-connected keying (build_snakeoil_intro_assets.key_image)")
+    add_input_args(border)
+    components = sub.add_parser("components", help="Alpha component boxes (slice_spaceport_prop_sheets)")
+    add_input_args(components)
+    components.add_argument("--alpha-threshold", type=int, default=16)
+    rules = sub.add_parser("rule-key", help="Rule-based keying (tori_gate _key_greenscreen/_clear_near_black)")
+    add_input_args(rules)
+    rules.set_defaults(synthetic="1600x1800")
+    memory = sub.add_parser("decode-memory", help="Peak RSS of full decode + resize vs open_downscaled")
+    add_input_args(memory)
+    memory.set_defaults(synthetic=None)
+    memory.add_argument("--target", help="Resize target WxH (default: the task size of each synthetic case, else 1024x1024)")
+    modes = sub.add_parser("decode-modes", help="open_downscaled/downscale on palette, bilevel, 16-bit, ... PNGs")
+    add_input_args(modes)
+    modes.set_defaults(synthetic="1600x1200")
+    modes.add_argument("--target", default="200x150", help="Resize target WxH (>= 6x smaller exercises reduce())")
+    child = sub.add_parser("decode-child")
+    child.add_argument("impl", choices=("legacy", "bounded"))
+    child.add_argument("path")
+    child.add_argument("target")
+    return parser.parse_args()
+
+
+def add_input_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--frames", nargs="*", default=[], help="Real frame PNGs to benchmark on")
+    parser.add_argument("--synthetic", default="1280x720", help="Synthetic frame size when --frames is empty")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repeats (best of)")
+
+
+def synthetic_frame(size: str) -> Image.Image:
+    width, height = (int(v) for v in size.lower().split("x"))
+    img = Image.new("RGBA", (width, height), DEFAULT_KEY_COLOR + (255,))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((width * 0.35, height * 0.15, width * 0.65, height * 0.95), fill=(180, 90, 60, 255))
+    draw.rectangle((width * 0.45, height * 0.05, width * 0.55, height * 0.3), fill=(40, 40, 70, 255))
+    noise = np.random.default_rng(0).integers(-6, 7, size=(height, width, 3))
+    arr = np.asarray(img).copy()
+    arr[:, :, :3] = np.clip(arr[:, :, :3].astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(arr, "RGBA")
+
+
+def synthetic_sheet(size: str) -> Image.Image:
+    """Transparent sheet scattered with opaque blobs and a few specks, like a bg-removed prop sheet."""
+    width, height = (int(v) for v in size.lower().split("x"))
+    img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    rng = np.random.default_rng(0)
+    for _ in range(60):
+        x, y = rng.integers(0, width), rng.integers(0, height)
+        w, h = rng.integers(8, max(9, width // 8)), rng.integers(8, max(9, height // 8))
+        draw.ellipse((x, y, x + w, y + h), fill=(200, 120, 60, int(rng.integers(40, 256))))
+    for _ in range(400):
+        x, y = rng.integers(0, width), rng.integers(0, height)
+        draw.point((x, y), fill=(255, 255, 255, 255))
+    return img
+
+
+def load_inputs(args: argparse.Namespace) -> list[tuple[str, Path | None, Image.Image]]:
+    """(label, source path or None for synthetic, RGBA image) per input."""
+    if not args.frames:
+        return [(f"synthetic {args.synthetic}", None, synthetic_frame(args.synthetic))]
+    inputs = []
+    for frame in args.frames:
+        path = Path(frame)
+        if not path.exists():
+            raise SystemExit(f"Frame not found: {path}")
+        inputs.append((path.name, path, Image.open(path).convert("RGBA")))
+    return inputs
+
+
+def best_time(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def compare(label: str, legacy: Callable[[], object], fast: Callable[[], object], repeat: int) -> None:
+    if legacy() != fast():
+        raise SystemExit(f"{label}: outputs differ")
+    legacy_s = best_time(legacy, repeat)
+    fast_s = best_time(fast, repeat)
+    print(f"{label}: legacy {legacy_s * 1000:.1f} ms, vectorized {fast_s * 1000:.1f} ms ({legacy_s / fast_s:.1f}x)")
+
+
+def legacy_visible_bbox(img: Image.Image, key_color: tuple[int, int, int], tol: int) -> tuple[int, int, int, int] | None:
+    pixels = img.getdata()
+    mask = Image.new("L", img.size, 0)
+    out = []
+    key_r, key_g, key_b = key_color
+    for r, g, b, a in pixels:
+        if a == 0:
+            out.append(0)
+            continue
+        if abs(r - key_r) <= tol and abs(g - key_g) <= tol and abs(b - key_b) <= tol:
+            out.append(0)
+        else:
+            out.append(255)
+    mask.putdata(out)
+    return mask.getbbox()
+
+
+def bench_visible_bbox(args: argparse.Namespace) -> None:
+    for label, _, img in load_inputs(args):
+        compare(
+            f"visible_bbox [{label}]",
+            lambda: legacy_visible_bbox(img, DEFAULT_KEY_COLOR, DEFAULT_TOL),
+            lambda: reskin_imaging.visible_bbox(img, DEFAULT_KEY_COLOR, DEFAULT_TOL),
+            args.repeat,
+        )
+
+
+def legacy_ensure_transparency(img: Image.Image, tol: int = 12) -> Image.Image:
+    w, h = img.size
+    sample = []
+    band = max(1, min(w, h) // 30)
+    corners = [
+        (0, 0, band, band),
+        (w - band, 0, w, band),
+        (0, h - band, band, h),
+        (w - band, h - band, w, h),
+    ]
+    px = img.load()
+    for x0, y0, x1, y1 in corners:
+        for y in range(y0, y1):
+            for x in range(x0, x1):
+                r, g, b, a = px[x, y]
+                sample.append((r, g, b))
+    if not sample:
+        return img
+    mid = len(sample) // 2
+    bg_r, bg_g, bg_b = (sorted(p[i] for p in sample)[mid] for i in range(3))
+
+    def near_bg(r: int, g: int, b: int) -> bool:
+        dr = r - bg_r
+        dg = g - bg_g
+        db = b - bg_b
+        return (dr * dr + dg * dg + db * db) ** 0.5 <= tol
+
+    visited = [[False] * w for _ in range(h)]
+    stack = [(0, 0), (w - 1, 0), (0, h - 1), (w - 1, h - 1)]
+    while stack:
+        x, y = stack.pop()
+        if x < 0 or y < 0 or x >= w or y >= h:
+            continue
+        if visited[y][x]:
+            continue
+        visited[y][x] = True
+        r, g, b, a = px[x, y]
+        if not near_bg(r, g, b):
+            continue
+        px[x, y] = (r, g, b, 0)
+        stack.extend([(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)])
+    return img
+
+
+def bench_corner_fill(args: argparse.Namespace) -> None:
+    # Both implementations edit alpha in place, so each call gets a fresh copy.
+    for label, _, img in load_inputs(args):
+        compare(
+            f"ensure_transparency [{label}]",
+            lambda: legacy_ensure_transparency(img.copy()).tobytes(),
+            lambda: ensure_transparency(img.copy()).tobytes(),
+            args.repeat,
+        )
+
+
+def legacy_key_image(path: Path, tolerance: int = 80) -> Image.Image:
+    img = Image.open(path).convert("RGBA")
+    arr = np.array(img)
+    rgb = arr[:, :, :3].astype(np.int16)
+    height, width, _ = rgb.shape
+    border = np.concatenate([rgb[0, :, :], rgb[-1, :, :], rgb[:, 0, :], rgb[:, -1, :]], axis=0)
+    bg = np.median(border, axis=0)
+
+    bg_mask = np.zeros((height, width), dtype=bool)
+    queue: deque[tuple[int, int]] = deque()
+    for x in range(width):
+        queue.append((0, x))
+        queue.append((height - 1, x))
+    for y in range(height):
+        queue.append((y, 0))
+        queue.append((y, width - 1))
+
+    while queue:
+        y, x = queue.popleft()
+        if bg_mask[y, x]:
+            continue
+        if np.linalg.norm(rgb[y, x] - bg) > tolerance:
+            continue
+        bg_mask[y, x] = True
+        if y > 0:
+            queue.append((y - 1, x))
+        if y < height - 1:
+            queue.append((y + 1, x))
+        if x > 0:
+            queue.append((y, x - 1))
+        if x < width - 1:
+            queue.append((y, x + 1))
+
+    arr[:, :, 3] = np.where(bg_mask, 0, 255)
+    return Image.fromarray(arr, "RGBA")
+
+
+def bench_border_key(args: argparse.Namespace) -> None:
+    # key_image reads from disk, so synthetic inputs are written to a temp dir first.
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, path, img in load_inputs(args):
+            if path is None:
+                path = Path(tmp) / "frame.png"
+                img.save(path)
+            compare(
+                f"key_image [{label}]",
+                lambda: legacy_key_image(path).tobytes(),
+                lambda: key_image(path).tobytes(),
+                args.repeat,
+            )
+
+
+def legacy_connected_components(alpha: Image.Image, threshold: int) -> list[tuple[int, int, int, int, int]]:
+    width, height = alpha.size
+    data = alpha.tobytes()
+    visited = bytearray(width * height)
+    components: list[tuple[int, int, int, int, int]] = []
+    for y in range(height):
+        for x in range(width):
+            i = y * width + x
+            if visited[i] or data[i] < threshold:
+                continue
+            queue: deque[tuple[int, int]] = deque([(x, y)])
+            visited[i] = 1
+            min_x, min_y, max_x, max_y, area = x, y, x, y, 0
+            while queue:
+                cx, cy = queue.popleft()
+                area += 1
+                min_x, min_y = min(min_x, cx), min(min_y, cy)
+                max_x, max_y = max(max_x, cx), max(max_y, cy)
+                for nx, ny in ((cx - 1, cy), (cx + 1, cy), (cx, cy - 1), (cx, cy + 1)):
+                    if 0 <= nx < width and 0 <= ny < height:
+                        ni = ny * width + nx
+                        if not visited[ni] and data[ni] >= threshold:
+                            visited[ni] = 1
+                            queue.append((nx, ny))
+            components.append((min_x, min_y, max_x, max_y, area))
+    return components
+
+
+def bench_components(args: argparse.Namespace) -> None:
+    inputs = load_inputs(args) if args.frames else [(f"synthetic sheet {args.synthetic}", None, synthetic_sheet(args.synthetic))]
+    for label, _, img in inputs:
+        alpha = img.getchannel("A")
+        compare(
+            f"connected_components [{label}]",
+            lambda: legacy_connected_components(alpha, args.alpha_threshold),
+            lambda: connected_components(alpha, args.alpha_threshold),
+            args.repeat,
+        )
+
+
+def legacy_key_greenscreen(image: Image.Image) -> Image.Image:
+    rgba = image.convert("RGBA")
+    pixels = rgba.load()
+    width, height = rgba.size
+    for y in range(height):
+        for x in range(width):
+            r, g, b, a = pixels[x, y]
+            if a == 0:
+                continue
+            if g >= 120 and g > r * 1.35 and g > b * 1.35:
+                pixels[x, y] = (r, g, b, 0)
+    return rgba
+
+
+def legacy_clear_near_black(image: Image.Image, threshold: int = 8) -> Image.Image:
+    rgba = image.convert("RGBA")
+    pixels = rgba.load()
+    width, height = rgba.size
+    for y in range(height):
+        for x in range(width):
+            r, g, b, a = pixels[x, y]
+            if a == 0:
+                continue
+            if r <= threshold and g <= threshold and b <= threshold:
+                pixels[x, y] = (r, g, b, 0)
+    return rgba
+
+
+def bench_rule_key(args: argparse.Namespace) -> None:
+    for label, _, img in load_inputs(args):
+        compare(
+            f"_key_greenscreen [{label}]",
+            lambda: legacy_key_greenscreen(img).tobytes(),
+            lambda: _key_greenscreen(img).tobytes(),
+            args.repeat,
+        )
+        compare(
+            f"_clear_near_black [{label}]",
+            lambda: legacy_clear_near_black(img).tobytes(),
+            lambda: _clear_near_black(img).tobytes(),
+            args.repeat,
+        )
+
+
+def parse_size(value: str) -> tuple[int, int]:
+    width, height = (int(v) for v in value.lower().split("x"))
+    return width, height
+
+
+def reset_peak_rss() -> None:
+    # ru_maxrss survives fork/exec, so the child would report the parent's peak; on Linux
+    # writing 5 to clear_refs resets VmHWM for this process.
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / (1024 * 1024)
+
+
+def decode_child(args: argparse.Namespace) -> None:
+    """Run one implementation in a fresh process and print its peak-RSS growth in MB."""
+    size = parse_size(args.target)
+    reset_peak_rss()
+    baseline = peak_rss_mb()
+    if args.impl == "legacy":
+        img = Image.open(args.path).convert("RGBA").resize(size, Image.LANCZOS)
+    else:
+        img = reskin_imaging.open_downscaled(args.path, size)
+    img.load()
+    print(f"{peak_rss_mb() - baseline:.1f}")
+
+
+# 4K fal outputs and the task sizes resize_to_task_size shrinks them to.
+DECODE_MEMORY_CASES = (("4096x4096", "1024x1024"), ("3840x2160", "1376x1142"))
+
+
+def bench_decode_memory(args: argparse.Namespace) -> None:
+    """Peak RSS of each path on RGBA and RGB PNGs; only the RGB ones skip an RGBA expansion."""
+    if args.frames:
+        cases = [(label, path, img, args.target or "1024x1024") for label, path, img in load_inputs(args)]
+    else:
+        sizes = [(args.synthetic, args.target or "1024x1024")] if args.synthetic else DECODE_MEMORY_CASES
+        cases = [
+            (f"synthetic {source} {mode}", None, synthetic_frame(source).convert(mode), target)
+            for source, target in sizes
+            for mode in ("RGBA", "RGB")
+        ]
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, path, img, target in cases:
+            if path is None:
+                path = Path(tmp) / "frame.png"
+                img.save(path, compress_level=1)
+            peaks = {}
+            for impl in ("legacy", "bounded"):
+                result = subprocess.run(
+                    [sys.executable, __file__, "decode-child", impl, str(path), target],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                )
+                peaks[impl] = float(result.stdout.strip().splitlines()[-1])
+            print(
+                f"decode+resize to {target} [{label}]: legacy +{peaks['legacy']:.0f} MB, "
+                f"open_downscaled +{peaks['bounded']:.0f} MB peak RSS"
+            )
+
+
+# Largest per-channel difference allowed between reduce() + LANCZOS and a direct LANCZOS resize
+# (measured: at most 3 levels). Bilevel sources are all hard black/white edges, which reduce()'s
+# box averaging moves by up to 10 levels.
+DECODE_MODE_TOLERANCE = 3
+DECODE_MODE_TOLERANCE_BILEVEL = 12
+DECODE_MODES = ("P", "1", "I;16", "L", "LA", "RGB", "RGBA")
+
+
+def bench_decode_modes(args: argparse.Namespace) -> None:
+    """Every PNG mode decodes and downscales (no reduce() mode errors) close to the legacy resize."""
+    size = parse_size(args.target)
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, _, img in load_inputs(args):
+            for mode in DECODE_MODES:
+                if mode == "I;16":
+                    gray = np.asarray(img.convert("L"), dtype=np.uint16) * 257
+                    source = Image.fromarray(gray)  # uint16 -> I;16
+                else:
+                    source = img.convert(mode)
+                path = Path(tmp) / f"frame_{mode.replace(';', '')}.png"
+                source.save(path, compress_level=1)
+                with Image.open(path) as opened:
+                    legacy = np.asarray(opened.convert("RGBA").resize(size, Image.LANCZOS), dtype=np.int16)
+                    in_memory = reskin_imaging.downscale(opened, size)
+                bounded = reskin_imaging.open_downscaled(path, size)
+                for name, result in (("open_downscaled", bounded), ("downscale", in_memory)):
+                    diff = int(np.abs(np.asarray(result.convert("RGBA"), dtype=np.int16) - legacy).max())
+                    tolerance = DECODE_MODE_TOLERANCE_BILEVEL if mode == "1" else DECODE_MODE_TOLERANCE
+                    if result.size != size or diff > tolerance:
+                        raise SystemExit(f"{name} [{label}, {mode}]: size {result.size}, max difference {diff}")
+                print(f"{mode} [{label}] -> {args.target}: ok")
+
+
+def main() -> int:
+    args = parse_args()
+    if args.command == "visible-bbox":
+        bench_visible_bbox(args)
+        return 0
+    if args.command == "border-key":
+        bench_border_key(args)
+        return 0
+    if args.command == "components":
+        bench_components(args)
+        return 0
+    if args.command == "decode-memory":
+        bench_decode_memory(args)
+        return 0
+    if args.command == "decode-modes":
+        bench_decode_modes(args)
+        return 0
+    if args.command == "decode-child":
+        decode_child(args)
+        return 0
+    if args.command == "rule-key":
+        bench_rule_key(args)
+        return 0
+    if args.command == "corner-fill":
+        bench_corner_fill(args)
+        return 0
+    raise SystemExit(f"Unsupported command: {args.command}")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
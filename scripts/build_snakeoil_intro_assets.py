@@ -1,11 +1,13 @@
 from __future__ import annotations
 
-from collections import deque
 from pathlib import Path
 
 from PIL import Image
 import numpy as np
 
+from gif_writer import write_gif
+from reskin_imaging import border_region, near_color_mask
+
 
 PROJECT_ROOT = Path("/Users/jcdt/Projects/template-beat-em-up")
 
@@ -81,36 +83,11 @@ ENGAGE_CHAIN = [
 def key_image(path: Path, tolerance: int = BG_TOLERANCE) -> Image.Image:
     img = Image.open(path).convert("RGBA")
     arr = np.array(img)
-    rgb = arr[:, :, :3].astype(np.int16)
-    height, width, _ = rgb.shape
+    rgb = arr[:, :, :3]
     border = np.concatenate([rgb[0, :, :], rgb[-1, :, :], rgb[:, 0, :], rgb[:, -1, :]], axis=0)
     bg = np.median(border, axis=0)
 
-    bg_mask = np.zeros((height, width), dtype=bool)
-    queue: deque[tuple[int, int]] = deque()
-    for x in range(width):
-        queue.append((0, x))
-        queue.append((height - 1, x))
-    for y in range(height):
-        queue.append((y, 0))
-        queue.append((y, width - 1))
-
-    while queue:
-        y, x = queue.popleft()
-        if bg_mask[y, x]:
-            continue
-        if np.linalg.norm(rgb[y, x] - bg) > tolerance:
-            continue
-        bg_mask[y, x] = True
-        if y > 0:
-            queue.append((y - 1, x))
-        if y < height - 1:
-            queue.append((y + 1, x))
-        if x > 0:
-            queue.append((y, x - 1))
-        if x < width - 1:
-            queue.append((y, x + 1))
-
+    bg_mask = border_region(near_color_mask(rgb, bg, tolerance))
     arr[:, :, 3] = np.where(bg_mask, 0, 255)
     return Image.fromarray(arr, "RGBA")
 
@@ -181,15 +158,7 @@ def save_sequence(images: list[Image.Image], output_dir: Path, live_dir: Path, p
 
 
 def save_gif(images: list[Image.Image], path: Path, duration_ms: int) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    images[0].save(
-        path,
-        save_all=True,
-        append_images=images[1:],
-        duration=duration_ms,
-        loop=0,
-        disposal=2,
-    )
+    write_gif(images, path, duration_ms)
 
 
 def build_swirl() -> list[Image.Image]:
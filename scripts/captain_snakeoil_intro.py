@@ -3,21 +3,29 @@
 from __future__ import annotations
 
 import argparse
+import math
 import os
 import re
 import subprocess
 import time
 import sys
+from collections.abc import Sequence
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Iterator
 
 try:
     import tomllib
 except ModuleNotFoundError:
     import tomli as tomllib
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
+from animation_stack import stream_stack
 from fal_video_generate import SUPPORTED_MODELS
+from ffmpeg_frames import parse_time_seconds, read_frames
+from gif_writer import write_gif
 
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -25,6 +33,25 @@ PYTHON = sys.executable
 EXPECTED_CLIPS = {"seated_master", "engage_master"}
 
 
+@dataclass(frozen=True)
+class StackImages(Sequence):
+    """Frames of an animation stack (or a slice of one) as images, made only when indexed.
+
+    write_gif() and the PNG writers walk this one frame at a time, so a review never holds
+    more than a few frames outside the memory-mapped stack.
+    """
+
+    frames: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return StackImages(self.frames[index])
+        return Image.fromarray(self.frames[index], "RGBA")
+
+
 def _abs(path_value: str) -> Path:
     path = Path(path_value)
     if not path.is_absolute():
@@ -90,21 +117,25 @@ def load_config(config_path: Path) -> tuple[dict, dict]:
     return global_cfg, clip_cfgs
 
 
-def create_gif_from_frames(frame_dir: Path, output_path: Path, frame_ms: int) -> None:
-    frames = sorted(frame_dir.glob("*.png"))
-    if not frames:
-        raise SystemExit(f"No extracted frames found for GIF: {frame_dir}")
-    images = [Image.open(path).convert("RGBA") for path in frames]
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    first, rest = images[0], images[1:]
-    first.save(
-        output_path,
-        save_all=True,
-        append_images=rest,
-        duration=frame_ms,
-        loop=0,
-        disposal=2,
-    )
+def review_windows(clip_name: str, clip_cfg: dict) -> list[tuple[str, float, float]]:
+    """(name, start seconds, end seconds) for every [[clip.<name>.window]] block."""
+    windows = clip_cfg.get("window")
+    if not isinstance(windows, list) or not windows:
+        raise SystemExit(f"{clip_name} must define at least one [[clip.{clip_name}.window]] block")
+    parsed = []
+    for window in windows:
+        if not isinstance(window, dict):
+            raise SystemExit(f"{clip_name}.window entries must be tables")
+        name = str(window.get("name") or "").strip()
+        start = str(window.get("start") or "").strip()
+        end = str(window.get("end") or "").strip()
+        if not name or not start or not end:
+            raise SystemExit(f"{clip_name}.window entries require name/start/end")
+        try:
+            parsed.append((name, parse_time_seconds(start), parse_time_seconds(end)))
+        except ValueError as exc:
+            raise SystemExit(f"{clip_name}.window {name}: {exc}") from None
+    return parsed
 
 
 def build_comparison_contact(review_root: Path, model_contacts: list[tuple[str, Path]]) -> None:
@@ -162,18 +193,19 @@ def build_review_for_model(
     if gif_frame_ms <= 0:
         raise SystemExit("global.gif_frame_ms must be > 0")
 
-    run(
-        [
-            "ffmpeg",
-            "-y",
-            "-i",
-            str(video_path),
-            "-vf",
-            f"fps={review_fps}",
-            str(full_frames_dir / "frame_%03d.png"),
-        ],
-        batch=False,
-    )
+    windows = review_windows(clip_name, clip_cfg)
+    for name, _, _ in windows:
+        clear_pngs(review_dir / f"frames_{name}")
+
+    # One decode for the whole review: the full-clip frames are written once and stacked,
+    # and every window is cut from that stack.
+    def full_frames() -> Iterator[tuple[Path, np.ndarray]]:
+        for number, frame in enumerate(read_frames(video_path, fps=review_fps), start=1):
+            path = full_frames_dir / f"frame_{number:03d}.png"
+            Image.fromarray(frame, "RGBA").save(path)
+            yield path, frame
+
+    stack = stream_stack(full_frames_dir, full_frames())
 
     contact_path = review_dir / "contact.png"
     run(
@@ -191,39 +223,19 @@ def build_review_for_model(
         ]
     )
 
-    create_gif_from_frames(full_frames_dir, review_dir / "full.gif", gif_frame_ms)
-
-    windows = clip_cfg.get("window")
-    if not isinstance(windows, list) or not windows:
-        raise SystemExit(f"{clip_name} must define at least one [[clip.{clip_name}.window]] block")
-    for window in windows:
-        if not isinstance(window, dict):
-            raise SystemExit(f"{clip_name}.window entries must be tables")
-        name = str(window.get("name") or "").strip()
-        start = str(window.get("start") or "").strip()
-        end = str(window.get("end") or "").strip()
-        if not name or not start or not end:
-            raise SystemExit(f"{clip_name}.window entries require name/start/end")
+    write_gif(StackImages(stack.frames), review_dir / "full.gif", gif_frame_ms)
 
+    for name, start, end in windows:
+        # Frame i of the stack was sampled at i / review_fps seconds; a window keeps [start, end).
+        first = max(0, math.ceil(start * review_fps - 1e-6))
+        last = min(len(stack), math.ceil(end * review_fps - 1e-6))
         window_dir = review_dir / f"frames_{name}"
-        clear_pngs(window_dir)
-        run(
-            [
-                "ffmpeg",
-                "-y",
-                "-i",
-                str(video_path),
-                "-ss",
-                start,
-                "-to",
-                end,
-                "-vf",
-                f"fps={review_fps}",
-                str(window_dir / "frame_%03d.png"),
-            ],
-            batch=False,
-        )
-        create_gif_from_frames(window_dir, review_dir / f"{name}.gif", gif_frame_ms)
+        images = StackImages(stack.frames[first:last])
+        if not images:
+            raise SystemExit(f"No extracted frames found for GIF: {window_dir}")
+        for number, img in enumerate(images, start=1):
+            img.save(window_dir / f"frame_{number:03d}.png")
+        write_gif(images, review_dir / f"{name}.gif", gif_frame_ms)
 
     return contact_path
 
@@ -7,10 +7,14 @@ import os
 import subprocess
 import time
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import fal_client
 
+from fal_singleflight import content_key, run_once
+from fal_upload import CONTENT_TYPES, upload_bytes
+
 MODEL = "fal-ai/bria/background/remove"
 POLL_SECONDS = 2.0
 
@@ -43,6 +47,43 @@ def open_folder(path: Path) -> None:
     subprocess.run(["open", str(path)], check=True)
 
 
+def result_image_url(result: object) -> str:
+    url = None
+    if isinstance(result, dict):
+        if "image" in result and isinstance(result["image"], dict):
+            url = result["image"].get("url")
+        if url is None and "images" in result and result["images"]:
+            url = result["images"][0].get("url")
+    if not url:
+        raise SystemExit(f"No image URL in bg remove result: {result}")
+    return url
+
+
+def remove_background_url(image_path: Path, poll_seconds: float = POLL_SECONDS) -> str:
+    """Upload + bria-remove one image and return the result URL.
+
+    Identical images requested at the same time (in this process or another one) share a single
+    upload and a single bria request.
+    """
+    data = image_path.read_bytes()
+    content_type = CONTENT_TYPES.get(image_path.suffix.lower())
+    if content_type is None:
+        raise SystemExit(f"Unsupported image type for bg remove: {image_path}")
+
+    def remove() -> str:
+        image_url = upload_bytes(data, file_name=image_path.name, content_type=content_type)
+        handler = fal_client.submit(MODEL, arguments={"image_url": image_url})
+        request_id = handler.request_id
+        print(f"BG remove submitted {request_id} for {image_path.name}")
+        while True:
+            status = fal_client.status(MODEL, request_id, with_logs=False)
+            if isinstance(status, fal_client.Completed):
+                return result_image_url(fal_client.result(MODEL, request_id))
+            time.sleep(poll_seconds)
+
+    return run_once(content_key("bg_remove", MODEL, data), remove)
+
+
 def main() -> int:
     args = parse_args()
     if "FAL_KEY" not in os.environ:
@@ -53,59 +94,20 @@ def main() -> int:
         raise SystemExit(f"Input not found: {input_path}")
 
     images = iter_images(input_path)
-    pending: dict[str, Path] = {}
-    remaining = iter(images)
     max_inflight = max(1, args.max_inflight)
 
-    def submit_next() -> bool:
-        try:
-            image_path = next(remaining)
-        except StopIteration:
-            return False
-        image_url = fal_client.upload_file(str(image_path))
-        handler = fal_client.submit(MODEL, arguments={"image_url": image_url})
-        request_id = handler.request_id
-        pending[request_id] = image_path
-        print(f"Submitted {request_id} for {image_path.name}")
-        return True
-
-    while len(pending) < max_inflight and submit_next():
-        pass
-
-    while pending:
-        completed: list[str] = []
-        for request_id, image_path in list(pending.items()):
-            status = fal_client.status(MODEL, request_id, with_logs=False)
-            if isinstance(status, fal_client.Completed):
-                result = fal_client.result(MODEL, request_id)
-                url = None
-                if isinstance(result, dict):
-                    if "image" in result and isinstance(result["image"], dict):
-                        url = result["image"].get("url")
-                    if url is None and "images" in result and result["images"]:
-                        url = result["images"][0].get("url")
-                if not url:
-                    raise SystemExit(f"No image URL in result: {result}")
-
-                if not args.no_download:
-                    out_dir = Path(args.output_dir)
-                    out_path = out_dir / f"{image_path.stem}.png"
-                    download_file(url, out_path)
-                    print(f"Saved {out_path}")
-                else:
-                    print(f"Image URL: {url}")
-                completed.append(request_id)
-            elif isinstance(status, (fal_client.Queued, fal_client.InProgress)):
-                continue
-
-        for request_id in completed:
-            pending.pop(request_id, None)
-
-        while len(pending) < max_inflight and submit_next():
-            pass
-
-        if pending:
-            time.sleep(args.poll)
+    def process(image_path: Path) -> None:
+        url = remove_background_url(image_path, args.poll)
+        if not args.no_download:
+            out_path = Path(args.output_dir) / f"{image_path.stem}.png"
+            download_file(url, out_path)
+            print(f"Saved {out_path}")
+        else:
+            print(f"Image URL: {url}")
+
+    with ThreadPoolExecutor(max_workers=max_inflight) as executor:
+        for future in [executor.submit(process, image_path) for image_path in images]:
+            future.result()
 
     if not args.no_download:
         open_folder(Path(args.output_dir))
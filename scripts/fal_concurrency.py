@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""AIMD concurrency control for fal jobs.
+
+The in-flight limit grows by one per "window" of healthy completions while queue latency stays
+near its baseline, and halves on throttling (HTTP 429) or a queue-latency spike. Long batches
+find the provider's real throughput ceiling instead of relying on a hand-tuned --parallel.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+
+import fal_client
+
+# Exit code fal helper scripts use when fal throttled the request (EX_TEMPFAIL).
+THROTTLED_EXIT_CODE = 75
+# Line helper scripts print once the request leaves the fal queue; batch drivers parse it.
+QUEUE_LATENCY_PREFIX = "Queue latency:"
+
+# Latency within FLAT_RATIO of the baseline counts as flat; above SPIKE_RATIO is a spike.
+FLAT_RATIO = 1.25
+SPIKE_RATIO = 2.0
+# Ignore ratio changes smaller than this; short queues are noisy.
+LATENCY_SLACK_SECONDS = 5.0
+BASELINE_WEIGHT = 0.2
+
+
+def is_throttle_error(exc: BaseException) -> bool:
+    return isinstance(exc, fal_client.FalClientHTTPError) and exc.status_code == 429
+
+
+@dataclass(frozen=True)
+class Slot:
+    started: float
+
+
+class AimdController:
+    def __init__(self, *, initial: int, maximum: int, minimum: int = 1, label: str = "fal") -> None:
+        if minimum < 1 or maximum < minimum:
+            raise SystemExit(f"Invalid AIMD bounds: min={minimum} max={maximum}")
+        self.limit = min(max(initial, minimum), maximum)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.label = label
+        self.history: list[tuple[float, int]] = []
+        self._inflight = 0
+        self._credit = 0.0
+        self._baseline: float | None = None
+        self._last_decrease = float("-inf")
+        self._start = time.monotonic()
+        self._cond = threading.Condition()
+        self._log(self.limit, "start")
+
+    def acquire(self) -> Slot:
+        with self._cond:
+            while self._inflight >= self.limit:
+                self._cond.wait()
+            self._inflight += 1
+            return Slot(started=time.monotonic())
+
+    def release(self, slot: Slot, *, queue_seconds: float | None = None, throttled: bool = False) -> None:
+        with self._cond:
+            self._inflight -= 1
+            self._adjust(slot, queue_seconds, throttled)
+            self._cond.notify_all()
+
+    def _adjust(self, slot: Slot, queue_seconds: float | None, throttled: bool) -> None:
+        if throttled:
+            self._decrease(slot, "throttled")
+            return
+        if queue_seconds is None:
+            return
+        if self._baseline is None:
+            self._baseline = queue_seconds
+        baseline = self._baseline
+        if queue_seconds > baseline * SPIKE_RATIO and queue_seconds - baseline > LATENCY_SLACK_SECONDS:
+            self._decrease(slot, f"queue {queue_seconds:.1f}s vs baseline {baseline:.1f}s")
+            return
+        self._baseline = baseline + (queue_seconds - baseline) * BASELINE_WEIGHT
+        if queue_seconds <= baseline * FLAT_RATIO + LATENCY_SLACK_SECONDS and self.limit < self.maximum:
+            # Additive increase: +1 per full window of healthy completions at the current level.
+            self._credit += 1.0 / self.limit
+            if self._credit >= 1.0:
+                self._credit = 0.0
+                self.limit += 1
+                self._log(self.limit, f"queue flat at {queue_seconds:.1f}s")
+
+    def _decrease(self, slot: Slot, reason: str) -> None:
+        # Jobs started before the last cut were admitted at the old level; one cut per wave.
+        if slot.started < self._last_decrease:
+            return
+        new_limit = max(self.minimum, self.limit // 2)
+        self._last_decrease = time.monotonic()
+        self._credit = 0.0
+        if new_limit != self.limit:
+            self.limit = new_limit
+            self._log(new_limit, reason)
+
+    def _log(self, limit: int, reason: str) -> None:
+        elapsed = time.monotonic() - self._start
+        self.history.append((elapsed, limit))
+        print(f"[{self.label}] concurrency -> {limit} at {elapsed:.0f}s ({reason})")
+
+    def summary(self) -> str:
+        levels = " ".join(f"{elapsed:.0f}s:{limit}" for elapsed, limit in self.history)
+        return f"[{self.label}] concurrency history: {levels}"
@@ -6,7 +6,6 @@ import argparse
 import os
 import re
 import subprocess
-import tempfile
 import time
 import urllib.request
 from pathlib import Path
@@ -15,6 +14,10 @@ from typing import Optional
 import fal_client
 from PIL import Image
 
+from fal_bg_remove import remove_background_url
+from fal_upload import upload_image, upload_path
+from reskin_imaging import open_downscaled
+
 # --------------------------------------------------------------------------------------
 # Project-specific defaults (reskin pipeline)
 # --------------------------------------------------------------------------------------
@@ -24,7 +27,6 @@ NUM_IMAGES = 4
 RESOLUTION = "4K"
 REF_DIR = None
 DEFAULT_NEGATIVE = "blurry, cropped, background, watermark, extra limbs, multiple characters"
-BG_REMOVE_MODEL = "fal-ai/bria/background/remove"
 POLL_SECONDS = 2.0
 ALLOWED_ASPECT_RATIOS = {
     "21:9": 21 / 9,
@@ -172,20 +174,28 @@ def download_file(url: str, dest: Path) -> None:
 
 
 def resize_to_task_size(image_path: Path, task_size: tuple[int, int]) -> None:
-    img = Image.open(image_path).convert("RGBA")
-    if img.size == task_size:
-        return
-    img.resize(task_size, Image.LANCZOS).save(image_path)
+    # Header-only size check, so outputs already at task size are never decoded here.
+    with Image.open(image_path) as probe:
+        if probe.size == task_size:
+            return
+    open_downscaled(image_path, task_size).save(image_path)
 
 
 def apply_alpha_from_source(source_path: Path, image_path: Path) -> None:
-    source = Image.open(source_path).convert("RGBA")
-    dest = Image.open(image_path).convert("RGBA")
-    if source.size != dest.size:
-        raise SystemExit(
-            f"Alpha source size mismatch for {image_path.name}: expected {source.size}, got {dest.size}."
+    # Runs after resize_to_task_size: both images are decoded at full size, which is the task size.
+    with Image.open(source_path) as source_probe, Image.open(image_path) as dest_probe:
+        if source_probe.size != dest_probe.size:
+            raise SystemExit(
+                f"Alpha source size mismatch for {image_path.name}: "
+                f"expected {source_probe.size}, got {dest_probe.size}."
+            )
+        alpha = (
+            source_probe.getchannel("A")
+            if source_probe.mode == "RGBA"
+            else source_probe.convert("RGBA").getchannel("A")
         )
-    dest.putalpha(source.getchannel("A"))
+    dest = Image.open(image_path).convert("RGBA")
+    dest.putalpha(alpha)
     dest.save(image_path)
 
 
@@ -196,30 +206,9 @@ def maybe_open(path: Path) -> None:
 
 
 def run_bg_remove(image_path: Path, output_path: Path, poll_seconds: float) -> None:
-    image_url = fal_client.upload_file(str(image_path))
-    handler = fal_client.submit(BG_REMOVE_MODEL, arguments={"image_url": image_url})
-    request_id = handler.request_id
-    print(f"BG remove submitted {request_id} for {image_path.name}")
-
-    while True:
-        status = fal_client.status(BG_REMOVE_MODEL, request_id, with_logs=False)
-        if isinstance(status, fal_client.Completed):
-            result = fal_client.result(BG_REMOVE_MODEL, request_id)
-            url = None
-            if isinstance(result, dict):
-                if "image" in result and isinstance(result["image"], dict):
-                    url = result["image"].get("url")
-                if url is None and "images" in result and result["images"]:
-                    url = result["images"][0].get("url")
-            if not url:
-                raise SystemExit(f"No image URL in bg remove result: {result}")
-            download_file(url, output_path)
-            print(f"Saved {output_path}")
-            return
-        if isinstance(status, (fal_client.Queued, fal_client.InProgress)):
-            time.sleep(poll_seconds)
-            continue
-        time.sleep(poll_seconds)
+    url = remove_background_url(image_path, poll_seconds)
+    download_file(url, output_path)
+    print(f"Saved {output_path}")
 
 
 def parse_hex_color_rgb(value: str) -> tuple[int, int, int]:
@@ -229,11 +218,9 @@ def parse_hex_color_rgb(value: str) -> tuple[int, int, int]:
     return int(cleaned[0:2], 16), int(cleaned[2:4], 16), int(cleaned[4:6], 16)
 
 
-def pad_image_for_upload(
-    image_path: Path, *, pad_pct: float, pad_color: tuple[int, int, int], temp_dir: Path
-) -> Path:
+def upload_with_padding(image_path: Path, *, pad_pct: float, pad_color: tuple[int, int, int]) -> str:
     if pad_pct <= 0:
-        return image_path
+        return upload_path(image_path)
     img = Image.open(image_path).convert("RGBA")
     pad_x = max(1, int(round(img.width * pad_pct)))
     pad_y = max(1, int(round(img.height * pad_pct)))
@@ -241,10 +228,7 @@ def pad_image_for_upload(
     out_h = img.height + (pad_y * 2)
     canvas = Image.new("RGBA", (out_w, out_h), (pad_color[0], pad_color[1], pad_color[2], 255))
     canvas.alpha_composite(img, (pad_x, pad_y))
-    temp_dir.mkdir(parents=True, exist_ok=True)
-    out_path = temp_dir / f"{image_path.stem}_padded.png"
-    canvas.save(out_path)
-    return out_path
+    return upload_image(canvas, file_name=f"{image_path.stem}_padded.png")
 
 
 def main() -> int:
@@ -337,94 +321,83 @@ def main() -> int:
             raise SystemExit(f"Reference is not a file: {ref_path}")
         reference_paths.append(ref_path)
 
-    with tempfile.TemporaryDirectory(prefix="reskin_pad_upload_") as tmp_dir:
-        tmp_path = Path(tmp_dir)
-        source_for_upload = pad_image_for_upload(
-            source_path, pad_pct=float(args.pad_pct), pad_color=pad_color_rgb, temp_dir=tmp_path
-        )
-        base_image_url = fal_client.upload_file(str(source_for_upload))
-
-        reference_urls = []
-        for idx, ref_path in enumerate(reference_paths, start=1):
-            ref_upload_path = pad_image_for_upload(
-                ref_path,
-                pad_pct=float(args.pad_pct),
-                pad_color=pad_color_rgb,
-                temp_dir=tmp_path / f"ref_{idx}",
-            )
-            reference_urls.append(fal_client.upload_file(str(ref_upload_path)))
-
-        arguments = {
-            "prompt": prompt,
-            "image_urls": [base_image_url] + reference_urls,
-            "num_images": args.num_images,
-            "output_format": OUTPUT_FORMAT,
-            "reference_image_url": base_image_url,
-        }
-        if negative:
-            arguments["negative_prompt"] = negative
-        if RESOLUTION:
-            arguments["resolution"] = RESOLUTION
-        if aspect_ratio:
-            arguments["aspect_ratio"] = aspect_ratio
-
-        handler = fal_client.submit(model, arguments=arguments)
-        request_id = handler.request_id
-        print(f"Submitted {request_id}")
-
-        while True:
-            status = fal_client.status(model, request_id, with_logs=False)
-            if isinstance(status, fal_client.Completed):
-                result = fal_client.result(model, request_id)
-                images = result.get("images", [])
-                if not images:
-                    raise SystemExit("No images in result")
-                print(f"Completed: {len(images)} image(s)")
-                if not args.no_download:
-                    out_dir = Path(args.output_dir)
-                    task_dir = out_dir / task_path.stem
-                    saved_paths: list[Path] = []
-                    for i, item in enumerate(images, start=1):
-                        url = item.get("url")
-                        if not url:
-                            continue
-                        out_path = task_dir / f"option_{i}.{OUTPUT_FORMAT}"
-                        if out_path.exists():
+    base_image_url = upload_with_padding(source_path, pad_pct=float(args.pad_pct), pad_color=pad_color_rgb)
+    reference_urls = [
+        upload_with_padding(ref_path, pad_pct=float(args.pad_pct), pad_color=pad_color_rgb)
+        for ref_path in reference_paths
+    ]
+
+    arguments = {
+        "prompt": prompt,
+        "image_urls": [base_image_url] + reference_urls,
+        "num_images": args.num_images,
+        "output_format": OUTPUT_FORMAT,
+        "reference_image_url": base_image_url,
+    }
+    if negative:
+        arguments["negative_prompt"] = negative
+    if RESOLUTION:
+        arguments["resolution"] = RESOLUTION
+    if aspect_ratio:
+        arguments["aspect_ratio"] = aspect_ratio
+
+    handler = fal_client.submit(model, arguments=arguments)
+    request_id = handler.request_id
+    print(f"Submitted {request_id}")
+
+    while True:
+        status = fal_client.status(model, request_id, with_logs=False)
+        if isinstance(status, fal_client.Completed):
+            result = fal_client.result(model, request_id)
+            images = result.get("images", [])
+            if not images:
+                raise SystemExit("No images in result")
+            print(f"Completed: {len(images)} image(s)")
+            if not args.no_download:
+                out_dir = Path(args.output_dir)
+                task_dir = out_dir / task_path.stem
+                saved_paths: list[Path] = []
+                for i, item in enumerate(images, start=1):
+                    url = item.get("url")
+                    if not url:
+                        continue
+                    out_path = task_dir / f"option_{i}.{OUTPUT_FORMAT}"
+                    if out_path.exists():
+                        raise SystemExit(
+                            f"Refusing to overwrite existing output: {out_path}\n"
+                            "Choose a fresh --output-dir (recommended: a new timestamped folder)."
+                        )
+                    download_file(url, out_path)
+                    if task_size:
+                        resize_to_task_size(out_path, task_size)
+                    if args.alpha_from_source:
+                        apply_alpha_from_source(source_path, out_path)
+                    saved_paths.append(out_path)
+                    print(f"Saved {out_path}")
+                if args.bg_remove:
+                    bg_removed_dir = (
+                        Path(args.bg_remove_output_dir)
+                        if args.bg_remove_output_dir
+                        else out_dir / f"{task_path.stem}_bg_removed"
+                    )
+                    for image_path in saved_paths:
+                        bg_out_path = bg_removed_dir / f"{image_path.stem}.png"
+                        if bg_out_path.exists():
                             raise SystemExit(
-                                f"Refusing to overwrite existing output: {out_path}\n"
-                                "Choose a fresh --output-dir (recommended: a new timestamped folder)."
+                                f"Refusing to overwrite existing output: {bg_out_path}\n"
+                                "Choose a fresh --bg-remove-output-dir."
                             )
-                        download_file(url, out_path)
-                        if task_size:
-                            resize_to_task_size(out_path, task_size)
-                        if args.alpha_from_source:
-                            apply_alpha_from_source(source_path, out_path)
-                        saved_paths.append(out_path)
-                        print(f"Saved {out_path}")
-                    if args.bg_remove:
-                        bg_removed_dir = (
-                            Path(args.bg_remove_output_dir)
-                            if args.bg_remove_output_dir
-                            else out_dir / f"{task_path.stem}_bg_removed"
-                        )
-                        for image_path in saved_paths:
-                            bg_out_path = bg_removed_dir / f"{image_path.stem}.png"
-                            if bg_out_path.exists():
-                                raise SystemExit(
-                                    f"Refusing to overwrite existing output: {bg_out_path}\n"
-                                    "Choose a fresh --bg-remove-output-dir."
-                                )
-                            run_bg_remove(image_path, bg_out_path, args.poll)
-                        maybe_open(bg_removed_dir)
-                    maybe_open(task_dir)
-                break
-            if isinstance(status, fal_client.Queued):
-                time.sleep(args.poll)
-                continue
-            if isinstance(status, fal_client.InProgress):
-                time.sleep(args.poll)
-                continue
+                        run_bg_remove(image_path, bg_out_path, args.poll)
+                    maybe_open(bg_removed_dir)
+                maybe_open(task_dir)
+            break
+        if isinstance(status, fal_client.Queued):
             time.sleep(args.poll)
+            continue
+        if isinstance(status, fal_client.InProgress):
+            time.sleep(args.poll)
+            continue
+        time.sleep(args.poll)
 
     return 0
 
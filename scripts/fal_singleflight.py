@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Coalesce identical concurrent fal requests so the work only goes out once.
+
+Callers pass a content key (hash of everything that defines the request) and a function that
+performs it. Threads in this process that ask for the same key wait on one shared future.
+Other processes (e.g. reskin_interactive next to a batch script, or nova_batch subprocesses)
+coordinate through a lock directory: the first one to create `<key>.lock` records an owner
+token in it, keeps its mtime fresh while the work runs, and writes `<key>.<token>.json` before
+releasing it. Processes that found that lock held poll for that owner's result.
+
+Results are URL strings and only go to callers that saw the request in flight; a caller that
+arrives after the lock is released runs the request again. Result files are deleted once they
+are RESULT_GRACE_SECONDS old, which leaves waiters many polls to pick them up.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+LOCK_ROOT = PROJECT_ROOT / "outputs" / "reskin" / "_cache" / "fal_singleflight"
+RESULT_GRACE_SECONDS = 60.0
+LOCK_HEARTBEAT_SECONDS = 10.0
+LOCK_STALE_SECONDS = 60.0
+WAIT_POLL_SECONDS = 0.5
+
+_inflight: dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def content_key(*parts: bytes | str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8") if isinstance(part, str) else part
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def run_once(key: str, fn: Callable[[], str]) -> str:
+    """Run fn for key, or join an identical request that is already in flight."""
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _inflight[key] = future
+    if not leader:
+        return future.result()
+
+    try:
+        value = _run_across_processes(key, fn)
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    else:
+        future.set_result(value)
+        return value
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _read_result(path: Path) -> str | None:
+    try:
+        return str(json.loads(path.read_text(encoding="utf-8"))["value"])
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return None
+
+
+def _write_result(path: Path, value: str) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps({"value": value}), encoding="utf-8")
+    tmp.replace(path)
+
+
+def _prune_results() -> None:
+    cutoff = time.time() - RESULT_GRACE_SECONDS
+    for path in LOCK_ROOT.glob("*.json"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _lock_owner(lock_dir: Path) -> str | None:
+    try:
+        return (lock_dir / "owner").read_text(encoding="utf-8") or None
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def _lock_is_stale(lock_dir: Path) -> bool:
+    try:
+        return time.time() - lock_dir.stat().st_mtime > LOCK_STALE_SECONDS
+    except FileNotFoundError:
+        return False
+
+
+def _heartbeat(lock_dir: Path, stop: threading.Event) -> None:
+    """Touch the lock while its owner works so long requests never look abandoned."""
+    while not stop.wait(LOCK_HEARTBEAT_SECONDS):
+        try:
+            os.utime(lock_dir)
+        except FileNotFoundError:
+            return
+
+
+def _release(lock_dir: Path, token: str | None) -> None:
+    """Remove lock_dir only if token still owns it (a stale lock may have been taken over)."""
+    if _lock_owner(lock_dir) == token:
+        shutil.rmtree(lock_dir, ignore_errors=True)
+
+
+def _run_across_processes(key: str, fn: Callable[[], str]) -> str:
+    LOCK_ROOT.mkdir(parents=True, exist_ok=True)
+    lock_dir = LOCK_ROOT / f"{key}.lock"
+    token = f"{os.getpid()}-{uuid.uuid4().hex}"
+    # Owner token of the in-flight request we found, whose result we will take.
+    joined: str | None = None
+    while True:
+        if joined is not None:
+            value = _read_result(LOCK_ROOT / f"{key}.{joined}.json")
+            if value is not None:
+                return value
+        try:
+            lock_dir.mkdir()
+        except FileExistsError:
+            owner = _lock_owner(lock_dir)
+            if _lock_is_stale(lock_dir):
+                # The owning process died without cleaning up (or before writing its token).
+                _release(lock_dir, owner)
+                continue
+            if owner is not None:
+                joined = owner
+            time.sleep(WAIT_POLL_SECONDS)
+            continue
+
+        (lock_dir / "owner").write_text(token, encoding="utf-8")
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat, args=(lock_dir, stop), daemon=True)
+        heartbeat.start()
+        try:
+            # The request we joined may have finished between our result check and taking the lock.
+            if joined is not None:
+                value = _read_result(LOCK_ROOT / f"{key}.{joined}.json")
+                if value is not None:
+                    return value
+            _prune_results()
+            value = fn()
+            _write_result(LOCK_ROOT / f"{key}.{token}.json", value)
+            return value
+        finally:
+            stop.set()
+            heartbeat.join()
+            _release(lock_dir, token)
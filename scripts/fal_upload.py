@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Upload images to fal.ai straight from memory (no temp files on disk)."""
+from __future__ import annotations
+
+import io
+from pathlib import Path
+
+import fal_client
+from PIL import Image
+
+from fal_singleflight import content_key, run_once
+
+# Transient uploads are decoded once by fal and thrown away, so favour encode speed over size.
+UPLOAD_PNG_COMPRESS_LEVEL = 1
+# Downscale-to-fit for oversized uploads, matching fal_video_generate.ensure_size_limit.
+DOWNSCALE_ATTEMPTS = 6
+MIN_DOWNSCALE_DIM = 256
+CONTENT_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+}
+
+
+def encode_png(image: Image.Image, *, compress_level: int = UPLOAD_PNG_COMPRESS_LEVEL) -> bytes:
+    buf = io.BytesIO()
+    image.save(buf, format="PNG", compress_level=compress_level)
+    return buf.getvalue()
+
+
+def encode_png_for_upload(image: Image.Image, *, max_bytes: int | None = None, max_dim: int | None = None) -> bytes:
+    """Encode with the fast level; only pay for full compression if the fast encode is too big.
+
+    If even the fully compressed PNG is over max_bytes and max_dim is given, the image is
+    shrunk to fit (like fal_video_generate.ensure_size_limit): thumbnailed to max_dim, then
+    15% smaller per attempt.
+    """
+    data = encode_png(image)
+    if max_bytes is None or len(data) <= max_bytes:
+        return data
+    data = encode_png(image, compress_level=9)
+    if len(data) <= max_bytes:
+        return data
+    if max_dim is not None:
+        image = image.convert("RGBA") if image.mode != "RGBA" else image
+        current_dim = max_dim
+        for _ in range(DOWNSCALE_ATTEMPTS):
+            resized = image.copy()
+            resized.thumbnail((current_dim, current_dim), Image.LANCZOS)
+            data = encode_png(resized, compress_level=9)
+            if len(data) <= max_bytes:
+                print(f"Downscaled upload to {resized.size[0]}x{resized.size[1]} to fit {max_bytes} bytes")
+                return data
+            current_dim = int(current_dim * 0.85)
+            if current_dim < MIN_DOWNSCALE_DIM:
+                break
+    raise SystemExit(
+        f"Encoded PNG is {len(data)} bytes, over the {max_bytes} byte upload limit. "
+        "Reduce the image dimensions."
+    )
+
+
+def upload_bytes(data: bytes, *, file_name: str, content_type: str = "image/png") -> str:
+    # Identical bytes uploaded concurrently (same seed, same frame) share one upload.
+    key = content_key("upload", content_type, data)
+    return run_once(key, lambda: fal_client.upload(data, content_type, file_name=file_name))
+
+
+def upload_image(
+    image: Image.Image, *, file_name: str, max_bytes: int | None = None, max_dim: int | None = None
+) -> str:
+    if not file_name.endswith(".png"):
+        raise SystemExit(f"In-memory uploads are PNG; file_name must end with .png: {file_name}")
+    data = encode_png_for_upload(image, max_bytes=max_bytes, max_dim=max_dim)
+    return upload_bytes(data, file_name=file_name)
+
+
+def upload_path(path: Path) -> str:
+    content_type = CONTENT_TYPES.get(path.suffix.lower())
+    if content_type is None:
+        raise SystemExit(f"Unsupported upload type: {path}")
+    return upload_bytes(path.read_bytes(), file_name=path.name, content_type=content_type)
@@ -12,6 +12,8 @@ from pathlib import Path
 import fal_client
 from PIL import Image
 
+from fal_concurrency import QUEUE_LATENCY_PREFIX, THROTTLED_EXIT_CODE, is_throttle_error
+
 SUPPORTED_MODELS = {
     "bytedance/seedance-2.0/fast/image-to-video": {
         "start_field": "image_url",
@@ -37,12 +39,23 @@ PRESET_CONSTRAINTS = {
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser()
     parser.add_argument("--model", required=True, choices=sorted(SUPPORTED_MODELS.keys()))
-    parser.add_argument("--image", required=True, help="Path to base image (anchor still)")
+    start = parser.add_mutually_exclusive_group(required=True)
+    start.add_argument("--image", default=None, help="Path to base image (anchor still)")
+    start.add_argument(
+        "--image-url",
+        default=None,
+        help="Already-uploaded base image URL (skips the upload; requires --output-name)",
+    )
     parser.add_argument(
         "--end-image",
         default="same",
         help="Path to end image, or 'same' to reuse start, or 'none' to omit end image",
     )
+    parser.add_argument(
+        "--end-image-url",
+        default=None,
+        help="Already-uploaded end image URL (overrides --end-image)",
+    )
     parser.add_argument("--prompt", required=True, help="Video prompt")
     parser.add_argument("--negative", default=None, help="Negative prompt")
     parser.add_argument("--resolution", default=DEFAULT_RESOLUTION, help="Resolution (480p or 720p)")
@@ -157,15 +170,23 @@ def main() -> int:
     if "FAL_KEY" not in os.environ:
         raise SystemExit("FAL_KEY is not set in the environment.")
 
-    image_path = Path(args.image)
-    if not image_path.exists():
-        raise SystemExit(f"Image not found: {image_path}")
-
-    safe_path = ensure_size_limit(image_path, args.max_bytes, args.max_dim)
-    image_url = fal_client.upload_file(str(safe_path))
+    if args.image_url:
+        if not args.output_name:
+            raise SystemExit("--image-url requires --output-name")
+        image_url = args.image_url
+        output_stem = None
+    else:
+        image_path = Path(args.image)
+        if not image_path.exists():
+            raise SystemExit(f"Image not found: {image_path}")
+        safe_path = ensure_size_limit(image_path, args.max_bytes, args.max_dim)
+        image_url = fal_client.upload_file(str(safe_path))
+        output_stem = image_path.stem
 
     end_image_url = None
-    if args.end_image and args.end_image != "same":
+    if args.end_image_url:
+        end_image_url = args.end_image_url
+    elif args.end_image and args.end_image != "same":
         if args.end_image == "none":
             end_image_url = None
         else:
@@ -177,12 +198,28 @@ def main() -> int:
 
     arguments = build_arguments(args, image_url, end_image_url)
 
+    try:
+        return submit_and_download(args, arguments, output_stem)
+    except fal_client.FalClientHTTPError as exc:
+        if not is_throttle_error(exc):
+            raise
+        # Batch drivers retry on this exit code and lower their concurrency.
+        print(f"Throttled by fal (HTTP 429): {exc}")
+        return THROTTLED_EXIT_CODE
+
+
+def submit_and_download(args: argparse.Namespace, arguments: dict, output_stem: str | None) -> int:
     handler = fal_client.submit(args.model, arguments=arguments)
     request_id = handler.request_id
     print(f"Submitted {request_id}")
+    submitted_at = time.monotonic()
+    queued = True
 
     while True:
         status = fal_client.status(args.model, request_id, with_logs=False)
+        if queued and not isinstance(status, fal_client.Queued):
+            queued = False
+            print(f"{QUEUE_LATENCY_PREFIX} {time.monotonic() - submitted_at:.1f}s")
         if isinstance(status, fal_client.Completed):
             result = fal_client.result(args.model, request_id)
             url = None
@@ -196,7 +233,7 @@ def main() -> int:
 
             if not args.no_download:
                 out_dir = Path(args.output_dir)
-                ensure_name = args.output_name or f"{image_path.stem}.mp4"
+                ensure_name = args.output_name or f"{output_stem}.mp4"
                 if not ensure_name.endswith(".mp4"):
                     raise SystemExit("--output-name must end with .mp4")
                 out_path = out_dir / ensure_name
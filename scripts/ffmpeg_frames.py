@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Decode video frames through an ffmpeg rawvideo pipe instead of PNG files.
+
+ffmpeg writes packed RGBA to stdout and every frame arrives as an (H, W, 4) uint8 array, so
+callers resize, clean up and lay out frames in memory and only encode the PNGs they keep.
+"""
+from __future__ import annotations
+
+import subprocess
+from pathlib import Path
+from typing import Iterator, Sequence
+
+import numpy as np
+
+
+def parse_time_seconds(value: str) -> float:
+    raw = value.strip()
+    if raw == "":
+        raise ValueError("Empty time value")
+    if ":" not in raw:
+        return float(raw)
+    parts = [p.strip() for p in raw.split(":")]
+    if len(parts) > 3:
+        raise ValueError(f"Invalid time format: {value}")
+    vals = [float(p) for p in parts]
+    while len(vals) < 3:
+        vals.insert(0, 0.0)
+    hours, minutes, seconds = vals
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def probe_size(video_path: Path) -> tuple[int, int]:
+    """(width, height) of the first video stream."""
+    if not video_path.exists():
+        raise SystemExit(f"Missing video: {video_path}")
+    result = subprocess.run(
+        [
+            "ffprobe",
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-show_entries",
+            "stream=width,height",
+            "-of",
+            "csv=p=0:s=x",
+            str(video_path),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    try:
+        width, height = (int(v) for v in result.stdout.strip().splitlines()[0].split("x")[:2])
+    except (IndexError, ValueError):
+        raise SystemExit(f"Could not read the frame size of {video_path}: {result.stdout!r}") from None
+    return width, height
+
+
+def read_frames(
+    video_path: Path,
+    *,
+    fps: float | None = None,
+    output_args: Sequence[str] = (),
+) -> Iterator[np.ndarray]:
+    """Yield the decoded frames of video_path as read-only (H, W, 4) uint8 arrays.
+
+    output_args go after -i (e.g. ["-ss", "1.000", "-t", "2.000"]), the same place the PNG
+    extraction commands put them; fps adds an fps= filter. Only one frame is buffered at a time.
+    """
+    width, height = probe_size(video_path)
+    frame_bytes = width * height * 4
+    cmd = ["ffmpeg", "-nostdin", "-i", str(video_path), *output_args]
+    if fps is not None:
+        cmd += ["-vf", f"fps={fps:g}"]
+    cmd += ["-f", "rawvideo", "-pix_fmt", "rgba", "pipe:1"]
+    print("Running:", " ".join(cmd))
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=frame_bytes) as proc:
+        assert proc.stdout is not None
+        try:
+            while True:
+                data = proc.stdout.read(frame_bytes)
+                if not data:
+                    break
+                if len(data) != frame_bytes:
+                    raise SystemExit(f"ffmpeg ended mid-frame on {video_path} ({len(data)} of {frame_bytes} bytes)")
+                yield np.frombuffer(data, dtype=np.uint8).reshape(height, width, 4)
+        except BaseException:
+            proc.kill()
+            raise
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""Suggest loop frame ranges (frame_indices) for cyclic animations such as idle and walk.
+
+Every raw frame is reduced to a small grid of foreground coverage (pixels that are not the
+greenscreen key) plus the foreground color, and all frame pairs are compared at once. A loop
+start..end is scored by how much the frame after `end` looks like `start` (so wrapping around
+looks like one more ordinary step), relative to the animation's median frame-to-frame step:
+a score below 1.0 means the seam is smoother than a typical step.
+
+  python3 scripts/find_loop_points.py --config docs/reskin/nova_animations.toml --anim idle --anim walk
+  python3 scripts/find_loop_points.py --anim walk --length 8 --write
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import tomllib  # py>=3.11
+except ModuleNotFoundError:  # py<=3.10 (our scripts venv)
+    import tomli as tomllib
+
+from animation_stack import load_stack
+from remove_frame_border import parse_hex_color
+from reskin_interactive import update_animation_string_field
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+# Feature grid: long side of the downsampled foreground mask.
+GRID = 48
+KEY_TOL = 24
+# Weight of foreground color relative to foreground shape in the frame distance.
+COLOR_WEIGHT = 0.5
+# Frames sampled per vectorized step.
+BATCH = 16
+
+
+@dataclass(frozen=True)
+class LoopCandidate:
+    start: int
+    end: int
+    length: int
+    score: float
+    # Mean frame-to-frame step inside the loop relative to the median step (0 = frozen pose).
+    motion: float
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="docs/reskin/nova_animations.toml", help="Path to TOML config")
+    parser.add_argument(
+        "--anim",
+        action="append",
+        required=True,
+        help="Animation name (repeatable)",
+    )
+    parser.add_argument(
+        "--length",
+        type=int,
+        default=None,
+        help="Exact loop length in frames (default: the animation's frame_count, if set)",
+    )
+    parser.add_argument("--min-length", type=int, default=4, help="Shortest loop to consider")
+    parser.add_argument("--max-length", type=int, default=None, help="Longest loop to consider")
+    parser.add_argument(
+        "--min-motion",
+        type=float,
+        default=0.25,
+        help="Skip loops whose mean step is below this fraction of the median step (frozen holds)",
+    )
+    parser.add_argument("--top", type=int, default=5, help="Candidates to report per animation")
+    parser.add_argument("--key", default="#00b140", help="Greenscreen key color")
+    parser.add_argument(
+        "--write",
+        action="store_true",
+        help="Write the best candidate into the animation's frame_indices",
+    )
+    return parser.parse_args()
+
+
+def _abs(path_value: str) -> Path:
+    p = Path(path_value)
+    if not p.is_absolute():
+        p = (PROJECT_ROOT / p).resolve()
+    return p
+
+
+def frame_features(frames: np.ndarray, key: tuple[int, int, int], tol: int = KEY_TOL) -> np.ndarray:
+    """(N, F) float32 features: foreground coverage per grid cell, then coverage-weighted color."""
+    n, h, w = frames.shape[:3]
+    # Sample about 4 source pixels per grid cell along each axis instead of reading every pixel.
+    step = max(1, max(h, w) // (GRID * 4))
+    sh, sw = len(range(0, h, step)), len(range(0, w, step))
+    cell = max(1, max(sh, sw) // GRID)
+    gh, gw = max(1, sh // cell), max(1, sw // cell)
+    lo = np.array([max(0, c - tol) for c in key], dtype=np.uint8)
+    hi = np.array([min(255, c + tol) for c in key], dtype=np.uint8)
+
+    out = np.empty((n, gh * gw * 4), dtype=np.float32)
+    for start in range(0, n, BATCH):
+        sample = frames[start : start + BATCH, ::step, ::step][:, : gh * cell, : gw * cell]
+        rgb = sample[..., :3]
+        near_key = ((rgb >= lo) & (rgb <= hi)).all(axis=-1)
+        fg = (sample[..., 3] > 0) & ~near_key
+        b = len(sample)
+        cells = (b, gh, cell, gw, cell)
+        coverage = fg.reshape(cells).mean(axis=(2, 4), dtype=np.float32)
+        color = (rgb * fg[..., None]).reshape(*cells, 3).sum(axis=(2, 4), dtype=np.float32)
+        color /= np.float32(255 * cell * cell)
+        out[start : start + b] = np.concatenate(
+            [coverage.reshape(b, -1), COLOR_WEIGHT * color.reshape(b, -1)], axis=1
+        )
+    return out
+
+
+def distance_matrix(features: np.ndarray) -> np.ndarray:
+    """(N, N) RMS feature distance between every pair of frames."""
+    f = features.astype(np.float64)
+    sq = (f * f).sum(axis=1)
+    d2 = sq[:, None] + sq[None, :] - 2.0 * (f @ f.T)
+    np.maximum(d2, 0.0, out=d2)
+    return np.sqrt(d2 / f.shape[1])
+
+
+def loop_candidates(
+    dist: np.ndarray, *, min_length: int, max_length: int, min_motion: float = 0.0
+) -> list[LoopCandidate]:
+    """All start..end loops within the length bounds (positions, inclusive), best first."""
+    n = dist.shape[0]
+    steps = np.diag(dist, k=1)
+    median_step = float(np.median(steps)) if steps.size else 0.0
+    scale = median_step if median_step > 0 else 1.0
+    # seam[e, s] = distance from the frame after e to s; loops need e + 1 < n.
+    seam = dist[1:, :]
+    ends, starts = np.meshgrid(np.arange(n - 1), np.arange(n), indexing="ij")
+    lengths = ends - starts + 1
+    cum = np.concatenate([[0.0], np.cumsum(steps)])
+    motion_all = (cum[ends] - cum[starts]) / np.maximum(ends - starts, 1) / scale
+    valid = (lengths >= min_length) & (lengths <= max_length) & (motion_all >= min_motion)
+    if not valid.any():
+        return []
+    e_idx, s_idx = ends[valid], starts[valid]
+    scores = seam[valid] / scale
+    motion = motion_all[valid]
+    order = np.lexsort((-lengths[valid], scores))
+    return [
+        LoopCandidate(
+            start=int(s_idx[i]),
+            end=int(e_idx[i]),
+            length=int(lengths[valid][i]),
+            score=float(scores[i]),
+            motion=float(motion[i]),
+        )
+        for i in order
+    ]
+
+
+def format_indices(labels: list[int]) -> str:
+    if labels == list(range(labels[0], labels[0] + len(labels))):
+        return f"{labels[0]}-{labels[-1]}" if len(labels) > 1 else str(labels[0])
+    return ",".join(str(label) for label in labels)
+
+
+def main() -> int:
+    args = parse_args()
+    cfg_path = _abs(args.config)
+    if not cfg_path.exists():
+        raise SystemExit(f"Config not found: {cfg_path}")
+    cfg_text = cfg_path.read_text(encoding="utf-8")
+    config = tomllib.loads(cfg_text)
+    frames_value = str(config.get("global", {}).get("frames_dir") or "").strip()
+    if not frames_value:
+        raise SystemExit("global.frames_dir is required")
+    frames_dir = _abs(frames_value)
+    anims = {str(a.get("name") or "").strip(): a for a in config.get("animation", [])}
+    key = parse_hex_color(args.key)[:3]
+
+    updated = cfg_text
+    for name in args.anim:
+        if name not in anims:
+            raise SystemExit(f"Animation not found in config: {name}")
+        started = time.perf_counter()
+        stack = load_stack(frames_dir / name / "raw")
+        labels = list(stack.labels)
+
+        length = args.length or int(anims[name].get("frame_count") or 0) or None
+        min_length = length or max(2, args.min_length)
+        max_length = length or args.max_length or len(labels) - 1
+        dist = distance_matrix(frame_features(stack.frames, key))
+        candidates = loop_candidates(
+            dist, min_length=min_length, max_length=max_length, min_motion=args.min_motion
+        )
+        elapsed = time.perf_counter() - started
+        if not candidates:
+            raise SystemExit(f"{name}: no loop of {min_length}-{max_length} frames fits in {len(labels)} frames")
+
+        print(f"{name}: {len(labels)} frames, {len(candidates)} candidate loops ({elapsed:.2f}s)")
+        print("  frame_indices     len  seam  motion")
+        for c in candidates[: max(1, args.top)]:
+            indices = format_indices(labels[c.start : c.end + 1])
+            print(f"  {indices:<16} {c.length:>4}  {c.score:4.2f}  {c.motion:6.2f}")
+
+        if args.write:
+            best = candidates[0]
+            value = format_indices(labels[best.start : best.end + 1])
+            updated = update_animation_string_field(updated, anim_name=name, key="frame_indices", value=value)
+            print(f"  -> frame_indices = \"{value}\"")
+
+    if args.write and updated != cfg_text:
+        cfg_path.write_text(updated, encoding="utf-8")
+        print(f"Updated {cfg_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
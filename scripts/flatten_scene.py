@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""Flatten a node subtree of a Godot scene into one transparent PNG plus a manifest.
+
+The subtree is read straight from the .tscn (instanced scenes are expanded, and overrides in
+the outer scene win), so positions, scales, z_index, modulate, regions and gradient-map
+materials match the editor. Sprite2D nodes draw their texture; QuiverSpriteRepeater nodes are
+expanded into one draw per cap / body texture the same way their _draw() lays them out.
+Other node types draw nothing and are listed under "skipped" in the manifest.
+
+Coordinates are local to the subtree root (its own transform is not applied), so the
+manifest maps every draw back onto the original node.
+
+  python3 scripts/flatten_scene.py --node Background/BrickBuilding1
+  python3 scripts/flatten_scene.py --scene stages/stage_01/stage_01.tscn --node Background/ToriGate --include-hidden
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from PIL import Image
+
+from godot_resource import ExtResource, GodotResource, SubResource, node_path_of, read_resource
+from gradient_map import apply_gradient_map, gradient_lut, resolve_gradient, tile
+from image_cache import load_image, report as report_image_cache
+
+DEFAULT_SCENE = "stages/stage_01/stage_01.tscn"
+OUTPUT_DIR = Path("tmp/flattened")
+REPEATER_SCRIPT = "quiver_sprite_repeater.gd"
+GRADIENT_MAP_SHADER = "gradient_map.gdshader"
+TEXTURE_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp"}
+# CanvasItem.texture_repeat: 2 = enabled, 3 = mirror (drawn as a plain repeat here).
+TEXTURE_REPEAT_ENABLED = 2
+TEXTURE_REPEAT_MIRROR = 3
+# BICUBIC reads a 4x4 source neighborhood, so transparent source pixels this close to the
+# visible ones can still contribute to an output pixel.
+RESAMPLE_MARGIN = 2
+
+# 2D affine (a, b, c, d, e, f): x' = a*x + b*y + c, y' = d*x + e*y + f.
+Affine = tuple[float, float, float, float, float, float]
+IDENTITY: Affine = (1.0, 0.0, 0.0, 0.0, 1.0, 0.0)
+
+
+def compose(outer: Affine, inner: Affine) -> Affine:
+    a1, b1, c1, d1, e1, f1 = outer
+    a2, b2, c2, d2, e2, f2 = inner
+    return (
+        a1 * a2 + b1 * d2,
+        a1 * b2 + b1 * e2,
+        a1 * c2 + b1 * f2 + c1,
+        d1 * a2 + e1 * d2,
+        d1 * b2 + e1 * e2,
+        d1 * c2 + e1 * f2 + f1,
+    )
+
+
+def translate(x: float, y: float) -> Affine:
+    return (1.0, 0.0, x, 0.0, 1.0, y)
+
+
+def _apply(m: Affine, x: float, y: float) -> tuple[float, float]:
+    return m[0] * x + m[1] * y + m[2], m[3] * x + m[4] * y + m[5]
+
+
+def _invert(m: Affine) -> Affine:
+    a, b, c, d, e, f = m
+    if b == 0.0 and d == 0.0:
+        # Axis-aligned (the common case): the same arithmetic as a plain scale + offset.
+        if a == 0.0 or e == 0.0:
+            raise SystemExit(f"Degenerate transform: {m}")
+        return (1.0 / a, 0.0, -c / a, 0.0, 1.0 / e, -f / e)
+    det = a * e - b * d
+    if det == 0.0:
+        raise SystemExit(f"Degenerate transform: {m}")
+    return (e / det, -b / det, (b * f - c * e) / det, -d / det, a / det, (c * d - a * f) / det)
+
+
+def _dest_region(img: Image.Image, m: Affine, canvas_size: tuple[int, int]) -> tuple[int, int, int, int] | None:
+    """Canvas rectangle covering every output pixel the visible part of img can touch."""
+    visible = img.getchannel("A").getbbox()
+    if visible is None:
+        return None
+    w, h = img.size
+    src_left = max(0, visible[0] - RESAMPLE_MARGIN)
+    src_top = max(0, visible[1] - RESAMPLE_MARGIN)
+    src_right = min(w, visible[2] + RESAMPLE_MARGIN)
+    src_bottom = min(h, visible[3] + RESAMPLE_MARGIN)
+    corners = [_apply(m, x, y) for x in (src_left, src_right) for y in (src_top, src_bottom)]
+    xs = [p[0] for p in corners]
+    ys = [p[1] for p in corners]
+    # One extra output pixel on each side absorbs rounding of the mapped pixel centers.
+    left = max(0, math.floor(min(xs)) - 1)
+    top = max(0, math.floor(min(ys)) - 1)
+    right = min(canvas_size[0], math.ceil(max(xs)) + 1)
+    bottom = min(canvas_size[1], math.ceil(max(ys)) + 1)
+    if left >= right or top >= bottom:
+        return None
+    return left, top, right, bottom
+
+
+def composite_affine(canvas: Image.Image, img: Image.Image, m: Affine) -> bool:
+    """Draw img onto canvas through m (image pixels -> canvas pixels), BICUBIC-resampled.
+
+    Only the canvas rectangle the image's visible pixels can reach is resampled and
+    composited; returns False when that rectangle is empty (nothing visible on the canvas).
+    """
+    region = _dest_region(img, m, canvas.size)
+    if region is None:
+        return False
+    left, top, right, bottom = region
+    a, b, c, d, e, f = _invert(m)
+    # Shift the output origin to the region's corner.
+    layer = img.transform(
+        (right - left, bottom - top),
+        Image.AFFINE,
+        (a, b, c + a * left + b * top, d, e, f + d * left + e * top),
+        resample=Image.BICUBIC,
+    )
+    canvas.alpha_composite(layer, dest=(left, top))
+    return True
+
+
+@dataclass
+class SceneNode:
+    path: str
+    type: str | None
+    # Property name -> (value, resource the value's references resolve in).
+    props: dict[str, tuple[Any, GodotResource]] = field(default_factory=dict)
+    children: list[SceneNode] = field(default_factory=list)
+
+    def value(self, key: str, default: Any = None) -> Any:
+        entry = self.props.get(key)
+        return default if entry is None else entry[0]
+
+
+def _join(base: str, rel: str) -> str:
+    if rel == ".":
+        return base
+    return rel if base == "." else f"{base}/{rel}"
+
+
+def _instantiate(doc: GodotResource, at: str, nodes: dict[str, SceneNode]) -> SceneNode:
+    """Add doc's node tree to `nodes` with its root at path `at`; returns the root."""
+    root: SceneNode | None = None
+    for section in doc.nodes():
+        path = _join(at, node_path_of(section))
+        node = nodes.get(path)
+        if node is None:
+            instance = section.attrs.get("instance")
+            if isinstance(instance, ExtResource):
+                node = _instantiate(read_resource(doc.ext_path(instance)), path, nodes)
+            else:
+                node = SceneNode(path=path, type=section.attrs.get("type"))
+                nodes[path] = node
+            if section.attrs.get("parent") is not None:
+                parent = nodes.get(_join(at, str(section.attrs["parent"])))
+                if parent is None:
+                    raise SystemExit(f"Parent of {path} not found in {doc.path}")
+                parent.children.append(node)
+        if section.attrs.get("type"):
+            node.type = section.attrs["type"]
+        # Properties set here override the instanced scene's.
+        for key, value in section.props.items():
+            node.props[key] = (value, doc)
+        if root is None:
+            root = node
+    if root is None:
+        raise SystemExit(f"No nodes in {doc.path}")
+    return root
+
+
+def load_scene_tree(scene: Path) -> dict[str, SceneNode]:
+    """Every node of the scene (instances expanded) by scene path; the root is "."."""
+    nodes: dict[str, SceneNode] = {}
+    _instantiate(read_resource(scene), ".", nodes)
+    return nodes
+
+
+def node_transform(node: SceneNode) -> Affine:
+    x, y = node.value("position", (0.0, 0.0))
+    sx, sy = node.value("scale", (1.0, 1.0))
+    rotation = float(node.value("rotation", 0.0))
+    skew = float(node.value("skew", 0.0))
+    if rotation == 0.0 and skew == 0.0:
+        return (float(sx), 0.0, float(x), 0.0, float(sy), float(y))
+    return (
+        math.cos(rotation) * sx,
+        -math.sin(rotation + skew) * sy,
+        float(x),
+        math.sin(rotation) * sx,
+        math.cos(rotation + skew) * sy,
+        float(y),
+    )
+
+
+@dataclass(frozen=True)
+class TextureKey:
+    source: Path
+    # (x, y, w, h) texture region; None = whole texture.
+    region: tuple[int, int, int, int] | None = None
+    repeat: bool = False
+    gradient_lut: bytes | None = None
+    modulate: tuple[float, float, float, float] = (1.0, 1.0, 1.0, 1.0)
+
+
+@dataclass(frozen=True)
+class Draw:
+    name: str
+    texture: TextureKey
+    size: tuple[int, int]
+    # Texture pixels -> subtree-local coordinates.
+    transform: Affine
+    z_index: int
+    order: int
+
+
+def _multiply(a: tuple[float, ...], b: tuple[float, ...]) -> tuple[float, float, float, float]:
+    return tuple(float(x) * float(y) for x, y in zip(a, b))  # type: ignore[return-value]
+
+
+def _texture_path(node: SceneNode, key: str) -> Path | None:
+    entry = node.props.get(key)
+    if entry is None or not isinstance(entry[0], ExtResource):
+        return None
+    path = entry[1].ext_path(entry[0])
+    return path if path.suffix.lower() in TEXTURE_SUFFIXES else None
+
+
+def _texture_size(path: Path) -> tuple[int, int]:
+    # Header only; pixels are decoded later, in parallel, by bake_texture().
+    if not path.exists():
+        raise SystemExit(f"Missing texture: {path}")
+    with Image.open(path) as img:
+        return img.size
+
+
+def _gradient_lut(node: SceneNode, parent_material: tuple[Any, GodotResource] | None) -> bytes | None:
+    """LUT bytes when the node draws through a gradient-map ShaderMaterial."""
+    entry = node.props.get("material")
+    if entry is None and node.value("use_parent_material", False):
+        entry = parent_material
+    if entry is None or not isinstance(entry[0], SubResource):
+        return None
+    material, doc = entry
+    section = doc.sub_resource(material)
+    shader = section.get("shader")
+    if not isinstance(shader, ExtResource) or not doc.ext_resource(shader).attrs.get("path", "").endswith(GRADIENT_MAP_SHADER):
+        return None
+    if section.get("shader_parameter/is_active", True) is False:
+        return None
+    return gradient_lut(resolve_gradient(doc, section)).tobytes()
+
+
+@dataclass
+class _Walk:
+    include_hidden: bool
+    draws: list[Draw] = field(default_factory=list)
+    skipped: list[dict] = field(default_factory=list)
+
+    def add(self, name: str, texture: TextureKey, size: tuple[int, int], m: Affine, z: int) -> None:
+        self.draws.append(Draw(name=name, texture=texture, size=size, transform=m, z_index=z, order=len(self.draws)))
+
+    def sprite(self, node: SceneNode, m: Affine, z: int, texture: TextureKey) -> None:
+        tex_w, tex_h = _texture_size(texture.source)
+        region = None
+        if node.value("region_enabled", False):
+            region = tuple(int(round(v)) for v in node.value("region_rect", (0, 0, tex_w, tex_h)))
+        hframes = int(node.value("hframes", 1))
+        vframes = int(node.value("vframes", 1))
+        if region is None and (hframes > 1 or vframes > 1):
+            frame = int(node.value("frame", 0))
+            fw, fh = tex_w // hframes, tex_h // vframes
+            region = ((frame % hframes) * fw, (frame // hframes) * fh, fw, fh)
+        repeat = int(node.value("texture_repeat", 0)) in (TEXTURE_REPEAT_ENABLED, TEXTURE_REPEAT_MIRROR)
+        texture = TextureKey(texture.source, region, repeat and region is not None, texture.gradient_lut, texture.modulate)
+        w, h = (region[2], region[3]) if region else (tex_w, tex_h)
+
+        ox, oy = node.value("offset", (0.0, 0.0))
+        local = translate(float(ox) - (w / 2 if node.value("centered", True) else 0.0),
+                          float(oy) - (h / 2 if node.value("centered", True) else 0.0))
+        if node.value("flip_h", False) or node.value("flip_v", False):
+            fx = -1.0 if node.value("flip_h", False) else 1.0
+            fy = -1.0 if node.value("flip_v", False) else 1.0
+            local = compose(local, (fx, 0.0, w if fx < 0 else 0.0, 0.0, fy, h if fy < 0 else 0.0))
+        self.add(node.path, texture, (w, h), compose(m, local), z)
+
+    def repeater(self, node: SceneNode, m: Affine, z: int, base: TextureKey) -> None:
+        # Mirrors QuiverSpriteRepeater._draw(): cap_begin, body, cap_end, all top-left anchored.
+        main = _texture_path(node, "main_texture")
+        if main is None:
+            self.skipped.append({"node": node.path, "type": "QuiverSpriteRepeater", "reason": "no main_texture"})
+            return
+        textures = [main]
+        for ref in node.value("variation_textures", []) or []:
+            if isinstance(ref, ExtResource):
+                textures.append(node.props["variation_textures"][1].ext_path(ref))
+        vertical = bool(node.value("is_vertical", False))
+        ox, oy = (float(v) for v in node.value("offset", (0.0, 0.0)))
+        separation = float(node.value("separation", 0))
+        length = int(node.value("length", 1))
+        sequence = list(node.value("texture_sequence", []) or [0] * length)
+
+        def draw(name: str, path: Path, x: float, y: float) -> None:
+            key = TextureKey(path, None, False, base.gradient_lut, base.modulate)
+            self.add(f"{node.path}/{name}", key, _texture_size(path), compose(m, translate(x, y)), z)
+
+        cap_begin = _texture_path(node, "cap_begin")
+        if cap_begin is not None:
+            bx, by = node.value("cap_begin_offset", (0.0, 0.0))
+            draw("cap_begin", cap_begin, ox + float(bx), oy + float(by))
+        for index, texture_index in enumerate(sequence):
+            path = textures[int(texture_index)] if int(texture_index) < len(textures) else main
+            w, h = _texture_size(path)
+            if vertical:
+                draw(f"main_{index}", path, ox, (h + separation) * index + oy)
+            else:
+                draw(f"main_{index}", path, (w + separation) * index + ox, oy)
+        cap_end = _texture_path(node, "cap_end")
+        if cap_end is not None:
+            ex, ey = (float(v) for v in node.value("cap_end_offset", (0.0, 0.0)))
+            w, h = _texture_size(main)
+            if vertical:
+                draw("cap_end", cap_end, ox + ex, (h + separation) * length + oy + ey)
+            else:
+                draw("cap_end", cap_end, (w + separation) * length + ox + ex, oy + ey)
+
+    def visit(
+        self,
+        node: SceneNode,
+        parent: Affine,
+        parent_z: int,
+        modulate: tuple[float, float, float, float],
+        parent_material: tuple[Any, GodotResource] | None,
+        is_root: bool = False,
+    ) -> None:
+        if not self.include_hidden and node.value("visible", True) is False:
+            return
+        m = parent if is_root else compose(parent, node_transform(node))
+        z_index = int(node.value("z_index", 0))
+        z = parent_z + z_index if node.value("z_as_relative", True) else z_index
+        modulate = _multiply(modulate, node.value("modulate", (1.0, 1.0, 1.0, 1.0)))
+        own = _multiply(modulate, node.value("self_modulate", (1.0, 1.0, 1.0, 1.0)))
+        lut = _gradient_lut(node, parent_material)
+
+        script = node.props.get("script")
+        is_repeater = script is not None and isinstance(script[0], ExtResource) and str(
+            script[1].ext_resource(script[0]).attrs.get("path", "")
+        ).endswith(REPEATER_SCRIPT)
+        if is_repeater:
+            self.repeater(node, m, z, TextureKey(Path(), None, False, lut, own))
+        elif node.type == "Sprite2D":
+            source = _texture_path(node, "texture")
+            if source is None:
+                self.skipped.append({"node": node.path, "type": node.type, "reason": "texture is not an image file"})
+            else:
+                self.sprite(node, m, z, TextureKey(source, None, False, lut, own))
+        elif node.props.get("texture") is not None or node.type in ("Polygon2D", "Line2D", "AnimatedSprite2D", "TextureRect", "Label"):
+            self.skipped.append({"node": node.path, "type": node.type, "reason": "node type is not flattened"})
+
+        material = node.props.get("material") or (parent_material if node.value("use_parent_material", False) else None)
+        for child in node.children:
+            self.visit(child, m, z, modulate, material)
+
+
+def collect_draws(nodes: dict[str, SceneNode], root_path: str, *, include_hidden: bool = False) -> tuple[list[Draw], list[dict]]:
+    """Draws of the subtree at root_path in canvas order (z_index, then tree order)."""
+    root = nodes.get(root_path)
+    if root is None:
+        raise SystemExit(f"Node not found: {root_path}")
+    walk = _Walk(include_hidden=include_hidden)
+    walk.visit(root, IDENTITY, 0, (1.0, 1.0, 1.0, 1.0), None, is_root=True)
+    return sorted(walk.draws, key=lambda d: (d.z_index, d.order)), walk.skipped
+
+
+def bake_texture(key: TextureKey) -> Image.Image:
+    """Decoded texture with its region, tiling, gradient map and modulate applied."""
+    img = load_image(key.source, shared=True)
+    if key.region is None and key.gradient_lut is None and key.modulate == (1.0, 1.0, 1.0, 1.0):
+        return img
+    arr = np.asarray(img)
+    if key.gradient_lut is not None:
+        # Per pixel, so shading before tiling gives the same image.
+        arr = apply_gradient_map(arr, np.frombuffer(key.gradient_lut, dtype=np.uint8).reshape(-1, 4))
+    if key.region is not None:
+        x, y, w, h = key.region
+        if key.repeat:
+            arr = tile(np.roll(arr, (-y, -x), axis=(0, 1)), (w, h))
+        else:
+            arr = arr[y : y + h, x : x + w]
+    if key.modulate != (1.0, 1.0, 1.0, 1.0):
+        arr = np.rint(arr * np.asarray(key.modulate, dtype=np.float32)).clip(0, 255).astype(np.uint8)
+    return Image.fromarray(np.ascontiguousarray(arr), "RGBA")
+
+
+def draw_bounds(draws: list[Draw]) -> tuple[float, float, float, float]:
+    xs: list[float] = []
+    ys: list[float] = []
+    for d in draws:
+        w, h = d.size
+        for x, y in ((0, 0), (w, 0), (0, h), (w, h)):
+            px, py = _apply(d.transform, x, y)
+            xs.append(px)
+            ys.append(py)
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scene", default=DEFAULT_SCENE, help="Scene file (.tscn)")
+    parser.add_argument("--node", required=True, help="Subtree root, e.g. Background/BrickBuilding1")
+    parser.add_argument("--output", default=None, help="Output PNG (default: tmp/flattened/<scene>__<node>.png)")
+    parser.add_argument("--include-hidden", action="store_true", help="Also draw nodes with visible = false")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Texture decode threads")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    started = time.perf_counter()
+    scene = Path(args.scene)
+    nodes = load_scene_tree(scene)
+    draws, skipped = collect_draws(nodes, args.node, include_hidden=args.include_hidden)
+    if not draws:
+        raise SystemExit(f"Nothing to draw under {args.node} in {scene}")
+
+    # Decode and bake every distinct texture up front (in parallel), then composite in order.
+    keys = list(dict.fromkeys(d.texture for d in draws))
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        baked = dict(zip(keys, pool.map(bake_texture, keys)))
+
+    min_x, min_y, max_x, max_y = draw_bounds(draws)
+    min_x, min_y = math.floor(min_x), math.floor(min_y)
+    width, height = math.ceil(max_x) - min_x, math.ceil(max_y) - min_y
+    canvas = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    to_canvas = translate(-min_x, -min_y)
+    manifest_ops = []
+    for d in draws:
+        m = compose(to_canvas, d.transform)
+        drawn = composite_affine(canvas, baked[d.texture], m)
+        manifest_ops.append(
+            {
+                "name": d.name,
+                "source": str(d.texture.source),
+                "region": list(d.texture.region) if d.texture.region else None,
+                "repeat": d.texture.repeat,
+                "gradient_mapped": d.texture.gradient_lut is not None,
+                "modulate": list(d.texture.modulate),
+                "z_index": d.z_index,
+                "transform": list(d.transform),
+                "top_left_in_canvas": list(_apply(m, 0, 0)),
+                "size": list(d.size),
+                "drawn": drawn,
+            }
+        )
+
+    stem = f"{scene.stem}__{args.node.replace('/', '_')}"
+    out_path = Path(args.output) if args.output else OUTPUT_DIR / f"{stem}.png"
+    manifest_path = out_path.with_name(f"{out_path.stem}_manifest.json")
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    canvas.save(out_path)
+    manifest = {
+        "scene": str(scene),
+        "node": args.node,
+        "root_position": list(nodes[args.node].value("position", (0.0, 0.0))),
+        "canvas": {"min_x": min_x, "min_y": min_y, "width": width, "height": height},
+        "ops": manifest_ops,
+        "skipped": skipped,
+    }
+    manifest_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    print(f"Wrote {out_path} ({width}x{height}, {len(draws)} draws, {len(keys)} textures, {time.perf_counter() - started:.2f}s)")
+    print(f"Wrote {manifest_path}")
+    report_image_cache()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -5,15 +5,24 @@ import json
 from dataclasses import dataclass
 from pathlib import Path
 
+import numpy as np
 from PIL import Image
 from PIL import ImageChops
 
+from flatten_scene import composite_affine
+from godot_resource import read_resource
+from gradient_map import apply_gradient_map, gradient_lut, load_gradient, tile
+from image_cache import load_image, report as report_image_cache
+
 
 CANVAS_MIN_X = -798.0
 CANVAS_MIN_Y = -1122.0
 CANVAS_WIDTH = 1376
 CANVAS_HEIGHT = 1142
 
+STAGE_SCENE = Path("stages/stage_01/stage_01.tscn")
+BRICK_WALL_NODE = "Background/BrickBuilding1/BrickWall"
+
 BANNER_LOGO_PATH = Path("source_images/logos/camino.png")
 BANNER_BOX_WIDTH_PCT = 0.86
 BANNER_BOX_HEIGHT_PCT = 0.58
@@ -34,89 +43,22 @@ class DrawOp:
     offset_y: float = 0.0
 
 
-def _lerp(a: float, b: float, t: float) -> float:
-    return a + (b - a) * t
-
-
-def _gradient_color_at(
-    value_0_1: float,
-    offsets: list[float],
-    colors_rgba_0_1: list[tuple[float, float, float, float]],
-) -> tuple[int, int, int, int]:
-    if value_0_1 <= offsets[0]:
-        r, g, b, a = colors_rgba_0_1[0]
-        return (round(r * 255), round(g * 255), round(b * 255), round(a * 255))
-    for i in range(len(offsets) - 1):
-        left = offsets[i]
-        right = offsets[i + 1]
-        if value_0_1 <= right:
-            t = (value_0_1 - left) / (right - left) if right > left else 0.0
-            r0, g0, b0, a0 = colors_rgba_0_1[i]
-            r1, g1, b1, a1 = colors_rgba_0_1[i + 1]
-            r = _lerp(r0, r1, t)
-            g = _lerp(g0, g1, t)
-            b = _lerp(b0, b1, t)
-            a = _lerp(a0, a1, t)
-            return (round(r * 255), round(g * 255), round(b * 255), round(a * 255))
-    r, g, b, a = colors_rgba_0_1[-1]
-    return (round(r * 255), round(g * 255), round(b * 255), round(a * 255))
-
-
-def _build_gradient_luts(
-    offsets: list[float],
-    colors_rgba_0_1: list[tuple[float, float, float, float]],
-) -> tuple[list[int], list[int], list[int], list[int]]:
-    lut_r: list[int] = []
-    lut_g: list[int] = []
-    lut_b: list[int] = []
-    lut_a: list[int] = []
-    for i in range(256):
-        rgba = _gradient_color_at(i / 255.0, offsets, colors_rgba_0_1)
-        lut_r.append(rgba[0])
-        lut_g.append(rgba[1])
-        lut_b.append(rgba[2])
-        lut_a.append(rgba[3])
-    return lut_r, lut_g, lut_b, lut_a
-
-
-def _tile_texture(texture: Image.Image, size: tuple[int, int]) -> Image.Image:
-    out = Image.new("RGBA", size, (0, 0, 0, 0))
-    w, h = texture.size
-    for y in range(0, size[1], h):
-        for x in range(0, size[0], w):
-            out.alpha_composite(texture, dest=(x, y))
-    return out
-
-
 def _bake_brick_wall_region() -> Image.Image:
-    # BrickWall in BrickBuilding1 is a tiled + gradient-mapped grayscale texture.
-    pattern_path = Path(
-        "stages/stage_01/stage_elements/buildings/walls/brick_wall/brick_pattern_grayscale.png"
-    )
+    # BrickWall in BrickBuilding1 is a tiled + gradient-mapped grayscale texture: the region
+    # size and the shader gradient come from the node in the stage scene, the pattern from
+    # the brick_wall.tscn it instances.
+    scene = read_resource(STAGE_SCENE)
+    node = scene.node(BRICK_WALL_NODE)
+    region_w, region_h = (int(v) for v in node.get("region_rect")[2:])
+    wall_scene = read_resource(scene.ext_path(node.attrs["instance"]))
+    pattern_path = wall_scene.ext_path(wall_scene.node(".").get("texture"))
     if not pattern_path.exists():
         raise SystemExit(f"Missing brick pattern: {pattern_path}")
 
-    region_w, region_h = 2146, 2200
-    pattern = Image.open(pattern_path).convert("RGBA")
-    tiled = _tile_texture(pattern, (region_w, region_h))
-
-    # Shader: gradient_map.gdshader + brick_wall.gd sets 4 colors on the gradient.
-    # We bake an approximate linear gradient to match the in-game look closely enough.
-    offsets = [0.0, 0.268817, 0.575269, 0.854839]
-    colors = [
-        (0.0823529, 0.027451, 0.027451, 1.0),
-        (0.505882, 0.137255, 0.121569, 1.0),
-        (0.596078, 0.313726, 0.188235, 1.0),
-        (0.745098, 0.572549, 0.411765, 1.0),
-    ]
-    lut_r, lut_g, lut_b, lut_a = _build_gradient_luts(offsets, colors)
-
-    luma = tiled.convert("L")
-    r = luma.point(lut_r)
-    g = luma.point(lut_g)
-    b = luma.point(lut_b)
-    a = tiled.getchannel("A")
-    return Image.merge("RGBA", (r, g, b, a))
+    pattern = np.asarray(load_image(pattern_path, shared=True))
+    lut = gradient_lut(load_gradient(STAGE_SCENE, node=BRICK_WALL_NODE))
+    # The gradient map is per pixel, so shading one tile and repeating it is the same image.
+    return Image.fromarray(tile(apply_gradient_map(pattern, lut), (region_w, region_h)), "RGBA")
 
 
 def _quiver_repeater_ops_pipe() -> list[DrawOp]:
@@ -170,7 +112,7 @@ def _quiver_repeater_ops_windows() -> list[DrawOp]:
     base_x, base_y = -798.0, -1032.0
     length = 2
     separation = 180
-    img = Image.open(tex)
+    img = load_image(tex, shared=True)
     step = img.size[0] + separation
     return [
         DrawOp(name=f"Windows/{i}", source=tex, x=base_x + step * i, y=base_y, centered=False)
@@ -327,8 +269,7 @@ def _draw_ops_bounds(ops: list[DrawOp]) -> tuple[float, float, float, float]:
     max_x = float("-inf")
     max_y = float("-inf")
     for op in ops:
-        img = Image.open(op.source).convert("RGBA")
-        w, h = img.size
+        w, h = load_image(op.source, shared=True).size
         anchor_x = -w / 2 if op.centered else 0.0
         anchor_y = -h / 2 if op.centered else 0.0
         x1 = op.x + (anchor_x + op.offset_x) * op.scale_x
@@ -343,25 +284,18 @@ def _draw_ops_bounds(ops: list[DrawOp]) -> tuple[float, float, float, float]:
 
 
 def _composite_op(canvas: Image.Image, op: DrawOp, min_x: float, min_y: float) -> dict:
-    img = Image.open(op.source).convert("RGBA")
+    img = load_image(op.source, shared=True)
     w, h = img.size
     anchor_x = -w / 2 if op.centered else 0.0
     anchor_y = -h / 2 if op.centered else 0.0
     x1 = (op.x + (anchor_x + op.offset_x) * op.scale_x) - min_x
     y1 = (op.y + (anchor_y + op.offset_y) * op.scale_y) - min_y
 
-    # Affine: output -> input, so invert the translation + scale.
     sx = float(op.scale_x)
     sy = float(op.scale_y)
     if sx == 0.0 or sy == 0.0:
         raise SystemExit(f"Invalid scale for {op.name}: ({sx}, {sy})")
-    a = 1.0 / sx
-    e = 1.0 / sy
-    c = -x1 / sx
-    f = -y1 / sy
-
-    layer = img.transform(canvas.size, Image.AFFINE, (a, 0, c, 0, e, f), resample=Image.BICUBIC)
-    canvas.alpha_composite(layer)
+    composite_affine(canvas, img, (sx, 0.0, x1, 0.0, sy, y1))
 
     return {
         "name": op.name,
@@ -447,6 +381,7 @@ def main() -> int:
     print(f"Wrote {out_path}")
     print(f"Wrote {banner_path}")
     print(f"Wrote {manifest_path}")
+    report_image_cache()
     return 0
 
 
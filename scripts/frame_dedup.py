@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Group near-duplicate animation frames (hold poses, idle breathing) before background removal.
+
+Frames are compared in two steps: a 64-bit difference hash (luma block means on a 9x8 grid)
+rules out clearly different poses cheaply, then the mean absolute RGB difference against the
+group's representative decides. Only representatives need a bria matte; the other members of
+a group reuse it.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+from animation_stack import AnimationStack
+
+HASH_SIZE = 8
+DEFAULT_HASH_DISTANCE = 6
+# Frames hashed per vectorized step; bounds the float32 luma temporaries.
+HASH_BATCH = 8
+
+
+@dataclass(frozen=True)
+class FrameGroup:
+    representative: int
+    # Frame labels in order, representative first.
+    members: tuple[int, ...]
+
+
+def difference_hashes(frames: np.ndarray, positions: Sequence[int] | None = None) -> np.ndarray:
+    """(N, 64) bool dHash bits for an (N, H, W, 4) frame array, or for frames[positions] only.
+
+    Frames are read HASH_BATCH at a time, so a selection is never copied out of the stack whole.
+    """
+    picks = np.arange(len(frames)) if positions is None else np.asarray(positions, dtype=np.intp)
+    n = len(picks)
+    h, w = frames.shape[1:3]
+    if h < HASH_SIZE or w < HASH_SIZE + 1:
+        raise SystemExit(f"Frames too small to hash: {w}x{h}")
+    row_edges = (np.arange(HASH_SIZE) * h) // HASH_SIZE
+    col_edges = (np.arange(HASH_SIZE + 1) * w) // (HASH_SIZE + 1)
+    counts = np.outer(np.diff(row_edges, append=h), np.diff(col_edges, append=w))
+    out = np.empty((n, HASH_SIZE * HASH_SIZE), dtype=bool)
+    for start in range(0, n, HASH_BATCH):
+        batch = frames[picks[start : start + HASH_BATCH]]
+        luma = batch[..., 0] * np.float32(0.299)
+        luma += batch[..., 1] * np.float32(0.587)
+        luma += batch[..., 2] * np.float32(0.114)
+        sums = np.add.reduceat(np.add.reduceat(luma, row_edges, axis=1), col_edges, axis=2)
+        means = sums / counts
+        out[start : start + len(batch)] = (means[:, :, 1:] > means[:, :, :-1]).reshape(len(batch), -1)
+    return out
+
+
+def mean_abs_difference(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean absolute RGB difference of two (H, W, 4) frames, on the 0-255 scale."""
+    return float(np.abs(a[..., :3].astype(np.int16) - b[..., :3]).mean())
+
+
+def group_frames(
+    stack: AnimationStack,
+    labels: Sequence[int] | None = None,
+    *,
+    threshold: float,
+    hash_distance: int = DEFAULT_HASH_DISTANCE,
+) -> list[FrameGroup]:
+    """Greedy grouping in frame order: each frame joins the first group whose representative is
+    within hash_distance bits and threshold mean RGB difference, or starts a new group.
+    """
+    labels = list(dict.fromkeys(stack.labels if labels is None else labels))
+    positions = [stack.index(label) for label in labels]
+    hashes = difference_hashes(stack.frames, positions)
+    distances = (hashes[:, None, :] != hashes[None, :, :]).sum(axis=2)
+
+    reps: list[int] = []
+    members: list[list[int]] = []
+    for i, pos in enumerate(positions):
+        for group, rep in enumerate(reps):
+            if distances[i, rep] > hash_distance:
+                continue
+            if mean_abs_difference(stack.frames[pos], stack.frames[positions[rep]]) <= threshold:
+                members[group].append(i)
+                break
+        else:
+            reps.append(i)
+            members.append([i])
+    return [
+        FrameGroup(representative=labels[rep], members=tuple(labels[i] for i in group))
+        for rep, group in zip(reps, members)
+    ]
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Streaming GIF writer for review previews.
+
+One palette is built up front from a sample of the frames (median cut over their opaque
+pixels, index 255 reserved for transparency). Frames are then decoded and mapped onto that
+palette on a thread pool and written one at a time: each frame only stores the rectangle
+that changed since the previous one (unchanged pixels inside it become transparent), and
+runs of identical frames collapse into one longer frame. At most a small window of frames
+is in memory at once.
+"""
+from __future__ import annotations
+
+import os
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Sequence, Union
+
+import numpy as np
+from PIL import GifImagePlugin, Image
+
+from reskin_imaging import mask_bbox
+
+PALETTE_SAMPLE_FRAMES = 8
+# Opaque pixels fed to the median cut, subsampled evenly from the sample frames.
+PALETTE_SAMPLE_PIXELS = 1 << 18
+TRANSPARENT = 255
+ALPHA_CUTOFF = 128
+DISPOSE_KEEP = 1
+DISPOSE_BACKGROUND = 2
+
+FrameSource = Union[Path, Image.Image]
+
+
+@dataclass
+class _PendingFrame:
+    # (left, top, right, bottom) on the canvas and the palette indices inside it.
+    rect: tuple[int, int, int, int]
+    indices: np.ndarray
+    duration_ms: int
+    disposal: int = DISPOSE_KEEP
+
+
+def _rgba(source: FrameSource) -> Image.Image:
+    if isinstance(source, Image.Image):
+        return source if source.mode == "RGBA" else source.convert("RGBA")
+    with Image.open(source) as img:
+        return img.convert("RGBA")
+
+
+def shared_palette(samples: Sequence[Image.Image]) -> Image.Image:
+    """'P' image whose palette (at most 255 colors) covers the opaque pixels of the samples."""
+    chunks = []
+    for img in samples:
+        arr = np.asarray(img)
+        chunks.append(arr[arr[..., 3] >= ALPHA_CUTOFF][:, :3])
+    pixels = np.concatenate(chunks) if chunks else np.zeros((0, 3), dtype=np.uint8)
+    if not len(pixels):
+        pixels = np.zeros((1, 3), dtype=np.uint8)
+    pixels = np.ascontiguousarray(pixels[:: max(1, len(pixels) // PALETTE_SAMPLE_PIXELS)])
+    strip = Image.fromarray(pixels.reshape(1, -1, 3), "RGB")
+    return strip.quantize(colors=TRANSPARENT, method=Image.Quantize.MEDIANCUT)
+
+
+def quantize_frame(img: Image.Image, palette: Image.Image) -> np.ndarray:
+    """(H, W) palette indices; pixels below ALPHA_CUTOFF become TRANSPARENT."""
+    arr = np.asarray(img)
+    # No dithering: static areas map to identical indices frame to frame, which keeps the
+    # changed rectangles small.
+    indices = np.array(img.convert("RGB").quantize(palette=palette, dither=Image.Dither.NONE))
+    indices[arr[..., 3] < ALPHA_CUTOFF] = TRANSPARENT
+    return indices
+
+
+def _quantized(sources: Sequence[FrameSource], palette: Image.Image, jobs: int) -> Iterator[np.ndarray]:
+    def work(source: FrameSource) -> np.ndarray:
+        return quantize_frame(_rgba(source), palette)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        window: deque = deque()
+        for source in sources:
+            window.append(pool.submit(work, source))
+            if len(window) > jobs * 2:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+
+def _global_header(size: tuple[int, int], palette: Image.Image) -> bytes:
+    colors = bytes(palette.getpalette()[: TRANSPARENT * 3])
+    color_table = colors + bytes(256 * 3 - len(colors))
+    width, height = size
+    # 256-entry global color table (flag 0x80, size bits 7), background = transparent index.
+    screen = struct.pack("<HHBBB", width, height, 0xF7, TRANSPARENT, 0)
+    loop = b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", 0) + b"\x00"
+    return b"GIF89a" + screen + color_table + loop
+
+
+def _write_frame(fp, frame: _PendingFrame) -> None:
+    left, top = frame.rect[:2]
+    im = Image.fromarray(frame.indices, "P")
+    for chunk in GifImagePlugin.getdata(
+        im,
+        offset=(left, top),
+        duration=frame.duration_ms,
+        disposal=frame.disposal,
+        transparency=TRANSPARENT,
+    ):
+        fp.write(chunk)
+
+
+def _patch(cur: np.ndarray, changed: np.ndarray, duration_ms: int) -> _PendingFrame:
+    rect = mask_bbox(changed) or (0, 0, 1, 1)
+    left, top, right, bottom = rect
+    indices = cur[top:bottom, left:right].copy()
+    indices[~changed[top:bottom, left:right]] = TRANSPARENT
+    return _PendingFrame(rect=rect, indices=indices, duration_ms=duration_ms)
+
+
+def _grow(frame: _PendingFrame, mask: np.ndarray) -> _PendingFrame:
+    """Same frame on a rectangle that also covers mask; the added area is transparent."""
+    left, top, right, bottom = frame.rect
+    m_left, m_top, m_right, m_bottom = mask_bbox(mask)
+    rect = (min(left, m_left), min(top, m_top), max(right, m_right), max(bottom, m_bottom))
+    if rect == frame.rect:
+        return frame
+    indices = np.full((rect[3] - rect[1], rect[2] - rect[0]), TRANSPARENT, dtype=np.uint8)
+    indices[top - rect[1] : bottom - rect[1], left - rect[0] : right - rect[0]] = frame.indices
+    return _PendingFrame(rect=rect, indices=indices, duration_ms=frame.duration_ms)
+
+
+def write_gif(
+    frames: Sequence[FrameSource], path: Path, duration_ms: int, *, jobs: int | None = None
+) -> None:
+    """Encode frames (PNG paths or images, all the same size) as a looping GIF."""
+    if not frames:
+        raise SystemExit(f"No frames to write: {path}")
+    step = max(1, len(frames) // PALETTE_SAMPLE_FRAMES)
+    palette = shared_palette([_rgba(source) for source in frames[::step][:PALETTE_SAMPLE_FRAMES]])
+    jobs = max(1, jobs or os.cpu_count() or 1)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    prev: np.ndarray | None = None
+    pending: _PendingFrame | None = None
+    with open(tmp, "wb") as fp:
+        for cur in _quantized(frames, palette, jobs):
+            if prev is None:
+                fp.write(_global_header((cur.shape[1], cur.shape[0]), palette))
+                h, w = cur.shape
+                pending = _PendingFrame(rect=(0, 0, w, h), indices=cur, duration_ms=duration_ms)
+                prev = cur
+                continue
+            if cur.shape != prev.shape:
+                raise SystemExit(f"GIF frames must share one size: {cur.shape[::-1]} != {prev.shape[::-1]}")
+            changed = cur != prev
+            if not changed.any():
+                pending.duration_ms += duration_ms
+                continue
+            if not (changed & (cur == TRANSPARENT)).any():
+                # Only opaque pixels change: keep the canvas and draw the changed rectangle.
+                pending.disposal = DISPOSE_KEEP
+            else:
+                # Pixels turn transparent, which drawing cannot do: grow the previous frame's
+                # rectangle over them, clear it after display, then redraw whatever differs
+                # from that cleared canvas.
+                pending = _grow(pending, changed & (cur == TRANSPARENT))
+                pending.disposal = DISPOSE_BACKGROUND
+                left, top, right, bottom = pending.rect
+                cleared = prev.copy()
+                cleared[top:bottom, left:right] = TRANSPARENT
+                changed = cur != cleared
+            _write_frame(fp, pending)
+            pending = _patch(cur, changed, duration_ms)
+            prev = cur
+        _write_frame(fp, pending)
+        fp.write(b";")
+    tmp.replace(path)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""Minimal reader for Godot's text resource format (.tres and .tscn).
+
+A file is a list of sections ([gd_scene ...], [ext_resource ...], [sub_resource ...],
+[resource], [node ...], [connection ...]) followed by `key = value` properties. Values are
+parsed into plain Python: numbers, strings, bools, None, lists, dicts, tuples for Color/Vector
+constructors, and SubResource/ExtResource references. Anything else is kept as its source
+text, so unknown types never stop a read.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+_HEADER = re.compile(r"^\[(\w+)(.*)\]\s*$")
+_ATTR = re.compile(r'(\w+)=("(?:[^"\\]|\\.)*"|\S+)')
+_NUMBER = re.compile(r"^-?(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?$", re.IGNORECASE)
+_CALL = re.compile(r"^([A-Za-z_]\w*)(\[[^\]]*\])?\((.*)\)$", re.DOTALL)
+
+
+@dataclass(frozen=True)
+class SubResource:
+    id: str
+
+
+@dataclass(frozen=True)
+class ExtResource:
+    id: str
+
+
+@dataclass(frozen=True)
+class Section:
+    tag: str
+    attrs: dict[str, Any]
+    props: dict[str, Any] = field(default_factory=dict)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.props.get(key, default)
+
+
+def _split_top_level(text: str, sep: str = ",") -> list[str]:
+    parts: list[str] = []
+    depth = 0
+    in_string = False
+    start = 0
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if ch == "\\":
+                i += 1
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "([{":
+            depth += 1
+        elif ch in ")]}":
+            depth -= 1
+        elif ch == sep and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+        i += 1
+    tail = text[start:]
+    if tail.strip() or parts:
+        parts.append(tail)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _depth_change(line: str) -> int:
+    depth = 0
+    in_string = False
+    escaped = False
+    for ch in line:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "([{":
+            depth += 1
+        elif ch in ")]}":
+            depth -= 1
+    return depth
+
+
+def parse_value(text: str) -> Any:
+    """Python value for one property value in Godot's text format."""
+    text = text.strip()
+    if not text:
+        return None
+    if text.startswith('"') and text.endswith('"'):
+        return bytes(text[1:-1], "utf-8").decode("unicode_escape") if "\\" in text else text[1:-1]
+    if text in ("true", "false"):
+        return text == "true"
+    if text == "null":
+        return None
+    if _NUMBER.match(text):
+        return float(text) if any(c in text for c in ".eE") else int(text)
+    if text.startswith("[") and text.endswith("]"):
+        return [parse_value(p) for p in _split_top_level(text[1:-1])]
+    if text.startswith("{") and text.endswith("}"):
+        out = {}
+        for item in _split_top_level(text[1:-1]):
+            key, _, value = item.partition(":")
+            out[parse_value(key)] = parse_value(value)
+        return out
+    call = _CALL.match(text)
+    if call:
+        name, _typed, inner = call.groups()
+        args = [parse_value(p) for p in _split_top_level(inner)]
+        if name == "SubResource":
+            return SubResource(args[0])
+        if name == "ExtResource":
+            return ExtResource(args[0])
+        if name == "Array" or name == "Dictionary":
+            # Typed containers: Array[float]([...]) wraps a plain list.
+            return args[0] if args else ([] if name == "Array" else {})
+        if name == "PackedColorArray":
+            return [tuple(args[i : i + 4]) for i in range(0, len(args), 4)]
+        if name.startswith("PackedVector2"):
+            return [tuple(args[i : i + 2]) for i in range(0, len(args), 2)]
+        if name.startswith("Packed"):
+            return args
+        return tuple(args)
+    return text
+
+
+@dataclass(frozen=True)
+class GodotResource:
+    path: Path
+    sections: tuple[Section, ...]
+
+    def header(self) -> Section:
+        return self.sections[0]
+
+    def ext_resource(self, ref: ExtResource | str) -> Section:
+        ref_id = ref.id if isinstance(ref, ExtResource) else ref
+        for section in self.sections:
+            if section.tag == "ext_resource" and section.attrs.get("id") == ref_id:
+                return section
+        raise SystemExit(f"ext_resource {ref_id} not found in {self.path}")
+
+    def sub_resource(self, ref: SubResource | str) -> Section:
+        ref_id = ref.id if isinstance(ref, SubResource) else ref
+        for section in self.sections:
+            if section.tag == "sub_resource" and section.attrs.get("id") == ref_id:
+                return section
+        raise SystemExit(f"sub_resource {ref_id} not found in {self.path}")
+
+    def resource(self) -> Section:
+        """The file's own [resource] section (.tres files)."""
+        for section in self.sections:
+            if section.tag == "resource":
+                return section
+        raise SystemExit(f"No [resource] section in {self.path}")
+
+    def node(self, node_path: str) -> Section:
+        """Node section by scene path, e.g. "Background/BrickBuilding1/BrickWall"."""
+        for section in self.nodes():
+            if node_path_of(section) == node_path:
+                return section
+        raise SystemExit(f"Node not found in {self.path}: {node_path}")
+
+    def nodes(self) -> list[Section]:
+        return [s for s in self.sections if s.tag == "node"]
+
+    def ext_path(self, ref: ExtResource | str) -> Path:
+        """Filesystem path of an ext_resource, resolved against the project root."""
+        return res_path(str(self.ext_resource(ref).attrs["path"]))
+
+
+def node_path_of(section: Section) -> str:
+    """Scene path of a node section; the root node is "."."""
+    parent = section.attrs.get("parent")
+    name = str(section.attrs.get("name"))
+    if parent is None:
+        return "."
+    return name if parent == "." else f"{parent}/{name}"
+
+
+def res_path(value: str) -> Path:
+    if value.startswith("res://"):
+        return PROJECT_ROOT / value[len("res://") :]
+    return Path(value)
+
+
+def read_resource(path: Path) -> GodotResource:
+    if not path.exists():
+        raise SystemExit(f"Godot resource not found: {path}")
+    sections: list[Section] = []
+    pending_key: str | None = None
+    pending: list[str] = []
+    depth = 0
+    for raw in path.read_text(encoding="utf-8").splitlines():
+        if pending_key is not None:
+            pending.append(raw)
+            depth += _depth_change(raw)
+            if depth <= 0:
+                sections[-1].props[pending_key] = parse_value("\n".join(pending))
+                pending_key = None
+            continue
+        line = raw.strip()
+        if not line or line.startswith(";"):
+            continue
+        header = _HEADER.match(line)
+        if header:
+            attrs = {key: parse_value(value) for key, value in _ATTR.findall(header.group(2))}
+            sections.append(Section(tag=header.group(1), attrs=attrs))
+            continue
+        key, sep, value = line.partition(" = ")
+        if not sep or not sections:
+            continue
+        depth = _depth_change(value)
+        if depth > 0:
+            pending_key, pending = key, [value]
+            continue
+        sections[-1].props[key] = parse_value(value)
+    if not sections:
+        raise SystemExit(f"Not a Godot text resource: {path}")
+    return GodotResource(path=path, sections=tuple(sections))
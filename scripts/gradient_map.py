@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Bake Godot gradient-map shading (stages/_base/skyboxes/gradient_map.gdshader) with NumPy.
+
+Gradients are read from the project's resources: a Gradient / GradientTexture .tres such as
+characters/playable/chad/resources/chad_gradient.tres, or the ShaderMaterial of a node in a
+.tscn. The gradient is sampled once into a 256-entry RGBA table, and a texture is shaded with
+one indexed lookup on its luma, the same way the shader maps gray values to colors.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from godot_resource import ExtResource, GodotResource, Section, SubResource, read_resource
+
+# Gradient.interpolation_mode values.
+LINEAR = 0
+CONSTANT = 1
+CUBIC = 2
+LUT_SIZE = 256
+
+Color = tuple[float, float, float, float]
+
+
+@dataclass(frozen=True)
+class Gradient:
+    offsets: tuple[float, ...]
+    colors: tuple[Color, ...]
+    interpolation_mode: int = LINEAR
+
+
+def _gradient(section: Section) -> Gradient:
+    # Godot omits properties that still have their defaults: black -> white, linear.
+    offsets = section.get("offsets", [0.0, 1.0])
+    colors = section.get("colors", [(0.0, 0.0, 0.0, 1.0), (1.0, 1.0, 1.0, 1.0)])
+    if len(offsets) != len(colors) or not offsets:
+        raise SystemExit(f"Gradient {section.attrs.get('id', '')} has {len(offsets)} offsets for {len(colors)} colors")
+    order = sorted(range(len(offsets)), key=lambda i: offsets[i])
+    return Gradient(
+        offsets=tuple(float(offsets[i]) for i in order),
+        colors=tuple(tuple(float(c) for c in colors[i]) for i in order),
+        interpolation_mode=int(section.get("interpolation_mode", LINEAR)),
+    )
+
+
+def resolve_gradient(doc: GodotResource, section: Section) -> Gradient:
+    """Follow material -> gradient texture -> gradient references down to a Gradient."""
+    if section.attrs.get("type") == "Gradient":
+        return _gradient(section)
+    for key in ("material", "shader_parameter/gradient", "gradient"):
+        ref = section.get(key)
+        if isinstance(ref, SubResource):
+            return resolve_gradient(doc, doc.sub_resource(ref))
+        if isinstance(ref, ExtResource):
+            return load_gradient(doc.ext_path(ref))
+    raise SystemExit(f"No gradient found under {section.tag} {section.attrs.get('id') or section.attrs.get('name') or ''} in {doc.path}")
+
+
+def load_gradient(path: Path, node: str | None = None) -> Gradient:
+    """Gradient of a .tres resource, or of the gradient-map material on a node in a .tscn."""
+    doc = read_resource(path)
+    if node is not None:
+        return resolve_gradient(doc, doc.node(node))
+    section = doc.resource()
+    if doc.header().attrs.get("type") == "Gradient":
+        return _gradient(section)
+    return resolve_gradient(doc, section)
+
+
+def _cubic(pre: np.ndarray, start: np.ndarray, end: np.ndarray, post: np.ndarray, t: np.ndarray) -> np.ndarray:
+    # Math::cubic_interpolate (Catmull-Rom), as used by Gradient's cubic mode.
+    t2 = t * t
+    t3 = t2 * t
+    return 0.5 * (
+        (start * 2.0)
+        + (-pre + end) * t
+        + (2.0 * pre - 5.0 * start + 4.0 * end - post) * t2
+        + (-pre + 3.0 * start - 3.0 * end + post) * t3
+    )
+
+
+def sample_gradient(gradient: Gradient, values: np.ndarray) -> np.ndarray:
+    """(len(values), 4) float colors, matching Gradient.sample()."""
+    offsets = np.asarray(gradient.offsets, dtype=np.float64)
+    colors = np.asarray(gradient.colors, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    last = len(offsets) - 1
+    first = np.searchsorted(offsets, values, side="right") - 1
+    inside = (first >= 0) & (first < last)
+    lo = np.clip(first, 0, last)
+    hi = np.clip(first + 1, 0, last)
+    span = offsets[hi] - offsets[lo]
+    t = np.divide(values - offsets[lo], span, out=np.zeros_like(values), where=span > 0)[:, None]
+    if gradient.interpolation_mode == CONSTANT:
+        mixed = colors[lo]
+    elif gradient.interpolation_mode == CUBIC:
+        pre = colors[np.clip(lo - 1, 0, last)]
+        post = colors[np.clip(hi + 1, 0, last)]
+        mixed = _cubic(pre, colors[lo], colors[hi], post, t)
+    else:
+        mixed = colors[lo] + (colors[hi] - colors[lo]) * t
+    # Outside the first/last point the end colors hold.
+    edge = np.where((first < 0)[:, None], colors[0], colors[last])
+    return np.where(inside[:, None], mixed, edge)
+
+
+def gradient_lut(gradient: Gradient) -> np.ndarray:
+    """(256, 4) uint8 RGBA table: entry i is the gradient at i / 255."""
+    sampled = sample_gradient(gradient, np.arange(LUT_SIZE) / (LUT_SIZE - 1))
+    return np.rint(np.clip(sampled, 0.0, 1.0) * 255).astype(np.uint8)
+
+
+def luma(rgb: np.ndarray) -> np.ndarray:
+    """uint8 luma with the same fixed-point weights (and rounding) as Pillow's convert("L")."""
+    r = rgb[..., 0].astype(np.uint32)
+    g = rgb[..., 1].astype(np.uint32)
+    b = rgb[..., 2].astype(np.uint32)
+    return ((r * 19595 + g * 38470 + b * 7471 + 0x8000) >> 16).astype(np.uint8)
+
+
+def tile(texture: np.ndarray, size: tuple[int, int]) -> np.ndarray:
+    """Repeat an (H, W, C) texture from the top-left corner to fill (width, height)."""
+    width, height = size
+    h, w = texture.shape[:2]
+    reps = (-(-height // h), -(-width // w)) + (1,) * (texture.ndim - 2)
+    return np.tile(texture, reps)[:height, :width]
+
+
+def apply_gradient_map(rgba: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    """Shade an (H, W, 4) texture: RGB from the LUT at its luma, alpha = alpha * LUT alpha."""
+    out = lut[luma(rgba)]
+    alpha = rgba[..., 3].astype(np.uint16) * out[..., 3] + 127
+    out[..., 3] = (alpha // 255).astype(np.uint8)
+    return out
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Process-wide LRU cache of decoded images.
+
+Entries are keyed by resolved path, mtime and file size (plus the requested mode), so an
+edited file is decoded again while repeated opens of the same sprite, seed or texture are
+served from memory. The cache holds up to RESKIN_IMAGE_CACHE_MB of pixel data (default 512).
+
+load_image() hands out a private copy, so callers may mutate it freely. Read-only callers
+(size lookups, crops, getchannel, pasting it somewhere else) pass shared=True to get the
+cached instance without the copy; they must not modify it.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from PIL import Image
+
+DEFAULT_BUDGET_MB = 512
+BUDGET_ENV = "RESKIN_IMAGE_CACHE_MB"
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def _image_nbytes(img: Image.Image) -> int:
+    return img.width * img.height * len(img.getbands())
+
+
+class ImageCache:
+    def __init__(self, budget_bytes: int) -> None:
+        self.budget_bytes = budget_bytes
+        self.stats = CacheStats()
+        self._entries: OrderedDict[tuple, Image.Image] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path: Path | str, mode: str | None = "RGBA", *, shared: bool = False) -> Image.Image:
+        resolved = Path(path).resolve()
+        try:
+            stat = resolved.stat()
+        except FileNotFoundError:
+            raise SystemExit(f"Missing image: {path}") from None
+        key = (str(resolved), stat.st_mtime_ns, stat.st_size, mode)
+        with self._lock:
+            img = self._entries.get(key)
+            if img is not None:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+        if img is None:
+            img = self._decode(resolved, mode)
+            with self._lock:
+                self.stats.misses += 1
+                self._store(key, img)
+        return img if shared else img.copy()
+
+    def _decode(self, path: Path, mode: str | None) -> Image.Image:
+        with Image.open(path) as opened:
+            img = opened.convert(mode) if mode is not None and opened.mode != mode else opened.copy()
+        img.load()
+        return img
+
+    def _store(self, key: tuple, img: Image.Image) -> None:
+        size = _image_nbytes(img)
+        if size > self.budget_bytes or key in self._entries:
+            return
+        self._entries[key] = img
+        self._bytes += size
+        while self._bytes > self.budget_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= _image_nbytes(evicted)
+            self.stats.evictions += 1
+
+    def summary(self) -> str:
+        stats = self.stats
+        return (
+            f"Image cache: {stats.hits} hits / {stats.misses} misses "
+            f"({stats.hit_rate:.0%} hit rate), {stats.evictions} evictions, "
+            f"{self._bytes / (1024 * 1024):.1f} MB held"
+        )
+
+
+def _budget_from_env() -> int:
+    raw = os.environ.get(BUDGET_ENV, "").strip()
+    try:
+        megabytes = float(raw) if raw else DEFAULT_BUDGET_MB
+    except ValueError:
+        raise SystemExit(f"{BUDGET_ENV} must be a number of megabytes, got: {raw}") from None
+    return int(megabytes * 1024 * 1024)
+
+
+_cache = ImageCache(_budget_from_env())
+
+
+def load_image(path: Path | str, mode: str | None = "RGBA", *, shared: bool = False) -> Image.Image:
+    """Decoded image from the process-wide cache; mode=None keeps the file's own mode."""
+    return _cache.get(path, mode, shared=shared)
+
+
+def report() -> None:
+    """Print hit-rate stats if the cache was used."""
+    if _cache.stats.hits or _cache.stats.misses:
+        print(_cache.summary())
@@ -1,16 +1,38 @@
 #!/usr/bin/env python3
-"""Create a contact sheet with frame indices."""
+"""Create a contact sheet with frame indices.
+
+Frames are streamed: tile sizes come from the PNG headers, each frame is decoded straight to
+tile size (integer reduce() + LANCZOS when scaling down) on a thread pool, and pasted into the
+sheet as it arrives. If the folder already has an up-to-date animation stack, frames are read
+from it instead of the PNGs. --tile-rows writes the sheet as several PNGs of that many rows,
+so only one band of the sheet is ever in memory.
+"""
 from __future__ import annotations
 
 import argparse
 import math
 import os
-import re
 import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable, Iterator, Sequence
 
 from PIL import Image, ImageDraw, ImageFont
 
+from animation_stack import cached_stack, frame_files, frame_label, load_stack
+from frame_dedup import DEFAULT_HASH_DISTANCE, group_frames
+from reskin_imaging import downscale, open_downscaled
+
+GROUP_COLORS = [
+    (255, 64, 64, 255),
+    (64, 160, 255, 255),
+    (255, 200, 0, 255),
+    (200, 80, 255, 255),
+    (0, 220, 200, 255),
+    (255, 128, 0, 255),
+]
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser()
@@ -18,14 +40,65 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--output", required=True, help="Output PNG path")
     parser.add_argument("--cols", type=int, default=10, help="Columns")
     parser.add_argument("--scale", type=float, default=1.0, help="Scale each frame")
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=None,
+        help="Outline near-duplicate frame groups (max mean RGB difference, 0-255)",
+    )
+    parser.add_argument(
+        "--dedup-hash-distance",
+        type=int,
+        default=DEFAULT_HASH_DISTANCE,
+        help="Max differing perceptual-hash bits for frames in one group",
+    )
+    parser.add_argument(
+        "--tile-rows",
+        type=int,
+        default=0,
+        help="Write the sheet as <output>_NN.png files of this many rows each (0 = one PNG)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Decode threads (default: %(default)s)",
+    )
     return parser.parse_args()
 
 
-def frame_index(path: Path) -> int:
-    match = re.search(r"(\d+)", path.stem)
-    if match:
-        return int(match.group(1))
-    return 0
+def tile_size(frame_size: tuple[int, int], scale: float) -> tuple[int, int]:
+    return (int(frame_size[0] * scale), int(frame_size[1] * scale))
+
+
+def fit_tile(img: Image.Image, scale: float) -> Image.Image:
+    size = tile_size(img.size, scale)
+    if size == img.size:
+        return img
+    # Upscaled tiles keep hard pixel edges; reductions are filtered.
+    return downscale(img, size) if scale < 1.0 else img.resize(size, Image.NEAREST)
+
+
+def load_tile(path: Path, scale: float) -> Image.Image:
+    if scale < 1.0:
+        with Image.open(path) as img:
+            size = tile_size(img.size, scale)
+        return open_downscaled(path, size)
+    with Image.open(path) as img:
+        return fit_tile(img.convert("RGBA"), scale)
+
+
+def loaded_tiles(
+    pool: ThreadPoolExecutor, loaders: Sequence[Callable[[], Image.Image]], jobs: int
+) -> Iterator[Image.Image]:
+    """Run loaders on pool and yield their tiles in order, with at most jobs * 2 submitted ahead."""
+    window: deque = deque()
+    for load in loaders:
+        window.append(pool.submit(load))
+        if len(window) > jobs * 2:
+            yield window.popleft().result()
+    while window:
+        yield window.popleft().result()
 
 
 def main() -> int:
@@ -34,38 +107,75 @@ def main() -> int:
     if not input_dir.exists():
         raise SystemExit(f"Input folder not found: {input_dir}")
 
-    files = sorted([p for p in input_dir.iterdir() if p.suffix.lower() == ".png"], key=frame_index)
-    if not files:
-        raise SystemExit("No PNG frames found")
-
-    images = [Image.open(p).convert("RGBA") for p in files]
-    if args.scale != 1.0:
-        images = [img.resize((int(img.width * args.scale), int(img.height * args.scale)), Image.NEAREST) for img in images]
-
-    tile_w = max(img.width for img in images)
-    tile_h = max(img.height for img in images)
-
+    # Grouping needs the stack anyway; otherwise only use one that is already up to date.
+    stack = load_stack(input_dir) if args.dedup_threshold is not None else cached_stack(input_dir)
+    loaders: list[Callable[[], Image.Image]]
+    if stack is not None:
+        labels = list(stack.labels)
+        sizes = [stack.size] * len(labels)
+        loaders = [lambda i=i: fit_tile(Image.fromarray(stack.frames[i], "RGBA"), args.scale) for i in range(len(labels))]
+    else:
+        files = frame_files(input_dir)
+        labels = [frame_label(p) for p in files]
+        sizes = []
+        for p in files:
+            with Image.open(p) as img:
+                sizes.append(img.size)
+        loaders = [lambda p=p: load_tile(p, args.scale) for p in files]
+
+    tile_w = max(tile_size(size, args.scale)[0] for size in sizes)
+    tile_h = max(tile_size(size, args.scale)[1] for size in sizes)
     cols = max(1, args.cols)
-    rows = math.ceil(len(images) / cols)
-
-    sheet = Image.new("RGBA", (cols * tile_w, rows * tile_h), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(sheet)
+    rows = math.ceil(len(labels) / cols)
+    band_rows = args.tile_rows if args.tile_rows > 0 else rows
     font = ImageFont.load_default()
 
-    for idx, img in enumerate(images):
-        row = idx // cols
-        col = idx % cols
-        x = col * tile_w
-        y = row * tile_h
-        sheet.paste(img, (x, y))
-        label = f"{frame_index(files[idx]):03d}"
-        draw.rectangle([x + 2, y + 2, x + 28, y + 16], fill=(0, 0, 0, 160))
-        draw.text((x + 4, y + 3), label, fill=(255, 255, 255, 255), font=font)
+    # Duplicates get their representative's label ("005=003") and a per-group outline color.
+    rep_of: dict[int, int] = {}
+    color_of: dict[int, tuple[int, int, int, int]] = {}
+    if args.dedup_threshold is not None:
+        groups = group_frames(stack, threshold=args.dedup_threshold, hash_distance=args.dedup_hash_distance)
+        for group in groups:
+            for member in group.members:
+                rep_of[member] = group.representative
+            if len(group.members) > 1:
+                color_of[group.representative] = GROUP_COLORS[len(color_of) % len(GROUP_COLORS)]
+        print(f"{len(labels)} frames in {len(groups)} groups")
 
     output_path = Path(args.output)
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    sheet.save(output_path)
-    print(f"Wrote {output_path}")
+    written: list[Path] = []
+    jobs = max(1, args.jobs)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for band, first_row in enumerate(range(0, rows, band_rows)):
+            band_height = min(band_rows, rows - first_row)
+            first, last = first_row * cols, min(len(labels), (first_row + band_height) * cols)
+            sheet = Image.new("RGBA", (cols * tile_w, band_height * tile_h), (0, 0, 0, 0))
+            draw = ImageDraw.Draw(sheet)
+            # Tiles come back in order, so each one is pasted and dropped as soon as it is ready.
+            for idx, img in zip(range(first, last), loaded_tiles(pool, loaders[first:last], jobs)):
+                row = idx // cols - first_row
+                col = idx % cols
+                x = col * tile_w
+                y = row * tile_h
+                sheet.paste(img, (x, y))
+                label_value = labels[idx]
+                label = f"{label_value:03d}"
+                rep = rep_of.get(label_value, label_value)
+                if rep in color_of:
+                    draw.rectangle([x, y, x + tile_w - 1, y + tile_h - 1], outline=color_of[rep], width=2)
+                if rep != label_value:
+                    label = f"{label}={rep:03d}"
+                draw.rectangle([x + 2, y + 2, x + 10 + 6 * len(label), y + 16], fill=(0, 0, 0, 160))
+                draw.text((x + 4, y + 3), label, fill=(255, 255, 255, 255), font=font)
+            band_path = output_path
+            if band_rows < rows:
+                band_path = output_path.with_name(f"{output_path.stem}_{band:02d}{output_path.suffix}")
+            sheet.save(band_path)
+            written.append(band_path)
+
+    for path in written:
+        print(f"Wrote {path}")
     if os.environ.get("RESKIN_BATCH") != "1":
         subprocess.run(["open", str(output_path.parent)], check=True)
     return 0
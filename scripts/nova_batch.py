@@ -26,21 +26,33 @@ import time
 import sys
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Iterable, Iterator
 
 try:
     import tomllib  # py>=3.11
 except ModuleNotFoundError:  # py<=3.10 (our scripts venv)
     import tomli as tomllib
+import numpy as np
 from PIL import Image
 from PIL import ImageDraw
 
-from fal_video_generate import SUPPORTED_MODELS
+from animation_stack import load_stack, stream_stack
+from fal_concurrency import QUEUE_LATENCY_PREFIX, THROTTLED_EXIT_CODE, AimdController
+from fal_upload import upload_image
+from fal_video_generate import DEFAULT_MAX_DIM, MAX_UPLOAD_BYTES, SUPPORTED_MODELS
+from ffmpeg_frames import parse_time_seconds, read_frames
+from frame_dedup import DEFAULT_HASH_DISTANCE, FrameGroup, group_frames
+from image_cache import load_image, report as report_image_cache
+from remove_frame_border import fill_border, parse_hex_color
+from reskin_imaging import downscale
 
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 PYTHON = sys.executable
 FAL_MIN_ASPECT_RATIO = 0.4
 FAL_MAX_ASPECT_RATIO = 2.5
+MAX_THROTTLE_RETRIES = 5
+THROTTLE_BACKOFF_SECONDS = 10.0
 
 
 def _abs(path_value: str) -> Path:
@@ -63,6 +75,37 @@ def run(cmd: list[str], *, batch: bool = True) -> None:
     subprocess.run(cmd, check=True, cwd=str(PROJECT_ROOT), env=env)
 
 
+def run_fal_job(cmd: list[str]) -> tuple[float | None, bool]:
+    """Run a fal helper script in batch mode, echoing its output.
+
+    Returns (queue latency in seconds if the script reported it, whether fal throttled it).
+    """
+
+    print("Running:", " ".join(cmd))
+    env = os.environ.copy()
+    env["RESKIN_BATCH"] = "1"
+    env["PYTHONUNBUFFERED"] = "1"
+    queue_seconds: float | None = None
+    with subprocess.Popen(
+        cmd,
+        cwd=str(PROJECT_ROOT),
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    ) as proc:
+        assert proc.stdout is not None
+        for line in proc.stdout:
+            print(line, end="")
+            if line.startswith(QUEUE_LATENCY_PREFIX):
+                queue_seconds = float(line[len(QUEUE_LATENCY_PREFIX) :].strip().rstrip("s"))
+    if proc.returncode == THROTTLED_EXIT_CODE:
+        return queue_seconds, True
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+    return queue_seconds, False
+
+
 def open_folder(path: Path) -> None:
     subprocess.run(["open", str(path)], check=True)
 
@@ -87,22 +130,6 @@ def parse_indices(value: str) -> list[int]:
     return indices
 
 
-def parse_time_seconds(value: str) -> float:
-    raw = value.strip()
-    if raw == "":
-        raise ValueError("Empty time value")
-    if ":" not in raw:
-        return float(raw)
-    parts = [p.strip() for p in raw.split(":")]
-    if len(parts) > 3:
-        raise ValueError(f"Invalid time format: {value}")
-    vals = [float(p) for p in parts]
-    while len(vals) < 3:
-        vals.insert(0, 0.0)
-    hours, minutes, seconds = vals
-    return hours * 3600 + minutes * 60 + seconds
-
-
 def is_greenscreen(path: Path, key: tuple[int, int, int] = (0, 177, 64), tol: int = 12) -> bool:
     img = Image.open(path).convert("RGB")
     w, h = img.size
@@ -114,6 +141,18 @@ def is_greenscreen(path: Path, key: tuple[int, int, int] = (0, 177, 64), tol: in
     return False
 
 
+def transfer_matte(src: Path, matted: Path, dest: Path) -> None:
+    """Write src with the alpha channel of an already bg-removed near-duplicate frame."""
+    img = load_image(src)
+    alpha = load_image(matted, shared=True).getchannel("A")
+    if alpha.size != img.size:
+        raise SystemExit(f"Matte size mismatch: {matted} is {alpha.size}, {src} is {img.size}")
+    img.putalpha(alpha)
+    tmp = dest.with_suffix(".tmp.png")
+    img.save(tmp)
+    tmp.replace(dest)
+
+
 def ensure_dirs(*dirs: Path) -> None:
     for d in dirs:
         d.mkdir(parents=True, exist_ok=True)
@@ -129,20 +168,51 @@ def chosen_video_path(video_dir: Path, anim_name: str) -> Path:
     return p
 
 
-def resize_frames_to_match(raw_dir: Path, target_size: tuple[int, int]) -> None:
-    target_w, target_h = target_size
-    for frame_path in sorted(raw_dir.glob("*.png")):
-        img = Image.open(frame_path).convert("RGBA")
-        if img.size == (target_w, target_h):
-            continue
-        img = img.resize((target_w, target_h), Image.LANCZOS)
-        img.save(frame_path)
+def write_extracted_frames(
+    raw_dir: Path,
+    frames: Iterable[np.ndarray],
+    target_size: tuple[int, int] | None,
+    *,
+    thickness: int,
+    fill: tuple[int, int, int, int],
+) -> None:
+    """Write frames piped from ffmpeg as raw_dir/frame_NNN.png plus the raw/ animation stack.
+
+    With a target size (frame guide on) each frame is resized to the seed canvas and the frame
+    guide painted out in memory, so every PNG is encoded exactly once and never decoded again
+    here; the contact sheet reads the stack. Frames are spooled into the stack as they are
+    written, so only one is held in memory at a time.
+    """
+
+    def normalized() -> Iterator[tuple[Path, np.ndarray]]:
+        for number, frame in enumerate(frames, start=1):
+            img = Image.fromarray(frame, "RGBA")
+            if target_size is not None:
+                img = downscale(img, target_size)
+                fill_border(img, thickness, fill)
+            path = raw_dir / f"frame_{number:03d}.png"
+            img.save(path)
+            yield path, np.asarray(img)
+
+    stream_stack(raw_dir, normalized())
 
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", default="docs/reskin/nova_animations.toml", help="Path to TOML config")
     parser.add_argument("--parallel", type=int, default=10, help="Max concurrent Fal jobs")
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Adapt video job concurrency (AIMD): start at --parallel, grow while fal queue "
+        "latency stays flat, halve on throttling or latency spikes",
+    )
+    parser.add_argument(
+        "--max-parallel",
+        type=int,
+        default=32,
+        help="Upper bound for --adaptive concurrency",
+    )
     parser.add_argument("--make-videos", action="store_true", help="Generate video variants")
     parser.add_argument("--make-frames", action="store_true", help="Extract frames + contact sheets")
     parser.add_argument("--apply-sprites", action="store_true", help="BG remove selected + write sprites")
@@ -202,7 +272,7 @@ def main() -> int:
         match_path = _abs(frame_guide_match)
         if not match_path.exists():
             raise SystemExit(f"Frame guide match sprite not found: {match_path}")
-        target_frame_size = Image.open(match_path).convert("RGBA").size
+        target_frame_size = load_image(match_path, shared=True).size
 
         anchor_framed = str(global_cfg.get("anchor_framed") or "").strip()
         if not anchor_framed:
@@ -268,9 +338,9 @@ def main() -> int:
             return anchor_framed_path
         return anchor_image_path
 
-    def build_seed_base_for_anim(anim: dict, seed_dir: Path) -> Path:
+    def build_seed_base_for_anim(anim: dict) -> Image.Image:
         if not frame_guide_enabled:
-            return seed_base_image()
+            return load_image(seed_base_image())
 
         pad_color = str(global_cfg.get("pad_color") or "#00b140").strip()
         guide_color = str(global_cfg.get("frame_guide_color") or "#ffffff").strip()
@@ -285,11 +355,11 @@ def main() -> int:
         if not match_path.exists():
             raise SystemExit(f"Seed match sprite not found: {match_path}")
 
-        target_w, target_h = Image.open(match_path).convert("RGBA").size
+        target_w, target_h = load_image(match_path, shared=True).size
         seed_w = target_w
         seed_h = target_h
 
-        source = Image.open(anchor_image_path).convert("RGBA")
+        source = load_image(anchor_image_path, shared=True)
 
         def cfg_float(key: str, default: float) -> float:
             value = anim.get(key)
@@ -374,12 +444,25 @@ def main() -> int:
                 [i, i, seed_w - 1 - i, seed_h - 1 - i],
                 outline=guide_color,
             )
-
-        out = seed_dir / "seed_base.png"
-        canvas.save(out)
-        return out
+        return canvas
+
+    def dedup_settings(anim: dict) -> tuple[float, int] | None:
+        """(threshold, hash distance) for near-duplicate frame grouping, or None when disabled."""
+        threshold = anim.get("dedup_threshold")
+        if threshold is None:
+            threshold = global_cfg.get("dedup_threshold")
+        if threshold is None:
+            return None
+        hash_distance = anim.get("dedup_hash_distance")
+        if hash_distance is None:
+            hash_distance = global_cfg.get("dedup_hash_distance", DEFAULT_HASH_DISTANCE)
+        if float(threshold) < 0 or int(hash_distance) < 0:
+            raise SystemExit("dedup_threshold and dedup_hash_distance must be >= 0")
+        return float(threshold), int(hash_distance)
 
     def make_videos(anims: list[dict]) -> None:
+        if "FAL_KEY" not in os.environ:
+            raise SystemExit("FAL_KEY is not set in the environment.")
         run_id = time.strftime("%Y%m%d_%H%M%S")
         jobs: list[list[str]] = []
 
@@ -425,23 +508,30 @@ def main() -> int:
             seed_dir = padded_dir / name / run_id
             out_dir = video_dir / name / run_id
             ensure_dirs(seed_dir, out_dir)
-            anim_seed_base = build_seed_base_for_anim(anim, seed_dir)
+            seed_base = build_seed_base_for_anim(anim)
+            # Keep one copy as a record of the seed; every variant shares a single in-memory upload.
+            seed_base.save(seed_dir / "seed_base.png")
+            # Oversized seeds are shrunk to fit, as fal_video_generate --image would (--max-dim default).
+            seed_url = upload_image(
+                seed_base,
+                file_name=f"{name}_seed_base.png",
+                max_bytes=MAX_UPLOAD_BYTES,
+                max_dim=DEFAULT_MAX_DIM,
+            )
 
-            end_image_arg: str | None = None
+            end_image_args: list[str] = []
             if end_mode == "none":
-                end_image_arg = "none"
+                end_image_args = ["--end-image", "none"]
             elif end_mode == "flip":
-                end_path = seed_dir / "end_flip.png"
-                src = Image.open(anim_seed_base).convert("RGBA")
-                src = src.transpose(Image.FLIP_LEFT_RIGHT)
-                src.save(end_path)
-                end_image_arg = str(end_path)
+                end_url = upload_image(
+                    seed_base.transpose(Image.FLIP_LEFT_RIGHT),
+                    file_name=f"{name}_end_flip.png",
+                    max_bytes=MAX_UPLOAD_BYTES,
+                    max_dim=DEFAULT_MAX_DIM,
+                )
+                end_image_args = ["--end-image-url", end_url]
 
             for idx, base_prompt in enumerate(prompts, start=1):
-                seed_path = seed_dir / f"v{idx}.png"
-                if not seed_path.exists():
-                    shutil.copy2(anim_seed_base, seed_path)
-
                 final_prompt = f"{base_prompt}. {constraints}" if constraints else base_prompt
 
                 cmd = [
@@ -449,10 +539,12 @@ def main() -> int:
                     "scripts/fal_video_generate.py",
                     "--model",
                     video_model,
-                    "--image",
-                    str(seed_path),
+                    "--image-url",
+                    seed_url,
                     "--output-dir",
                     str(out_dir),
+                    "--output-name",
+                    f"v{idx}.mp4",
                     "--prompt",
                     final_prompt,
                     "--resolution",
@@ -462,18 +554,45 @@ def main() -> int:
                 ]
                 if SUPPORTED_MODELS[video_model]["supports_negative"]:
                     cmd += ["--negative", anim_negative]
-                if end_image_arg is not None:
-                    cmd += ["--end-image", end_image_arg]
+                cmd += end_image_args
                 jobs.append(cmd)
 
-        with ThreadPoolExecutor(max_workers=max(1, int(args.parallel))) as executor:
-            futures = [executor.submit(run, cmd) for cmd in jobs]
-            for future in as_completed(futures):
-                future.result()
+        if args.adaptive:
+            run_video_jobs_adaptive(jobs)
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, int(args.parallel))) as executor:
+                futures = [executor.submit(run, cmd) for cmd in jobs]
+                for future in as_completed(futures):
+                    future.result()
 
         print(f"Videos complete. Pick winners and copy to: {video_dir}/<anim>/chosen.mp4")
         open_folder(video_dir)
 
+    def run_video_jobs_adaptive(jobs: list[list[str]]) -> None:
+        max_parallel = max(1, int(args.max_parallel))
+        controller = AimdController(initial=max(1, int(args.parallel)), maximum=max_parallel, label="videos")
+
+        def run_job(cmd: list[str]) -> None:
+            for attempt in range(MAX_THROTTLE_RETRIES + 1):
+                slot = controller.acquire()
+                try:
+                    queue_seconds, throttled = run_fal_job(cmd)
+                except BaseException:
+                    controller.release(slot)
+                    raise
+                controller.release(slot, queue_seconds=queue_seconds, throttled=throttled)
+                if not throttled:
+                    return
+                time.sleep(THROTTLE_BACKOFF_SECONDS * (attempt + 1))
+            raise SystemExit(f"fal kept throttling after {MAX_THROTTLE_RETRIES} retries: {' '.join(cmd)}")
+
+        # The controller gates admission; the pool only needs enough threads for the ceiling.
+        with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+            futures = [executor.submit(run_job, cmd) for cmd in jobs]
+            for future in as_completed(futures):
+                future.result()
+        print(controller.summary())
+
     def make_frames(anims: list[dict]) -> None:
         pad_color = str(global_cfg.get("pad_color") or "#00b140")
         contact_cols = int(global_cfg.get("contact_cols") or 10)
@@ -497,14 +616,14 @@ def main() -> int:
             for p in raw_dir.glob("*.png"):
                 p.unlink()
 
-            cmd = ["ffmpeg", "-y", "-i", str(video_path)]
+            trim_args: list[str] = []
             start_seconds: float | None = None
             end_seconds: float | None = None
             duration_seconds: float | None = None
 
             if extract_start:
                 start_seconds = parse_time_seconds(str(extract_start))
-                cmd += ["-ss", f"{start_seconds:.3f}"]
+                trim_args += ["-ss", f"{start_seconds:.3f}"]
             if extract_end:
                 end_seconds = parse_time_seconds(str(extract_end))
             if extract_duration:
@@ -513,48 +632,38 @@ def main() -> int:
                 duration_seconds = max(0.0, end_seconds - start_seconds)
                 end_seconds = None
             if duration_seconds is not None:
-                cmd += ["-t", f"{duration_seconds:.3f}"]
+                trim_args += ["-t", f"{duration_seconds:.3f}"]
             elif end_seconds is not None:
-                cmd += ["-to", f"{end_seconds:.3f}"]
-
-            cmd += ["-vf", f"fps={extract_fps}", str(raw_dir / "frame_%03d.png")]
-            run(cmd, batch=False)
-
-            if frame_guide_enabled:
-                # Normalize extracted frames back to the deterministic seed canvas size for this animation.
-                # This preserves character pixel scale and makes border removal deterministic.
-                seed_path = build_seed_base_for_anim(anim, raw_dir)
-                seed_size = Image.open(seed_path).convert("RGBA").size
-                seed_path.unlink(missing_ok=True)
-                resize_frames_to_match(raw_dir, seed_size)
-                run(
-                    [
-                        PYTHON,
-                        "scripts/remove_frame_border.py",
-                        "--input",
-                        str(raw_dir),
-                        "--thickness",
-                        str(frame_guide_thickness),
-                        "--fill",
-                        pad_color,
-                    ]
-                )
-
-            run(
-                [
-                    PYTHON,
-                    "scripts/make_contact_sheet.py",
-                    "--input",
-                    str(raw_dir),
-                    "--output",
-                    str(contact_path),
-                    "--cols",
-                    str(contact_cols),
-                    "--scale",
-                    str(contact_scale),
-                ]
+                trim_args += ["-to", f"{end_seconds:.3f}"]
+
+            # Normalize extracted frames back to the deterministic seed canvas size for this animation.
+            # This preserves character pixel scale and makes border removal deterministic.
+            target_size = build_seed_base_for_anim(anim).size if frame_guide_enabled else None
+            write_extracted_frames(
+                raw_dir,
+                read_frames(video_path, fps=extract_fps, output_args=trim_args),
+                target_size,
+                thickness=max(0, frame_guide_thickness),
+                fill=parse_hex_color(pad_color),
             )
 
+            cmd = [
+                PYTHON,
+                "scripts/make_contact_sheet.py",
+                "--input",
+                str(raw_dir),
+                "--output",
+                str(contact_path),
+                "--cols",
+                str(contact_cols),
+                "--scale",
+                str(contact_scale),
+            ]
+            dedup = dedup_settings(anim)
+            if dedup is not None:
+                cmd += ["--dedup-threshold", str(dedup[0]), "--dedup-hash-distance", str(dedup[1])]
+            run(cmd)
+
         open_folder(frames_dir)
 
     def apply_sprites(anims: list[dict]) -> None:
@@ -622,23 +731,41 @@ def main() -> int:
                     raise SystemExit(f"Frame label not found for {name}: {label}")
                 selected_sources.append(label_to_path[label])
 
+            # Near-duplicate frames share one bria matte: only group representatives go to
+            # selected/ (the bg removal input); the other members reuse the representative's alpha.
+            dedup = dedup_settings(anim)
+            if dedup is None:
+                groups = [
+                    FrameGroup(representative=label, members=(label,)) for label in dict.fromkeys(selected_labels)
+                ]
+            else:
+                groups = group_frames(
+                    load_stack(raw_dir), selected_labels, threshold=dedup[0], hash_distance=dedup[1]
+                )
+                print(
+                    f"{name}: {len(groups)} of {len(set(selected_labels))} selected frames need bg removal "
+                    f"(dedup_threshold={dedup[0]:g})"
+                )
+            rep_sources = [label_to_path[group.representative] for group in groups]
+
             # Keep selected/ final folders in sync with chosen labels.
             selected_names = {p.name for p in selected_sources}
+            rep_names = {p.name for p in rep_sources}
             for p in selected_dir.glob("*.png"):
-                if p.name not in selected_names:
+                if p.name not in rep_names:
                     p.unlink()
             for p in final_dir.glob("*.png"):
                 if p.name not in selected_names:
                     p.unlink()
 
-            for src in selected_sources:
+            for src in rep_sources:
                 dest = selected_dir / src.name
                 if dest.exists() and dest.stat().st_mtime >= src.stat().st_mtime and is_greenscreen(dest):
                     continue
                 shutil.copy2(src, dest)
 
             def final_is_current() -> bool:
-                for fname in selected_names:
+                for fname in rep_names:
                     src = selected_dir / fname
                     out = final_dir / fname
                     if not out.exists():
@@ -660,10 +787,19 @@ def main() -> int:
                         str(max(1, int(args.parallel))),
                     ]
                 )
-                missing = [n for n in selected_names if not (final_dir / n).exists()]
+                missing = [n for n in rep_names if not (final_dir / n).exists()]
                 if missing:
                     raise SystemExit(f"Missing BG-removed frames for {name}: {', '.join(sorted(missing))}")
 
+            for group in groups:
+                rep_final = final_dir / label_to_path[group.representative].name
+                for label in group.members[1:]:
+                    src = label_to_path[label]
+                    out = final_dir / src.name
+                    if out.exists() and out.stat().st_mtime >= max(src.stat().st_mtime, rep_final.stat().st_mtime):
+                        continue
+                    transfer_matte(src, rep_final, out)
+
             # Build output index mapping so filenames match the game's expected numbering.
             output_indices: list[int] | None = None
             if not single_frame:
@@ -724,6 +860,7 @@ def main() -> int:
         make_frames(anims)
         apply_sprites(anims)
 
+    report_image_cache()
     return 0
 
 
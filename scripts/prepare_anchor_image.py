@@ -4,13 +4,16 @@ from __future__ import annotations
 import argparse
 import os
 import subprocess
-import time
 import urllib.request
 from pathlib import Path
 from io import BytesIO
+
+import numpy as np
 from PIL import Image, ImageDraw
 
-import fal_client
+from fal_bg_remove import remove_background_url
+from reskin_imaging import median_color, near_color_mask, seeded_region
+from sprite_metrics import sprite_metrics
 
 
 def parse_hex_color(value: str) -> tuple[int, int, int, int]:
@@ -23,62 +26,18 @@ def parse_hex_color(value: str) -> tuple[int, int, int, int]:
     return (r, g, b, 255)
 
 
-def visible_bbox(img: Image.Image, key_color: tuple[int, int, int], tol: int) -> tuple[int, int, int, int] | None:
-    pixels = img.getdata()
-    mask = Image.new("L", img.size, 0)
-    out = []
-    key_r, key_g, key_b = key_color
-    for r, g, b, a in pixels:
-        if a == 0:
-            out.append(0)
-            continue
-        if abs(r - key_r) <= tol and abs(g - key_g) <= tol and abs(b - key_b) <= tol:
-            out.append(0)
-        else:
-            out.append(255)
-    mask.putdata(out)
-    return mask.getbbox()
-
-
-def median_color(pixels: list[tuple[int, int, int]]) -> tuple[int, int, int]:
-    rs = sorted(p[0] for p in pixels)
-    gs = sorted(p[1] for p in pixels)
-    bs = sorted(p[2] for p in pixels)
-    mid = len(rs) // 2
-    return (rs[mid], gs[mid], bs[mid])
-
-
 def remove_bg_with_fal(path: Path, poll: float = 2.0) -> Image.Image:
     if "FAL_KEY" not in os.environ:
         raise SystemExit("FAL_KEY is not set; required for background removal.")
-    image_url = fal_client.upload_file(str(path))
-    handler = fal_client.submit("fal-ai/bria/background/remove", arguments={"image_url": image_url})
-    request_id = handler.request_id
-    while True:
-        status = fal_client.status("fal-ai/bria/background/remove", request_id, with_logs=False)
-        if isinstance(status, fal_client.Completed):
-            result = fal_client.result("fal-ai/bria/background/remove", request_id)
-            url = None
-            if isinstance(result, dict):
-                if "image" in result and isinstance(result["image"], dict):
-                    url = result["image"].get("url")
-                if url is None and "images" in result and result["images"]:
-                    url = result["images"][0].get("url")
-            if not url:
-                raise SystemExit(f"No image URL in result: {result}")
-            with urllib.request.urlopen(url) as response:
-                data = response.read()
-            return Image.open(BytesIO(data)).convert("RGBA")
-        if isinstance(status, (fal_client.Queued, fal_client.InProgress)):
-            time.sleep(poll)
-            continue
-        time.sleep(poll)
+    url = remove_background_url(path, poll)
+    with urllib.request.urlopen(url) as response:
+        data = response.read()
+    return Image.open(BytesIO(data)).convert("RGBA")
 
 
 def ensure_transparency(img: Image.Image, tol: int = 12) -> Image.Image:
     # Remove a solid background color by flood-filling from the corners.
     w, h = img.size
-    sample = []
     band = max(1, min(w, h) // 30)
     corners = [
         (0, 0, band, band),
@@ -86,39 +45,16 @@ def ensure_transparency(img: Image.Image, tol: int = 12) -> Image.Image:
         (0, h - band, band, h),
         (w - band, h - band, w, h),
     ]
-    px = img.load()
-    for x0, y0, x1, y1 in corners:
-        for y in range(y0, y1):
-            for x in range(x0, x1):
-                r, g, b, a = px[x, y]
-                sample.append((r, g, b))
-    if not sample:
+    rgb = np.asarray(img)[:, :, :3]
+    sample = np.concatenate([rgb[y0:y1, x0:x1].reshape(-1, 3) for x0, y0, x1, y1 in corners])
+    if not sample.size:
         return img
     bg = median_color(sample)
-    bg_r, bg_g, bg_b = bg
-
-    def near_bg(r: int, g: int, b: int) -> bool:
-        dr = r - bg_r
-        dg = g - bg_g
-        db = b - bg_b
-        return (dr * dr + dg * dg + db * db) ** 0.5 <= tol
-
-    visited = [[False] * w for _ in range(h)]
-    stack = [(0, 0), (w - 1, 0), (0, h - 1), (w - 1, h - 1)]
-    while stack:
-        x, y = stack.pop()
-        if x < 0 or y < 0 or x >= w or y >= h:
-            continue
-        if visited[y][x]:
-            continue
-        visited[y][x] = True
-        r, g, b, a = px[x, y]
-        if not near_bg(r, g, b):
-            continue
-        # mark as background and expand
-        px[x, y] = (r, g, b, 0)
-        stack.extend([(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)])
-
+    near_bg = near_color_mask(rgb, bg, tol)
+    background = seeded_region(near_bg, [(0, 0), (w - 1, 0), (0, h - 1), (w - 1, h - 1)])
+    alpha = np.asarray(img.getchannel("A")).copy()
+    alpha[background] = 0
+    img.putalpha(Image.fromarray(alpha, "L"))
     return img
 
 
@@ -176,16 +112,14 @@ def main() -> int:
     key = parse_hex_color(args.key)
     key_rgb = (key[0], key[1], key[2])
 
-    match_img = Image.open(match_path).convert("RGBA")
-    match_bbox = visible_bbox(match_img, key_rgb, 12)
-    if not match_bbox:
+    match = sprite_metrics(match_path, key_rgb, 12)
+    if not match.bbox:
         raise SystemExit("No visible pixels found in match sprite.")
-    match_visible_h = match_bbox[3] - match_bbox[1]
+    match_visible_h = match.visible_height
     if match_visible_h <= 0:
         raise SystemExit("Match sprite visible height is invalid.")
-    match_bottom = match_bbox[3] - 1
-    target_w, target_h = match_img.size
-    baseline_pad = (target_h - 1) - match_bottom
+    target_w, target_h = match.size
+    baseline_pad = match.baseline_pad
 
     # Use Fal background removal for reliable keying.
     src = remove_bg_with_fal(input_path)
@@ -7,9 +7,16 @@ import datetime
 import os
 import re
 import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import numpy as np
 from PIL import Image
 from pathlib import Path
 
+from animation_stack import cached_stack, frame_files, frame_label
+from reskin_imaging import visible_bbox
+from sprite_metrics import sprite_metrics
+
 
 DEFAULT_KEY_COLOR = (0, 177, 64)
 DEFAULT_TOL = 12
@@ -50,16 +57,15 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Skip bbox/scale and write frames on the full canvas size",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes for per-frame processing (default: %(default)s)",
+    )
     return parser.parse_args()
 
 
-def frame_label(path: Path) -> int:
-    match = re.search(r"(\d+)", path.stem)
-    if match:
-        return int(match.group(1))
-    return 0
-
-
 def parse_indices(value: str) -> list[int]:
     parts = [p.strip() for p in value.split(",") if p.strip()]
     indices: list[int] = []
@@ -77,21 +83,26 @@ def parse_indices(value: str) -> list[int]:
     return indices
 
 
-def visible_bbox(img: Image.Image, key_color: tuple[int, int, int], tol: int) -> tuple[int, int, int, int] | None:
-    pixels = img.getdata()
-    mask = Image.new("L", img.size, 0)
-    out = []
-    key_r, key_g, key_b = key_color
-    for r, g, b, a in pixels:
-        if a == 0:
-            out.append(0)
-            continue
-        if abs(r - key_r) <= tol and abs(g - key_g) <= tol and abs(b - key_b) <= tol:
-            out.append(0)
-        else:
-            out.append(255)
-    mask.putdata(out)
-    return mask.getbbox()
+def place_scaled(
+    img: Image.Image,
+    *,
+    size: tuple[int, int],
+    offset: tuple[int, int],
+    canvas_size: tuple[int, int],
+    masked: bool,
+) -> Image.Image:
+    """Resize img to size (one LANCZOS pass) and paste it at offset on a transparent canvas.
+
+    Any overflow is clipped by paste, so the result is identical to resize-then-crop-then-paste.
+    """
+    x, y = offset
+    out = Image.new("RGBA", canvas_size, (0, 0, 0, 0))
+    if x >= canvas_size[0] or y >= canvas_size[1] or x + size[0] <= 0 or y + size[1] <= 0:
+        return out
+    if size != img.size:
+        img = img.resize(size, Image.LANCZOS)
+    out.paste(img, (x, y), img if masked else None)
+    return out
 
 
 def canvas_scale_on_baseline(
@@ -110,16 +121,12 @@ def canvas_scale_on_baseline(
         return img
     new_w = max(1, int(round(target_w * scale)))
     new_h = max(1, int(round(target_h * scale)))
-    scaled = img.resize((new_w, new_h), Image.LANCZOS)
 
     # Keep the baseline line at the same Y after scaling.
     baseline_scaled = int(round(baseline_y * scale))
     x0 = int(round((target_w - new_w) / 2))
     y0 = int(round(baseline_y - baseline_scaled))
-
-    out = Image.new("RGBA", (target_w, target_h), (0, 0, 0, 0))
-    out.paste(scaled, (x0, y0), scaled)
-    return out
+    return place_scaled(img, size=(new_w, new_h), offset=(x0, y0), canvas_size=(target_w, target_h), masked=True)
 
 
 def fit_canvas_no_scale(img: Image.Image, *, target_w: int, target_h: int) -> Image.Image:
@@ -154,6 +161,92 @@ def fit_canvas_no_scale(img: Image.Image, *, target_w: int, target_h: int) -> Im
     return img
 
 
+def bbox_scale_on_baseline(
+    img: Image.Image,
+    *,
+    bbox: tuple[int, int, int, int],
+    scale_factor: float,
+    baseline_pad: int,
+    target_w: int,
+    target_h: int,
+    flip_h: bool,
+) -> Image.Image:
+    """Crop to the visible bbox, scale, and stand the sprite on the baseline (centered).
+
+    Oversized sprites are center-cropped horizontally and bottom-cropped; the crop and placement
+    are folded into one place_scaled call, so the sprite is resampled once.
+    """
+    sprite = img.crop(bbox)
+    if flip_h:
+        # Mirroring is lossless and commutes with the resize.
+        sprite = sprite.transpose(Image.FLIP_LEFT_RIGHT)
+    new_w = max(1, int(round(sprite.width * scale_factor)))
+    new_h = max(1, int(round(sprite.height * scale_factor)))
+    kept_w = min(new_w, target_w)
+    crop_left = int((new_w - target_w) / 2) if new_w > target_w else 0
+    if flip_h:
+        # The center crop is taken before mirroring, so mirror its position as well.
+        crop_left = new_w - crop_left - kept_w
+    x = int((target_w - kept_w) / 2) - crop_left
+    y = (target_h - baseline_pad) - new_h
+    return place_scaled(sprite, size=(new_w, new_h), offset=(x, y), canvas_size=(target_w, target_h), masked=False)
+
+
+@dataclass(frozen=True)
+class FramePlan:
+    """Per-run placement settings, computed once in main() and shared with worker processes."""
+
+    target_w: int
+    target_h: int
+    baseline_y: int
+    baseline_pad: int
+    scale_mult: float
+    scale_factor: float
+    use_canvas: bool
+    flip_h: bool
+
+
+def transform_frame(plan: FramePlan, img: Image.Image) -> Image.Image:
+    if plan.use_canvas:
+        img = fit_canvas_no_scale(img, target_w=plan.target_w, target_h=plan.target_h)
+        if plan.flip_h:
+            img = img.transpose(Image.FLIP_LEFT_RIGHT)
+        return canvas_scale_on_baseline(
+            img,
+            scale=plan.scale_mult,
+            baseline_y=plan.baseline_y,
+            target_w=plan.target_w,
+            target_h=plan.target_h,
+        )
+    bbox = visible_bbox(img, DEFAULT_KEY_COLOR, DEFAULT_TOL)
+    if not bbox:
+        raise SystemExit("No visible pixels after green-screen mask.")
+    return bbox_scale_on_baseline(
+        img,
+        bbox=bbox,
+        scale_factor=plan.scale_factor,
+        baseline_pad=plan.baseline_pad,
+        target_w=plan.target_w,
+        target_h=plan.target_h,
+        flip_h=plan.flip_h,
+    )
+
+
+def load_frame(source: Path | np.ndarray) -> Image.Image:
+    if isinstance(source, Path):
+        with Image.open(source) as img:
+            return img.convert("RGBA")
+    return Image.fromarray(source, "RGBA")
+
+
+def write_frame(plan: FramePlan, source: Path | np.ndarray, dest: Path) -> None:
+    out = transform_frame(plan, load_frame(source))
+    # Write next to the destination and rename over it, so readers never see a partial PNG.
+    tmp = dest.with_name(f".{dest.name}.{os.getpid()}.tmp.png")
+    out.save(tmp)
+    tmp.replace(dest)
+
+
 def main() -> int:
     args = parse_args()
     input_dir = Path(args.input)
@@ -169,28 +262,22 @@ def main() -> int:
     if not scale_ref_path.exists():
         raise SystemExit(f"Scale reference not found: {scale_ref_path}")
 
-    files = sorted(
-        [p for p in input_dir.iterdir() if p.suffix.lower() == ".png"],
-        key=frame_label,
-    )
-    if not files:
-        raise SystemExit("No PNG frames found in input folder")
-
-    match_img = Image.open(match_path).convert("RGBA")
-    target_w, target_h = match_img.size
+    files = frame_files(input_dir)
+    label_to_file = {frame_label(p): p for p in files}
+    # An up-to-date animation stack (e.g. final/ after --apply-sprites) saves decoding the
+    # selected PNGs; without one only the selected files are decoded, and none is written.
+    stack = cached_stack(input_dir)
 
     # Baseline derived from the reference sprite (used in both bbox and canvas modes).
-    key_color = DEFAULT_KEY_COLOR
-    tol = DEFAULT_TOL
-    match_bbox = visible_bbox(match_img, key_color, tol)
-    if not match_bbox:
+    match = sprite_metrics(match_path, DEFAULT_KEY_COLOR, DEFAULT_TOL)
+    target_w, target_h = match.size
+    if not match.bbox:
         raise SystemExit("No visible pixels found in match sprite.")
-    match_visible_h = match_bbox[3] - match_bbox[1]
+    match_visible_h = match.visible_height
     if match_visible_h <= 0:
         raise SystemExit("Match sprite visible height is invalid.")
-    match_bottom = match_bbox[3] - 1
-    baseline_pad = (target_h - 1) - match_bottom
-    baseline_y = (target_h - baseline_pad) - 1
+    baseline_pad = match.baseline_pad
+    baseline_y = match.baseline_y
 
     if args.backup:
         stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -199,22 +286,21 @@ def main() -> int:
         for p in dest_dir.glob(f"{args.prefix}[0-9][0-9].png"):
             p.replace(backup_dir / p.name)
 
-    selected_files: list[Path] | None = None
-    labels = parse_indices(args.indices)
-    label_to_index = {frame_label(p): i for i, p in enumerate(files)}
-    selected_files = []
-    for label in labels:
-        if label not in label_to_index:
+    selected_labels = parse_indices(args.indices)
+    sources: list[Path | np.ndarray] = []
+    for label in selected_labels:
+        if label not in label_to_file:
             raise SystemExit(f"Frame label not found: {label}")
-        selected_files.append(files[label_to_index[label]])
+        # A stack frame is a view into the mapping; only that frame is copied to a worker.
+        sources.append(stack.frame(label) if stack is not None else label_to_file[label])
 
     output_indices: list[str] | None = None
     if args.output_indices:
         labels = parse_indices(args.output_indices)
-        if len(labels) != len(selected_files):
+        if len(labels) != len(selected_labels):
             raise SystemExit(
                 "Output indices count does not match selected frames "
-                f"({len(labels)} != {len(selected_files)})"
+                f"({len(labels)} != {len(selected_labels)})"
             )
         output_indices = [f"{label:0{args.output_width}d}" for label in labels]
 
@@ -222,7 +308,7 @@ def main() -> int:
     if args.single_frame:
         expected_names.add(f"{args.prefix}.png")
     else:
-        for out_index in range(len(selected_files)):
+        for out_index in range(len(selected_labels)):
             if output_indices:
                 suffix = output_indices[out_index]
             else:
@@ -242,115 +328,52 @@ def main() -> int:
             if p.is_file() and pattern.match(p.name):
                 p.unlink()
 
+    scale_factor = 1.0
+    if not args.use_canvas:
+        scale_ref = sprite_metrics(scale_ref_path, DEFAULT_KEY_COLOR, DEFAULT_TOL)
+        if not scale_ref.bbox:
+            raise SystemExit("No visible pixels found in scale reference.")
+        scale_ref_visible_h = scale_ref.visible_height
+        if scale_ref_visible_h <= 0:
+            raise SystemExit("Scale reference visible height is invalid.")
+        scale_factor = (match_visible_h / scale_ref_visible_h) * args.scale_mult
+
+    plan = FramePlan(
+        target_w=target_w,
+        target_h=target_h,
+        baseline_y=baseline_y,
+        baseline_pad=baseline_pad,
+        scale_mult=float(args.scale_mult),
+        scale_factor=scale_factor,
+        use_canvas=bool(args.use_canvas),
+        flip_h=bool(args.flip_h),
+    )
+
     if args.single_frame:
-        if len(selected_files) != 1:
+        if len(selected_labels) != 1:
             raise SystemExit("single-frame mode requires exactly one selected frame")
-        src = selected_files[0]
-        dest = dest_dir / f"{args.prefix}.png"
-        img = Image.open(src).convert("RGBA")
-        if args.use_canvas:
-            img = fit_canvas_no_scale(img, target_w=target_w, target_h=target_h)
-            if args.flip_h:
-                img = img.transpose(Image.FLIP_LEFT_RIGHT)
-            out = canvas_scale_on_baseline(
-                img,
-                scale=float(args.scale_mult),
-                baseline_y=baseline_y,
-                target_w=target_w,
-                target_h=target_h,
-            )
-        else:
-            scale_ref_img = Image.open(scale_ref_path).convert("RGBA")
-            scale_ref_bbox = visible_bbox(scale_ref_img, key_color, tol)
-            if not scale_ref_bbox:
-                raise SystemExit("No visible pixels found in scale reference.")
-            scale_ref_visible_h = scale_ref_bbox[3] - scale_ref_bbox[1]
-            if scale_ref_visible_h <= 0:
-                raise SystemExit("Scale reference visible height is invalid.")
-            scale_factor = (match_visible_h / scale_ref_visible_h) * args.scale_mult
-
-            bbox = visible_bbox(img, key_color, tol)
-            if not bbox:
-                raise SystemExit("No visible pixels after green-screen mask.")
-            img = img.crop(bbox)
-            new_w = max(1, int(round(img.width * scale_factor)))
-            new_h = max(1, int(round(img.height * scale_factor)))
-            img = img.resize((new_w, new_h), Image.LANCZOS)
-            if img.width > target_w:
-                left = int((img.width - target_w) / 2)
-                img = img.crop((left, 0, left + target_w, img.height))
-            if img.height > target_h:
-                top = img.height - target_h
-                img = img.crop((0, top, img.width, img.height))
-            out = Image.new("RGBA", (target_w, target_h), (0, 0, 0, 0))
-            x = int((target_w - img.width) / 2)
-            y = (target_h - baseline_pad) - img.height
-            if args.flip_h:
-                img = img.transpose(Image.FLIP_LEFT_RIGHT)
-            out.paste(img, (x, y))
-        tmp = dest_dir / f".{dest.name}.tmp.png"
-        out.save(tmp)
-        if dest.exists():
-            dest.unlink()
-        tmp.replace(dest)
+        write_frame(plan, sources[0], dest_dir / f"{args.prefix}.png")
         print(f"Wrote 1 frame to {dest_dir}")
         return 0
 
-    scale_ref_img = Image.open(scale_ref_path).convert("RGBA")
-    scale_ref_bbox = visible_bbox(scale_ref_img, key_color, tol)
-    if not scale_ref_bbox:
-        raise SystemExit("No visible pixels found in scale reference.")
-    scale_ref_visible_h = scale_ref_bbox[3] - scale_ref_bbox[1]
-    if scale_ref_visible_h <= 0:
-        raise SystemExit("Scale reference visible height is invalid.")
-    scale_factor = (match_visible_h / scale_ref_visible_h) * args.scale_mult
-
-    for out_index, src in enumerate(selected_files):
+    dests = []
+    for out_index in range(len(selected_labels)):
         if output_indices:
             suffix = output_indices[out_index]
         else:
             suffix = f"{out_index:0{args.output_width}d}"
-        dest_name = f"{args.prefix}{suffix}.png"
-        dest = dest_dir / dest_name
-        img = Image.open(src).convert("RGBA")
-        if args.use_canvas:
-            img = fit_canvas_no_scale(img, target_w=target_w, target_h=target_h)
-            if args.flip_h:
-                img = img.transpose(Image.FLIP_LEFT_RIGHT)
-            out = canvas_scale_on_baseline(
-                img,
-                scale=float(args.scale_mult),
-                baseline_y=baseline_y,
-                target_w=target_w,
-                target_h=target_h,
-            )
-        else:
-            bbox = visible_bbox(img, key_color, tol)
-            if not bbox:
-                raise SystemExit("No visible pixels after green-screen mask.")
-            img = img.crop(bbox)
-            new_w = max(1, int(round(img.width * scale_factor)))
-            new_h = max(1, int(round(img.height * scale_factor)))
-            img = img.resize((new_w, new_h), Image.LANCZOS)
-            if img.width > target_w:
-                left = int((img.width - target_w) / 2)
-                img = img.crop((left, 0, left + target_w, img.height))
-            if img.height > target_h:
-                top = img.height - target_h
-                img = img.crop((0, top, img.width, img.height))
-            out = Image.new("RGBA", (target_w, target_h), (0, 0, 0, 0))
-            x = int((target_w - img.width) / 2)
-            y = (target_h - baseline_pad) - img.height
-            if args.flip_h:
-                img = img.transpose(Image.FLIP_LEFT_RIGHT)
-            out.paste(img, (x, y))
-        tmp = dest_dir / f".{dest_name}.tmp.png"
-        out.save(tmp)
-        if dest.exists():
-            dest.unlink()
-        tmp.replace(dest)
-
-    print(f"Wrote {len(selected_files)} frames to {dest_dir}")
+        dests.append(dest_dir / f"{args.prefix}{suffix}.png")
+
+    jobs = min(args.jobs, len(selected_labels))
+    if jobs <= 1:
+        for source, dest in zip(sources, dests):
+            write_frame(plan, source, dest)
+    else:
+        # Frames are independent; map() re-raises the first failure in input order.
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            list(pool.map(write_frame, [plan] * len(dests), sources, dests))
+
+    print(f"Wrote {len(selected_labels)} frames to {dest_dir}")
     if os.environ.get("RESKIN_BATCH") != "1":
         subprocess.run(["open", str(dest_dir)], check=True)
     return 0
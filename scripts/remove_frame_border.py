@@ -18,6 +18,18 @@ def parse_hex_color(value: str) -> tuple[int, int, int, int]:
     return (r, g, b, 255)
 
 
+def fill_border(img: Image.Image, thickness: int, fill: tuple[int, int, int, int]) -> None:
+    """Overwrite a thickness-px frame around the image edge in place (removes the frame guide)."""
+    w, h = img.size
+    if thickness <= 0 or w == 0 or h == 0:
+        return
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([0, 0, w - 1, thickness - 1], fill=fill)
+    draw.rectangle([0, h - thickness, w - 1, h - 1], fill=fill)
+    draw.rectangle([0, 0, thickness - 1, h - 1], fill=fill)
+    draw.rectangle([w - thickness, 0, w - 1, h - 1], fill=fill)
+
+
 def main() -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", required=True, help="Folder with source PNG frames")
@@ -37,11 +49,7 @@ def main() -> int:
         w, h = img.size
         if thickness <= 0 or w == 0 or h == 0:
             continue
-        draw = ImageDraw.Draw(img)
-        draw.rectangle([0, 0, w - 1, thickness - 1], fill=fill)
-        draw.rectangle([0, h - thickness, w - 1, h - 1], fill=fill)
-        draw.rectangle([0, 0, thickness - 1, h - 1], fill=fill)
-        draw.rectangle([w - thickness, 0, w - 1, h - 1], fill=fill)
+        fill_border(img, thickness, fill)
         tmp = path.with_suffix(".tmp.png")
         img.save(tmp)
         tmp.replace(path)
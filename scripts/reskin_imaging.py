@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""Shared vectorized image helpers for the reskin scripts (NumPy, no per-pixel Python loops)."""
+from __future__ import annotations
+
+import operator
+import re
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+CHANNELS = "rgba"
+COMPARISONS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+# Integer pre-reduction keeps at least this much headroom for the final LANCZOS pass; Pillow
+# documents a reducing_gap of 3.0 or more as indistinguishable from fair resampling in most cases
+# (bench_reskin_imaging decode-modes measures at most 3 levels).
+REDUCING_GAP = 3.0
+# Modes Image.reduce() accepts that the pipeline keeps native while shrinking.
+REDUCE_MODES = ("L", "LA", "RGB", "RGBA")
+# Candidate box pairs tested per merge_boxes() sweep chunk.
+MERGE_CHUNK = 1 << 20
+KEY_RULE_RE = re.compile(r"^\s*([rgba])\s*(>=|<=|>|<)\s*(?:([rgba])\s*\*\s*)?(\d+(?:\.\d+)?)\s*$")
+
+
+def reduce_factor(src_size: tuple[int, int], size: tuple[int, int]) -> tuple[int, int]:
+    """Integer reduce() factor that still leaves REDUCING_GAP headroom for the LANCZOS pass."""
+    return (
+        max(1, int(src_size[0] / size[0] / REDUCING_GAP)),
+        max(1, int(src_size[1] / size[1] / REDUCING_GAP)),
+    )
+
+
+def downscale(img: Image.Image, size: tuple[int, int]) -> Image.Image:
+    """open_downscaled()'s resampling for an image that is already in memory."""
+    if img.mode not in REDUCE_MODES:
+        img = img.convert("RGBA")
+    factor = reduce_factor(img.size, size)
+    if factor != (1, 1):
+        img = img.reduce(factor)
+    return img.resize(size, Image.LANCZOS) if img.size != size else img
+
+
+def open_downscaled(path, size: tuple[int, int], *, mode: str = "RGBA") -> Image.Image:
+    """Decode an image and LANCZOS-resize it to size without expanding the full decode to RGBA.
+
+    Only JPEGs get a smaller decode (Image.draft at a reduced DCT scale). Everything else, PNGs
+    included, is decoded at full size, so peak memory is at least one full-size decode: L/LA/RGB
+    images stay in their native mode, which saves the RGBA copy, while RGBA sources cost the same
+    as a plain open + resize. At 6x or more an integer reduce() runs first and the full decode is
+    released before the LANCZOS pass. Other modes (palette, bilevel, 16-bit) are converted to
+    mode first, since reduce() does not take them.
+    """
+    target_w, target_h = size
+    src = Image.open(path)
+    try:
+        if src.format == "JPEG":
+            src.draft("RGB", (int(target_w * REDUCING_GAP), int(target_h * REDUCING_GAP)))
+        src.load()
+        img = src if src.mode in REDUCE_MODES else src.convert(mode)
+        factor = reduce_factor(img.size, size)
+        if factor != (1, 1):
+            img = img.reduce(factor)
+        if img is not src:
+            src.close()  # releases the full-size pixels before the LANCZOS pass
+        # Opaque RGB/L resample identically before or after conversion, so convert the small image.
+        if img.mode not in ("RGB", "RGBA", "L"):
+            img = img.convert(mode)
+        if img.size != size:
+            img = img.resize(size, Image.LANCZOS)
+        if img.mode != mode:
+            img = img.convert(mode)
+        if img is src:
+            img = src.copy()
+    finally:
+        src.close()
+    return img
+
+
+def rgba_array(img: Image.Image) -> np.ndarray:
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+    return np.asarray(img)
+
+
+def key_color_mask(img: Image.Image, key_color: tuple[int, int, int], tol: int) -> np.ndarray:
+    """True where a pixel is visible: not fully transparent and not within tol of the key color."""
+    arr = rgba_array(img)
+    visible = arr[:, :, 3] != 0
+    near_key = np.ones_like(visible)
+    for channel, key in enumerate(key_color):
+        # |value - key| <= tol as a uint8 range check, so no widened copy of the frame is made.
+        values = arr[:, :, channel]
+        near_key &= (values >= max(0, key - tol)) & (values <= min(255, key + tol))
+    return visible & ~near_key
+
+
+def mask_bbox(mask: np.ndarray) -> tuple[int, int, int, int] | None:
+    """Bounding box of True pixels as (left, top, right, bottom), like Image.getbbox()."""
+    rows = np.flatnonzero(mask.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(mask.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def visible_bbox(img: Image.Image, key_color: tuple[int, int, int], tol: int) -> tuple[int, int, int, int] | None:
+    return mask_bbox(key_color_mask(img, key_color, tol))
+
+
+def _mask_runs(mask: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Horizontal runs of True pixels as (row, start, end) arrays in raster order; end is exclusive."""
+    height, width = mask.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    start_rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return start_rows, starts, ends
+
+
+def _run_edges(rows: np.ndarray, starts: np.ndarray, ends: np.ndarray, width: int, connectivity: int):
+    """Pairs of run indices that touch across adjacent rows."""
+    # Row-major keys make one global searchsorted work for every row at once.
+    stride = width + 2
+    start_keys = rows * stride + starts
+    end_keys = rows * stride + ends
+    reach = 1 if connectivity == 8 else 0
+    prev_base = (rows - 1) * stride
+    # Runs in the previous row overlapping [start - reach, end + reach) form a contiguous range.
+    first = np.searchsorted(end_keys, prev_base + starts - reach, side="right")
+    last = np.searchsorted(start_keys, prev_base + ends + reach, side="left")
+    counts = np.maximum(last - first, 0)
+    counts[rows == 0] = 0
+    current = np.repeat(np.arange(rows.size), counts)
+    offsets = np.arange(current.size) - np.repeat(np.cumsum(counts) - counts, counts)
+    previous = np.repeat(first, counts) + offsets
+    return previous, current
+
+
+def _union_roots(count: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Union-find over edges by min-label hooking + pointer jumping; each root is its group's lowest index."""
+    parent = np.arange(count)
+    while a.size:
+        pa = parent[a]
+        pb = parent[b]
+        if np.array_equal(pa, pb):
+            break
+        np.minimum.at(parent, np.maximum(pa, pb), np.minimum(pa, pb))
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+    return parent
+
+
+def _label_runs(mask: np.ndarray, connectivity: int):
+    """Runs of the mask plus a 0-based component label per run."""
+    if connectivity not in (4, 8):
+        raise SystemExit(f"Unsupported connectivity: {connectivity}")
+    rows, starts, ends = _mask_runs(mask)
+    previous, current = _run_edges(rows, starts, ends, mask.shape[1], connectivity)
+    roots = _union_roots(rows.size, previous, current)
+    # Roots are in raster order already, so unique() numbers components by first pixel.
+    _, run_labels = np.unique(roots, return_inverse=True)
+    return rows, starts, ends, run_labels.reshape(-1)
+
+
+def _paint_runs(shape: tuple[int, int], rows, starts, ends, values: np.ndarray) -> np.ndarray:
+    # Mark +value at each run start and -value just past its end, then one cumsum fills the runs.
+    # Starts never collide with each other (nor ends), so plain fancy-index updates are safe.
+    width = shape[1]
+    delta = np.zeros(shape[0] * width + 1, dtype=np.int32)
+    delta[rows * width + starts] += values
+    delta[rows * width + ends] -= values
+    return np.cumsum(delta[:-1], dtype=np.int32).reshape(shape)
+
+
+def label_components(mask: np.ndarray, connectivity: int = 4) -> tuple[np.ndarray, int]:
+    """Connected-component labels for a boolean mask (0 = background, 1..N).
+
+    Labels are numbered in raster order of each component's first pixel, the same order a
+    top-to-bottom, left-to-right scan would discover them.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    rows, starts, ends, run_labels = _label_runs(mask, connectivity)
+    if rows.size == 0:
+        return np.zeros(mask.shape, dtype=np.int32), 0
+    return _paint_runs(mask.shape, rows, starts, ends, run_labels + 1), int(run_labels.max()) + 1
+
+
+def component_boxes(mask: np.ndarray, connectivity: int = 4) -> list[tuple[int, int, int, int, int]]:
+    """(min_x, min_y, max_x, max_y, area) per component, inclusive bounds, in label order."""
+    mask = np.asarray(mask, dtype=bool)
+    rows, starts, ends, run_labels = _label_runs(mask, connectivity)
+    if rows.size == 0:
+        return []
+    count = int(run_labels.max()) + 1
+    min_x = np.full(count, mask.shape[1], dtype=np.int64)
+    max_x = np.full(count, -1, dtype=np.int64)
+    np.minimum.at(min_x, run_labels, starts)
+    np.maximum.at(max_x, run_labels, ends - 1)
+    # Runs are in raster order, so each label's first and last run give its row span.
+    min_y = np.full(count, mask.shape[0], dtype=np.int64)
+    max_y = np.full(count, -1, dtype=np.int64)
+    np.minimum.at(min_y, run_labels, rows)
+    np.maximum.at(max_y, run_labels, rows)
+    area = np.bincount(run_labels, weights=ends - starts, minlength=count).astype(np.int64)
+    return list(zip(min_x.tolist(), min_y.tolist(), max_x.tolist(), max_y.tolist(), area.tolist()))
+
+
+def _close_box_pairs(
+    min_x: np.ndarray, min_y: np.ndarray, max_x: np.ndarray, max_y: np.ndarray, gap: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """(a, b) index pairs of boxes at most gap empty pixels apart, by a sweep along x.
+
+    Boxes are sorted by min_x; each one is only tested against the boxes that start before its
+    right edge + gap, and candidates are generated in bounded chunks, so memory stays linear
+    in the number of boxes plus close pairs.
+    """
+    count = min_x.size
+    order = np.argsort(min_x, kind="stable")
+    sx0, sy0, sx1, sy1 = min_x[order], min_y[order], max_x[order], max_y[order]
+    # Boxes i + 1 .. stop[i] - 1 start within gap of box i's right edge.
+    stop = np.searchsorted(sx0, sx1 + gap + 1, side="right")
+    candidates = stop - np.arange(count) - 1
+    total = np.cumsum(candidates)
+    pairs_a, pairs_b = [], []
+    first = 0
+    while first < count:
+        # Take boxes until the chunk holds about MERGE_CHUNK candidate pairs (at least one box).
+        done = int(total[first - 1]) if first else 0
+        last = max(first + 1, int(np.searchsorted(total, done + MERGE_CHUNK, side="right")))
+        counts = candidates[first:last]
+        i = np.repeat(np.arange(first, last), counts)
+        # j runs i + 1, i + 2, ... within each box's candidate range.
+        starts = np.cumsum(counts) - counts
+        j = i + 1 + np.arange(i.size) - np.repeat(starts, counts)
+        gap_y = np.maximum(sy0[i], sy0[j]) - np.minimum(sy1[i], sy1[j]) - 1
+        close = gap_y <= gap
+        pairs_a.append(order[i[close]])
+        pairs_b.append(order[j[close]])
+        first = last
+    return np.concatenate(pairs_a), np.concatenate(pairs_b)
+
+
+def merge_boxes(
+    boxes: list[tuple[int, int, int, int, int]], gap: int
+) -> list[tuple[int, int, int, int, int]]:
+    """Merge components whose boxes are at most gap empty pixels apart (transitively).
+
+    Merged entries take the union box and summed area, ordered by their first member.
+    """
+    if gap < 0 or len(boxes) < 2:
+        return list(boxes)
+    arr = np.array(boxes, dtype=np.int64)
+    min_x, min_y, max_x, max_y, area = arr.T
+    a, b = _close_box_pairs(min_x, min_y, max_x, max_y, gap)
+    roots = _union_roots(len(boxes), a, b)
+    # Roots are each group's lowest index, so unique() orders groups by their first member.
+    groups, member_group = np.unique(roots, return_inverse=True)
+    count = groups.size
+    out_min_x = np.full(count, np.iinfo(np.int64).max)
+    out_min_y = np.full(count, np.iinfo(np.int64).max)
+    out_max_x = np.full(count, np.iinfo(np.int64).min)
+    out_max_y = np.full(count, np.iinfo(np.int64).min)
+    out_area = np.zeros(count, dtype=np.int64)
+    np.minimum.at(out_min_x, member_group, min_x)
+    np.minimum.at(out_min_y, member_group, min_y)
+    np.maximum.at(out_max_x, member_group, max_x)
+    np.maximum.at(out_max_y, member_group, max_y)
+    np.add.at(out_area, member_group, area)
+    return list(zip(out_min_x.tolist(), out_min_y.tolist(), out_max_x.tolist(), out_max_y.tolist(), out_area.tolist()))
+
+
+def _region_from_runs(shape: tuple[int, int], rows, starts, ends, keep: np.ndarray) -> np.ndarray:
+    ones = np.ones(int(keep.sum()), dtype=np.int32)
+    return _paint_runs(shape, rows[keep], starts[keep], ends[keep], ones).astype(bool)
+
+
+def seeded_region(mask: np.ndarray, seeds: list[tuple[int, int]], connectivity: int = 4) -> np.ndarray:
+    """Pixels of mask connected to any (x, y) seed; seeds outside the mask start nothing."""
+    mask = np.asarray(mask, dtype=bool)
+    rows, starts, ends, run_labels = _label_runs(mask, connectivity)
+    seed_labels = set()
+    for x, y in seeds:
+        in_run = (rows == y) & (starts <= x) & (ends > x)
+        seed_labels.update(run_labels[in_run].tolist())
+    keep = np.isin(run_labels, sorted(seed_labels))
+    return _region_from_runs(mask.shape, rows, starts, ends, keep)
+
+
+def border_region(mask: np.ndarray, connectivity: int = 4) -> np.ndarray:
+    """Pixels of mask connected to a mask pixel on the image border."""
+    mask = np.asarray(mask, dtype=bool)
+    height, width = mask.shape
+    rows, starts, ends, run_labels = _label_runs(mask, connectivity)
+    on_border = (rows == 0) | (rows == height - 1) | (starts == 0) | (ends == width)
+    keep = np.isin(run_labels, np.unique(run_labels[on_border]))
+    return _region_from_runs(mask.shape, rows, starts, ends, keep)
+
+
+def near_color_mask(rgb: np.ndarray, color, tol: float) -> np.ndarray:
+    """True where the Euclidean RGB distance to color is <= tol.
+
+    Squared distances come from per-channel lookup tables. Integer colors stay in int32;
+    fractional ones (e.g. a median of an even-sized sample) use float64, where squares of
+    half-integers and their sums are still exact, so this matches sqrt(d) <= tol exactly.
+    """
+    color = np.asarray(color, dtype=np.float64)
+    dtype = np.int32 if np.all(color == np.round(color)) else np.float64
+    levels = np.arange(256, dtype=np.float64)
+    dist_sq = np.zeros(rgb.shape[:2], dtype=dtype)
+    for channel, value in enumerate(color):
+        dist_sq += ((levels - value) ** 2).astype(dtype)[rgb[:, :, channel]]
+    return dist_sq <= tol * tol
+
+
+def median_color(pixels: np.ndarray) -> np.ndarray:
+    """Per-channel upper median of an (N, 3) pixel array (element N // 2 of each sorted channel)."""
+    return np.sort(pixels, axis=0)[len(pixels) // 2].astype(np.int32)
+
+
+@dataclass(frozen=True)
+class KeyRule:
+    """One keying test: `channel op value`, or `channel op other * value` for ratio rules."""
+
+    channel: str
+    op: str
+    value: float
+    other: str | None = None
+
+    def evaluate(self, arr: np.ndarray) -> np.ndarray:
+        lhs = arr[:, :, CHANNELS.index(self.channel)]
+        if self.other is None:
+            return COMPARISONS[self.op](lhs, self.value)
+        # float64 products match Python's `g > r * 1.35` on ints exactly.
+        rhs = arr[:, :, CHANNELS.index(self.other)].astype(np.float64) * self.value
+        return COMPARISONS[self.op](lhs, rhs)
+
+
+def parse_key_rule(text: str) -> KeyRule:
+    """Parse "g >= 120" or "g > r*1.35"."""
+    match = KEY_RULE_RE.match(text)
+    if not match:
+        raise SystemExit(f"Invalid key rule (expected e.g. 'g >= 120' or 'g > r*1.35'): {text}")
+    channel, op, other, value = match.groups()
+    return KeyRule(channel=channel, op=op, value=float(value), other=other)
+
+
+def key_by_rules(image: Image.Image, rules: list[str | KeyRule], *, feather: float = 0.0) -> Image.Image:
+    """Make pixels matching every rule transparent, keeping their RGB.
+
+    Already transparent pixels are left alone. With feather > 0 the keyed mask is blurred by
+    that radius and used as a soft matte, so edges fade instead of stepping; feather 0 is a
+    hard key.
+    """
+    parsed = [rule if isinstance(rule, KeyRule) else parse_key_rule(rule) for rule in rules]
+    arr = rgba_array(image).copy()
+    keyed = arr[:, :, 3] != 0
+    for rule in parsed:
+        keyed &= rule.evaluate(arr)
+    if feather <= 0:
+        arr[:, :, 3][keyed] = 0
+        return Image.fromarray(arr, "RGBA")
+    matte = Image.fromarray(keyed.astype(np.uint8) * 255, "L").filter(ImageFilter.GaussianBlur(feather))
+    keep = 255 - np.asarray(matte, dtype=np.uint16)
+    arr[:, :, 3] = (arr[:, :, 3] * keep + 127) // 255
+    return Image.fromarray(arr, "RGBA")
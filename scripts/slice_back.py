@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""Slice generated options of a flattened plate back into per-piece sprites.
+
+Reads a flattener manifest (flatten_scene.py, flatten_stage01_brick_building1.py or
+tori_gate_combined.py flatten): the canvas origin plus, for every op, its source texture and
+where it landed on the canvas. Each piece is cut out of every option_*.png (resampled back
+to the source's pixel size when the op was scaled) and given its source's alpha, so the
+result drops straight back into the scene. Every source alpha is loaded once; options are
+decoded one at a time and each option's pieces are sliced on a thread pool.
+
+  python3 scripts/slice_back.py --manifest tmp/flattened/stage_01__Background_BrickBuilding1_manifest.json \\
+      --input-dir outputs/reskin/stage_01/brick_building1
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from flatten_scene import Affine, compose, translate
+from gradient_map import tile
+from image_cache import load_image, report as report_image_cache
+
+DEFAULT_OUTPUT_ROOT = Path("outputs/reskin/sliced")
+
+
+@dataclass(frozen=True)
+class SlicePiece:
+    name: str
+    source: Path
+    # Source texture pixels -> option canvas pixels.
+    transform: Affine
+    # Source pixel size of the piece (the region size when the op drew a texture region).
+    size: tuple[int, int]
+    region: tuple[int, int, int, int] | None = None
+    repeat: bool = False
+
+    @property
+    def file_name(self) -> str:
+        return f"{self.name.strip('/').replace('/', '_')}.png"
+
+    @property
+    def alpha_key(self) -> tuple:
+        return (self.source, self.region, self.repeat, self.size)
+
+
+def pieces_from_manifest(manifest: dict) -> tuple[tuple[int, int], list[SlicePiece]]:
+    """(canvas size, pieces) for any flattener manifest."""
+    canvas = manifest["canvas"]
+    size = (int(canvas["width"]), int(canvas["height"]))
+    to_canvas = translate(-float(canvas["min_x"]), -float(canvas["min_y"]))
+    pieces = []
+    for op in manifest["ops"]:
+        if op.get("drawn") is False:
+            continue
+        region = tuple(int(v) for v in op["region"]) if op.get("region") else None
+        if "transform" in op:
+            # flatten_scene.py: transform is texture pixels -> subtree-local coordinates.
+            transform = compose(to_canvas, tuple(float(v) for v in op["transform"]))
+            w, h = (int(v) for v in op["size"])
+        else:
+            # Scale + top-left ops (flatten_stage01_brick_building1.py).
+            x, y = (float(v) for v in op["top_left_in_canvas"])
+            sx, sy = float(op.get("scale_x", 1.0)), float(op.get("scale_y", 1.0))
+            transform = (sx, 0.0, x, 0.0, sy, y)
+            w = round(float(op["size_in_canvas"][0]) / sx)
+            h = round(float(op["size_in_canvas"][1]) / sy)
+        pieces.append(
+            SlicePiece(
+                name=str(op["name"]),
+                source=Path(op["source"]),
+                transform=transform,
+                size=(w, h),
+                region=region,
+                repeat=bool(op.get("repeat", False)),
+            )
+        )
+    names = [p.file_name for p in pieces]
+    if len(set(names)) != len(names):
+        raise SystemExit("Manifest has ops with the same output name")
+    return size, pieces
+
+
+def source_alpha(piece: SlicePiece) -> Image.Image:
+    """The piece's alpha as drawn: its source region (tiled when repeating), at source size."""
+    source = load_image(piece.source, shared=True)
+    if piece.region is None:
+        alpha = source.getchannel("A")
+    elif piece.repeat:
+        x, y, w, h = piece.region
+        arr = np.asarray(source.getchannel("A"))
+        alpha = Image.fromarray(np.ascontiguousarray(tile(np.roll(arr, (-y, -x), axis=(0, 1)), (w, h))), "L")
+    else:
+        x, y, w, h = piece.region
+        alpha = source.getchannel("A").crop((x, y, x + w, y + h))
+    if alpha.size != piece.size:
+        raise SystemExit(f"{piece.name}: source alpha is {alpha.size}, manifest says {piece.size}")
+    return alpha
+
+
+def slice_piece(option: Image.Image, piece: SlicePiece, alpha: Image.Image) -> Image.Image:
+    a, b, c, d, e, f = piece.transform
+    w, h = piece.size
+    if (a, b, d, e) == (1.0, 0.0, 0.0, 1.0) and c == round(c) and f == round(f):
+        # Unscaled op on whole pixels: a plain crop.
+        left, top = int(c), int(f)
+        out = option.crop((left, top, left + w, top + h)).convert("RGBA")
+    else:
+        # Sample the option at every source pixel's canvas position (output -> input mapping).
+        out = option.transform((w, h), Image.AFFINE, (a, b, c, d, e, f), resample=Image.BICUBIC)
+    out.putalpha(alpha)
+    return out
+
+
+def _save(image: Image.Image, path: Path) -> Path:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp.png")
+    image.save(tmp)
+    tmp.replace(path)
+    return path
+
+
+def slice_options(
+    manifest: dict,
+    option_paths: list[Path],
+    output_dir: Path,
+    *,
+    piece_names: list[str] | None = None,
+    jobs: int | None = None,
+) -> list[Path]:
+    """Write output_dir/<option stem>/<piece>.png for every option and piece."""
+    canvas_size, pieces = pieces_from_manifest(manifest)
+    if piece_names:
+        wanted = set(piece_names)
+        pieces = [p for p in pieces if p.name in wanted or p.file_name[:-4] in wanted]
+        if not pieces:
+            raise SystemExit(f"No pieces named {sorted(wanted)} in the manifest")
+    if not option_paths:
+        raise SystemExit("No options to slice")
+
+    def load_option(path: Path) -> Image.Image:
+        with Image.open(path) as img:
+            option = img.convert("RGBA")
+        if option.size != canvas_size:
+            raise SystemExit(f"{path} has size {option.size}, expected {canvas_size}")
+        return option
+
+    saved: list[Path] = []
+    with ThreadPoolExecutor(max_workers=max(1, jobs or os.cpu_count() or 1)) as pool:
+        # One alpha per distinct source (and region); pieces that share a texture share it.
+        by_key: dict[tuple, SlicePiece] = {}
+        for piece in pieces:
+            by_key.setdefault(piece.alpha_key, piece)
+        alphas = dict(zip(by_key, pool.map(source_alpha, by_key.values())))
+        # Options are full-canvas RGBA (hundreds of MB for a wide plate), so only one is held at
+        # a time: its pieces are sliced in parallel and written before the next is decoded.
+        for option_path in option_paths:
+            option = load_option(option_path)
+            option_dir = output_dir / option_path.stem
+            option_dir.mkdir(parents=True, exist_ok=True)
+            saved.extend(
+                pool.map(lambda p: _save(slice_piece(option, p, alphas[p.alpha_key]), option_dir / p.file_name), pieces)
+            )
+            del option
+        return saved
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--manifest", required=True, help="Flattener manifest JSON")
+    parser.add_argument("--input-dir", required=True, help="Directory with generated option_*.png files")
+    parser.add_argument(
+        "--output-dir",
+        default=None,
+        help="Where to write <option>/<piece>.png (default: outputs/reskin/sliced/<manifest name>)",
+    )
+    parser.add_argument("--piece", action="append", default=None, help="Only slice this op (repeatable)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Worker threads")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    manifest_path = Path(args.manifest)
+    if not manifest_path.exists():
+        raise SystemExit(f"Missing manifest: {manifest_path}")
+    input_dir = Path(args.input_dir)
+    if not input_dir.exists():
+        raise SystemExit(f"Missing input dir: {input_dir}")
+    option_paths = sorted(input_dir.glob("option_*.png"))
+    if not option_paths:
+        raise SystemExit(f"No option_*.png files found in {input_dir}")
+    stem = manifest_path.stem.removesuffix("_manifest")
+    output_dir = Path(args.output_dir) if args.output_dir else DEFAULT_OUTPUT_ROOT / stem
+
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    for path in slice_options(manifest, option_paths, output_dir, piece_names=args.piece, jobs=args.jobs):
+        print(path)
+    report_image_cache()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
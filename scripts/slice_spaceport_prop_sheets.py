@@ -4,12 +4,16 @@ from __future__ import annotations
 
 import argparse
 import json
+import os
 import re
-from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
 from PIL import Image
 
+from reskin_imaging import component_boxes, merge_boxes
+
 DEFAULT_INPUT_GLOB = "outputs/reskin/_tmp/spaceport_props_*/spaceport_props_spritesheet_bg_removed/option_*.png"
 DEFAULT_OUTPUT_ROOT = "outputs/reskin/_tmp/spaceport_props_sliced"
 
@@ -56,6 +60,25 @@ def parse_args() -> argparse.Namespace:
         default=2,
         help="Extra transparent padding around each crop.",
     )
+    parser.add_argument(
+        "--connectivity",
+        type=int,
+        choices=(4, 8),
+        default=4,
+        help="Pixel connectivity for components (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--merge-gap",
+        type=int,
+        default=None,
+        help="Merge components whose boxes are within this many pixels (e.g. detached highlights).",
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Sheets to slice concurrently (default: %(default)s).",
+    )
     return parser.parse_args()
 
 
@@ -69,70 +92,10 @@ def find_input_sheets(input_glob: str) -> list[Path]:
     return sheets
 
 
-def connected_components(alpha: Image.Image, threshold: int) -> list[tuple[int, int, int, int, int]]:
-    width, height = alpha.size
-    data = alpha.tobytes()
-    visited = bytearray(width * height)
-    components: list[tuple[int, int, int, int, int]] = []
-
-    def idx(x: int, y: int) -> int:
-        return y * width + x
-
-    for y in range(height):
-        for x in range(width):
-            i = idx(x, y)
-            if visited[i] or data[i] < threshold:
-                continue
-
-            queue: deque[tuple[int, int]] = deque()
-            queue.append((x, y))
-            visited[i] = 1
-
-            min_x = x
-            min_y = y
-            max_x = x
-            max_y = y
-            area = 0
-
-            while queue:
-                cx, cy = queue.popleft()
-                area += 1
-                if cx < min_x:
-                    min_x = cx
-                if cy < min_y:
-                    min_y = cy
-                if cx > max_x:
-                    max_x = cx
-                if cy > max_y:
-                    max_y = cy
-
-                if cx > 0:
-                    nx, ny = cx - 1, cy
-                    ni = idx(nx, ny)
-                    if not visited[ni] and data[ni] >= threshold:
-                        visited[ni] = 1
-                        queue.append((nx, ny))
-                if cx + 1 < width:
-                    nx, ny = cx + 1, cy
-                    ni = idx(nx, ny)
-                    if not visited[ni] and data[ni] >= threshold:
-                        visited[ni] = 1
-                        queue.append((nx, ny))
-                if cy > 0:
-                    nx, ny = cx, cy - 1
-                    ni = idx(nx, ny)
-                    if not visited[ni] and data[ni] >= threshold:
-                        visited[ni] = 1
-                        queue.append((nx, ny))
-                if cy + 1 < height:
-                    nx, ny = cx, cy + 1
-                    ni = idx(nx, ny)
-                    if not visited[ni] and data[ni] >= threshold:
-                        visited[ni] = 1
-                        queue.append((nx, ny))
-
-            components.append((min_x, min_y, max_x, max_y, area))
-    return components
+def connected_components(
+    alpha: Image.Image, threshold: int, connectivity: int = 4
+) -> list[tuple[int, int, int, int, int]]:
+    return component_boxes(np.asarray(alpha) >= threshold, connectivity)
 
 
 def parse_run_id(sheet: Path) -> str:
@@ -150,7 +113,9 @@ def slice_sheet(
     min_w: int,
     min_h: int,
     pad: int,
-) -> None:
+    connectivity: int = 4,
+    merge_gap: int | None = None,
+) -> str:
     image = Image.open(sheet).convert("RGBA")
     alpha = image.getchannel("A")
     alpha_extrema = alpha.getextrema()
@@ -160,7 +125,9 @@ def slice_sheet(
             "Run background removal first, then slice the *_bg_removed outputs."
         )
     width, height = image.size
-    components = connected_components(alpha, threshold)
+    components = connected_components(alpha, threshold, connectivity)
+    if merge_gap is not None:
+        components = merge_boxes(components, merge_gap)
     if not components:
         raise SystemExit(f"No foreground components found in sheet: {sheet}")
 
@@ -216,11 +183,13 @@ def slice_sheet(
         "min_width": min_w,
         "min_height": min_h,
         "pad": pad,
+        "connectivity": connectivity,
+        "merge_gap": merge_gap,
         "component_count": len(manifest_items),
         "components": manifest_items,
     }
     (out_dir / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
-    print(f"{sheet} -> {out_dir} ({len(manifest_items)} props)")
+    return f"{sheet} -> {out_dir} ({len(manifest_items)} props)"
 
 
 def main() -> int:
@@ -235,21 +204,34 @@ def main() -> int:
         raise SystemExit("--min-height must be >= 1")
     if args.pad < 0:
         raise SystemExit("--pad must be >= 0")
+    if args.merge_gap is not None and args.merge_gap < 0:
+        raise SystemExit("--merge-gap must be >= 0")
+    if args.parallel < 1:
+        raise SystemExit("--parallel must be >= 1")
 
     sheets = find_input_sheets(args.input_glob)
     output_root = Path(args.output_root)
     output_root.mkdir(parents=True, exist_ok=True)
 
-    for sheet in sheets:
-        slice_sheet(
-            sheet=sheet,
-            output_root=output_root,
-            threshold=args.alpha_threshold,
-            min_area=args.min_area,
-            min_w=args.min_width,
-            min_h=args.min_height,
-            pad=args.pad,
-        )
+    # Sheets are independent; results print in input order regardless of finish order.
+    with ProcessPoolExecutor(max_workers=min(args.parallel, len(sheets))) as pool:
+        futures = [
+            pool.submit(
+                slice_sheet,
+                sheet=sheet,
+                output_root=output_root,
+                threshold=args.alpha_threshold,
+                min_area=args.min_area,
+                min_w=args.min_width,
+                min_h=args.min_height,
+                pad=args.pad,
+                connectivity=args.connectivity,
+                merge_gap=args.merge_gap,
+            )
+            for sheet in sheets
+        ]
+        for future in futures:
+            print(future.result())
     return 0
 
 
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Cached layout metrics for reference sprites (match / scale_ref / idle frames).
+
+prepare_walk_frames and prepare_anchor_image need the same numbers for the same few sprites on
+every run: the visible bbox against the greenscreen key, the baseline padding under the feet and
+the visible height. They are stored in one index under outputs/reskin/_cache, keyed by resolved
+path + key color + tolerance, and reused while the file's content hash still matches.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from image_cache import load_image
+from reskin_imaging import key_color_mask, mask_bbox
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+METRICS_INDEX = PROJECT_ROOT / "outputs" / "reskin" / "_cache" / "sprite_metrics.json"
+INDEX_VERSION = 1
+
+
+@dataclass(frozen=True)
+class SpriteMetrics:
+    content_hash: str
+    size: tuple[int, int]
+    bbox: tuple[int, int, int, int] | None
+    visible_height: int
+    baseline_pad: int
+    baseline_y: int
+    # Fraction of the canvas that is visible (opaque and not key color).
+    alpha_coverage: float
+
+
+def _content_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _load_index() -> dict:
+    try:
+        index = json.loads(METRICS_INDEX.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if index.get("version") != INDEX_VERSION:
+        return {}
+    return index.get("sprites", {})
+
+
+def _save_index(sprites: dict) -> None:
+    METRICS_INDEX.parent.mkdir(parents=True, exist_ok=True)
+    tmp = METRICS_INDEX.with_name(f".{METRICS_INDEX.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps({"version": INDEX_VERSION, "sprites": sprites}, indent=2), encoding="utf-8")
+    tmp.replace(METRICS_INDEX)
+
+
+def _from_entry(entry: dict) -> SpriteMetrics:
+    return SpriteMetrics(
+        content_hash=entry["content_hash"],
+        size=tuple(entry["size"]),
+        bbox=tuple(entry["bbox"]) if entry["bbox"] is not None else None,
+        visible_height=entry["visible_height"],
+        baseline_pad=entry["baseline_pad"],
+        baseline_y=entry["baseline_y"],
+        alpha_coverage=entry["alpha_coverage"],
+    )
+
+
+def compute_sprite_metrics(path: Path, key_color: tuple[int, int, int], tol: int) -> SpriteMetrics:
+    img = load_image(path, shared=True)
+    mask = key_color_mask(img, key_color, tol)
+    bbox = mask_bbox(mask)
+    width, height = img.size
+    # Rows of empty canvas below the lowest visible pixel, and the ground line above them.
+    baseline_pad = (height - 1) - (bbox[3] - 1) if bbox else 0
+    return SpriteMetrics(
+        content_hash=_content_hash(path),
+        size=(width, height),
+        bbox=bbox,
+        visible_height=(bbox[3] - bbox[1]) if bbox else 0,
+        baseline_pad=baseline_pad,
+        baseline_y=(height - baseline_pad) - 1,
+        alpha_coverage=float(mask.mean()) if mask.size else 0.0,
+    )
+
+
+def sprite_metrics(path: Path | str, key_color: tuple[int, int, int], tol: int) -> SpriteMetrics:
+    """Metrics for a reference sprite, from the index when its content hash still matches."""
+    resolved = Path(path).resolve()
+    if not resolved.exists():
+        raise SystemExit(f"Sprite not found: {path}")
+    entry_key = f"{resolved}|{','.join(str(c) for c in key_color)}|{tol}"
+    sprites = _load_index()
+    entry = sprites.get(entry_key)
+    if entry is not None and entry.get("content_hash") == _content_hash(resolved):
+        return _from_entry(entry)
+    metrics = compute_sprite_metrics(resolved, key_color, tol)
+    sprites[entry_key] = asdict(metrics)
+    _save_index(sprites)
+    return metrics
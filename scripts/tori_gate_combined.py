@@ -2,12 +2,17 @@
 from __future__ import annotations
 
 import argparse
+import json
 from dataclasses import dataclass
 from pathlib import Path
 
 from PIL import Image
 from PIL import ImageDraw
 
+from image_cache import load_image, report as report_image_cache
+from reskin_imaging import key_by_rules
+from slice_back import slice_options
+
 
 SCENE_SCALE = 0.75
 COMBINED_MIN_X = -395
@@ -17,6 +22,7 @@ COMBINED_HEIGHT = 2290
 BLOCKOUT_WIDTH = 1600
 BLOCKOUT_HEIGHT = 1800
 GREENSCREEN = (0, 177, 64, 255)
+GREENSCREEN_KEY_RULES = ("g >= 120", "g > r*1.35", "g > b*1.35")
 BLOCKOUT_SLICE_LEFT = (120, 120, 860, 1710)
 BLOCKOUT_SLICE_RIGHT = (740, 120, 1480, 1710)
 
@@ -24,6 +30,7 @@ BACK_SOURCE = Path("stages/stage_01/stage_elements/gates/tori_gate/tori_gate_bac
 FRONT_SOURCE = Path("stages/stage_01/stage_elements/gates/tori_gate/tori_gate_front.png")
 
 COMBINED_SOURCE = Path("tmp/flattened/tori_gate_combined.png")
+COMBINED_MANIFEST = Path("tmp/flattened/tori_gate_combined_manifest.json")
 BLOCKOUT_SOURCE = Path("tmp/flattened/tori_gate_blockout.png")
 SLICED_OUTPUT_DIR = Path("outputs/reskin/stage_01/tori_gate_sliced")
 BLOCKOUT_SLICED_OUTPUT_DIR = Path("outputs/reskin/stage_01/tori_gate_blockout_sliced")
@@ -60,10 +67,37 @@ def _load_rgba(path: Path) -> Image.Image:
 
 
 def _piece_bounds(piece: Piece) -> tuple[int, int, int, int]:
-    img = _load_rgba(piece.source)
-    left = round(piece.center_x - img.width / 2.0)
-    top = round(piece.center_y - img.height / 2.0)
-    return left, top, left + img.width, top + img.height
+    if not piece.source.exists():
+        raise SystemExit(f"Missing image: {piece.source}")
+    width, height = load_image(piece.source, shared=True).size
+    left = round(piece.center_x - width / 2.0)
+    top = round(piece.center_y - height / 2.0)
+    return left, top, left + width, top + height
+
+
+def combined_manifest() -> dict:
+    """Where each piece sits on the combined canvas, in the flatten_scene.py manifest format."""
+    ops = []
+    for piece in PIECES:
+        left, top, right, bottom = _piece_bounds(piece)
+        ops.append(
+            {
+                "name": f"tori_gate_{piece.name}",
+                "source": str(piece.source),
+                "transform": [1.0, 0.0, float(left), 0.0, 1.0, float(top)],
+                "top_left_in_canvas": [left - COMBINED_MIN_X, top - COMBINED_MIN_Y],
+                "size": [right - left, bottom - top],
+            }
+        )
+    return {
+        "canvas": {
+            "min_x": COMBINED_MIN_X,
+            "min_y": COMBINED_MIN_Y,
+            "width": COMBINED_WIDTH,
+            "height": COMBINED_HEIGHT,
+        },
+        "ops": ops,
+    }
 
 
 def flatten() -> Path:
@@ -76,6 +110,7 @@ def flatten() -> Path:
         paste_y = top - COMBINED_MIN_Y
         canvas.alpha_composite(img, (paste_x, paste_y))
     canvas.save(COMBINED_SOURCE)
+    COMBINED_MANIFEST.write_text(json.dumps(combined_manifest(), indent=2), encoding="utf-8")
     return COMBINED_SOURCE
 
 
@@ -191,49 +226,11 @@ def slice_variants(input_dir: Path) -> list[Path]:
     option_paths = sorted(input_dir.glob("option_*.png"))
     if not option_paths:
         raise SystemExit(f"No option_*.png files found in {input_dir}")
-
-    saved: list[Path] = []
-    for option_path in option_paths:
-        combined = _load_rgba(option_path)
-        if combined.size != (COMBINED_WIDTH, COMBINED_HEIGHT):
-            raise SystemExit(
-                f"{option_path} has size {combined.size}, expected {(COMBINED_WIDTH, COMBINED_HEIGHT)}"
-            )
-
-        option_dir = SLICED_OUTPUT_DIR / option_path.stem
-        option_dir.mkdir(parents=True, exist_ok=True)
-
-        for piece in PIECES:
-            source = _load_rgba(piece.source)
-            source_alpha = source.getchannel("A")
-            left, top, right, bottom = _piece_bounds(piece)
-            crop_box = (
-                left - COMBINED_MIN_X,
-                top - COMBINED_MIN_Y,
-                right - COMBINED_MIN_X,
-                bottom - COMBINED_MIN_Y,
-            )
-            cropped = combined.crop(crop_box).convert("RGBA")
-            cropped.putalpha(source_alpha)
-            out_path = option_dir / f"tori_gate_{piece.name}.png"
-            cropped.save(out_path)
-            saved.append(out_path)
-
-    return saved
+    return slice_options(combined_manifest(), option_paths, SLICED_OUTPUT_DIR)
 
 
 def _key_greenscreen(image: Image.Image) -> Image.Image:
-    rgba = image.convert("RGBA")
-    pixels = rgba.load()
-    width, height = rgba.size
-    for y in range(height):
-        for x in range(width):
-            r, g, b, a = pixels[x, y]
-            if a == 0:
-                continue
-            if g >= 120 and g > r * 1.35 and g > b * 1.35:
-                pixels[x, y] = (r, g, b, 0)
-    return rgba
+    return key_by_rules(image, GREENSCREEN_KEY_RULES)
 
 
 def slice_blockout_option(option_path: Path) -> list[Path]:
@@ -297,6 +294,7 @@ def main() -> int:
     if args.command == "slice":
         for path in slice_variants(Path(args.input_dir)):
             print(path)
+        report_image_cache()
         return 0
     if args.command == "slice-blockout":
         for path in slice_blockout_option(Path(args.option)):
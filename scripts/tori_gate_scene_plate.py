@@ -2,12 +2,18 @@
 from __future__ import annotations
 
 import argparse
+import math
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any
 
 from PIL import Image
 from PIL import ImageDraw
 from PIL import ImageFilter
 
+from image_cache import load_image
+from reskin_imaging import key_by_rules
+
 
 CANVAS_SIZE = (1600, 900)
 SCENE_PLATE = Path("tmp/flattened/tori_gate_scene_plate.png")
@@ -24,9 +30,8 @@ GREENSCREEN = (0, 177, 64, 255)
 
 
 def _load_rgba(path: Path) -> Image.Image:
-    if not path.exists():
-        raise SystemExit(f"Missing image: {path}")
-    return Image.open(path).convert("RGBA")
+    # Read-only: every caller resizes, crops or keys into a new image.
+    return load_image(path, shared=True)
 
 
 def _fit_cover(image: Image.Image, size: tuple[int, int]) -> Image.Image:
@@ -51,26 +56,86 @@ def _repeat_strip(texture: Image.Image, size: tuple[int, int]) -> Image.Image:
 
 
 def _clear_near_black(image: Image.Image, threshold: int = 8) -> Image.Image:
-    rgba = image.convert("RGBA")
-    pixels = rgba.load()
-    width, height = rgba.size
-    for y in range(height):
-        for x in range(width):
-            r, g, b, a = pixels[x, y]
-            if a == 0:
-                continue
-            if r <= threshold and g <= threshold and b <= threshold:
-                pixels[x, y] = (r, g, b, 0)
-    return rgba
-
-
-def _make_polygon_mask(size: tuple[int, int], polygon: list[tuple[int, int]], *, blur: float = 0.0) -> Image.Image:
-    mask = Image.new("L", size, 0)
-    draw = ImageDraw.Draw(mask)
-    draw.polygon(polygon, fill=255)
-    if blur > 0:
-        mask = mask.filter(ImageFilter.GaussianBlur(blur))
-    return mask
+    return key_by_rules(image, [f"r <= {threshold}", f"g <= {threshold}", f"b <= {threshold}"])
+
+
+def _blur_reach(radius: float) -> int:
+    # GaussianBlur is three box-blur passes, each reaching at most radius + 1 pixels.
+    return math.ceil(3 * radius) + 3 if radius > 0 else 0
+
+
+def _points(xy: Any) -> list[tuple[float, float]]:
+    flat: list[float] = []
+    for item in xy:
+        if isinstance(item, (tuple, list)):
+            flat.extend(item)
+        else:
+            flat.append(item)
+    return list(zip(flat[0::2], flat[1::2]))
+
+
+def _shift(xy: Any, dx: int, dy: int) -> Any:
+    if xy and isinstance(xy[0], (tuple, list)):
+        return [(x - dx, y - dy) for x, y in xy]
+    return [v - (dx if i % 2 == 0 else dy) for i, v in enumerate(xy)]
+
+
+@dataclass
+class Layer:
+    """Overlay recorded as ImageDraw calls in canvas coordinates, rendered only where it reaches.
+
+    The layer image covers the shapes' bounding box plus line widths and the blur's reach,
+    clipped to the canvas; everything outside it is transparent, so compositing just that
+    rectangle gives the same plate as a full-canvas overlay.
+    """
+
+    mode: str = "RGBA"
+    blur: float = 0.0
+    shapes: list[tuple[str, Any, dict]] = field(default_factory=list)
+
+    def polygon(self, xy: Any, **style: Any) -> None:
+        self.shapes.append(("polygon", xy, style))
+
+    def rectangle(self, xy: Any, **style: Any) -> None:
+        self.shapes.append(("rectangle", xy, style))
+
+    def line(self, xy: Any, **style: Any) -> None:
+        self.shapes.append(("line", xy, style))
+
+    def region(self, canvas_size: tuple[int, int], include: tuple[int, int, int, int] | None = None) -> tuple[int, int, int, int]:
+        points = [p for _kind, xy, _style in self.shapes for p in _points(xy)]
+        reach = max([int(style.get("width", 1)) for _kind, _xy, style in self.shapes] + [1]) + _blur_reach(self.blur)
+        left = math.floor(min(x for x, _y in points)) - reach
+        top = math.floor(min(y for _x, y in points)) - reach
+        right = math.ceil(max(x for x, _y in points)) + reach + 1
+        bottom = math.ceil(max(y for _x, y in points)) + reach + 1
+        if include is not None:
+            # Keep `include` inside the region (and the blur's reach around it) so a crop of it
+            # blurs exactly like the full canvas would.
+            pad = _blur_reach(self.blur)
+            left, top = min(left, include[0] - pad), min(top, include[1] - pad)
+            right, bottom = max(right, include[2] + pad), max(bottom, include[3] + pad)
+        return max(0, left), max(0, top), min(canvas_size[0], right), min(canvas_size[1], bottom)
+
+    def render(self, box: tuple[int, int, int, int]) -> Image.Image:
+        """The layer over canvas rectangle `box`."""
+        left, top, right, bottom = box
+        image = Image.new(self.mode, (right - left, bottom - top), 0)
+        draw = ImageDraw.Draw(image)
+        for kind, xy, style in self.shapes:
+            getattr(draw, kind)(_shift(xy, left, top), **style)
+        if self.blur > 0:
+            image = image.filter(ImageFilter.GaussianBlur(self.blur))
+        return image
+
+    def crop(self, canvas_size: tuple[int, int], box: tuple[int, int, int, int]) -> Image.Image:
+        region = self.region(canvas_size, include=box)
+        return self.render(region).crop((box[0] - region[0], box[1] - region[1], box[2] - region[0], box[3] - region[1]))
+
+    def composite_onto(self, canvas: Image.Image) -> None:
+        region = self.region(canvas.size)
+        if region[0] < region[2] and region[1] < region[3]:
+            canvas.alpha_composite(self.render(region), dest=region[:2])
 
 
 def _overlay_silhouette(canvas: Image.Image) -> None:
@@ -102,11 +167,9 @@ def _overlay_silhouette(canvas: Image.Image) -> None:
     for x, y in [(662, 442), (910, 449), (680, 592), (900, 600)]:
         draw.ellipse((x, y, x + 18, y + 18), fill=glow)
 
-    shadow = Image.new("RGBA", canvas.size, (0, 0, 0, 0))
-    shadow_draw = ImageDraw.Draw(shadow)
-    shadow_draw.polygon([(585, 720), (1005, 738), (1125, 852), (545, 852)], fill=(26, 8, 20, 100))
-    shadow = shadow.filter(ImageFilter.GaussianBlur(20))
-    canvas.alpha_composite(shadow)
+    shadow = Layer(blur=20)
+    shadow.polygon([(585, 720), (1005, 738), (1125, 852), (545, 852)], fill=(26, 8, 20, 100))
+    shadow.composite_onto(canvas)
 
 
 def build_scene_plate(*, with_placeholder: bool) -> Path:
@@ -117,7 +180,6 @@ def build_scene_plate(*, with_placeholder: bool) -> Path:
     canvas.alpha_composite(sky)
 
     clouds = _fit_cover(_load_rgba(CLOUDS_SOURCE), (1750, 540))
-    clouds = clouds.resize((1750, 540), Image.Resampling.LANCZOS)
     canvas.alpha_composite(clouds, (-50, 210))
 
     walkway_back = _repeat_strip(_load_rgba(FLOOR_TRIM_SOURCE), (1020, 124))
@@ -128,46 +190,38 @@ def build_scene_plate(*, with_placeholder: bool) -> Path:
     front_trim = front_trim.resize((1760, 210), Image.Resampling.LANCZOS)
     canvas.alpha_composite(front_trim, (-70, 636))
 
-    floor_shadow = Image.new("RGBA", CANVAS_SIZE, (0, 0, 0, 0))
-    floor_shadow_draw = ImageDraw.Draw(floor_shadow)
-    floor_shadow_draw.rectangle((0, 640, 1600, 900), fill=(17, 13, 20, 78))
-    floor_shadow = floor_shadow.filter(ImageFilter.GaussianBlur(10))
-    canvas.alpha_composite(floor_shadow)
+    # Overlays only render and composite the part of the plate they reach.
+    floor_shadow = Layer(blur=10)
+    floor_shadow.rectangle((0, 640, 1600, 900), fill=(17, 13, 20, 78))
+    floor_shadow.composite_onto(canvas)
 
-    path_overlay = Image.new("RGBA", CANVAS_SIZE, (0, 0, 0, 0))
-    path_draw = ImageDraw.Draw(path_overlay)
-    path_draw.polygon([(575, 646), (957, 657), (1430, 888), (663, 888)], fill=(124, 57, 53, 86))
-    path_overlay = path_overlay.filter(ImageFilter.GaussianBlur(4))
-    canvas.alpha_composite(path_overlay)
+    path_overlay = Layer(blur=4)
+    path_overlay.polygon([(575, 646), (957, 657), (1430, 888), (663, 888)], fill=(124, 57, 53, 86))
+    path_overlay.composite_onto(canvas)
 
     shop = _clear_near_black(_load_rgba(CAMINO_SOURCE).crop((300, 120, 1240, 1120)))
     shop_box = (790, 150, 1420, 720)
     shop_layer = _fit_cover(shop, (shop_box[2] - shop_box[0], shop_box[3] - shop_box[1]))
-    wall_fill = Image.new("RGBA", CANVAS_SIZE, (0, 0, 0, 0))
-    wall_fill_draw = ImageDraw.Draw(wall_fill)
-    wall_fill_draw.polygon([(822, 154), (1078, 154), (1420, 720), (990, 720)], fill=(74, 48, 39, 255))
-    canvas.alpha_composite(wall_fill)
-    wall_mask = _make_polygon_mask(
-        CANVAS_SIZE,
-        [(822, 154), (1078, 154), (1420, 720), (990, 720)],
-        blur=1.4,
-    )
-    canvas.paste(shop_layer, (shop_box[0], shop_box[1]), wall_mask.crop(shop_box))
-
-    wall_frame = Image.new("RGBA", CANVAS_SIZE, (0, 0, 0, 0))
-    wall_draw = ImageDraw.Draw(wall_frame)
-    wall_draw.polygon([(812, 145), (1088, 145), (1434, 723), (982, 723)], fill=(52, 30, 24, 150))
-    wall_draw.line((1078, 145, 1428, 723), fill=(28, 16, 15, 235), width=7)
-    wall_draw.line((812, 145, 982, 723), fill=(88, 56, 40, 160), width=4)
-    wall_draw.line((812, 145, 1088, 145), fill=(34, 21, 19, 230), width=4)
-    canvas.alpha_composite(wall_frame)
-
-    rail = Image.new("RGBA", CANVAS_SIZE, (0, 0, 0, 0))
-    rail_draw = ImageDraw.Draw(rail)
-    rail_draw.rectangle((0, 544, 170, 560), fill=(53, 57, 73, 255))
+    wall_polygon = [(822, 154), (1078, 154), (1420, 720), (990, 720)]
+    wall_fill = Layer()
+    wall_fill.polygon(wall_polygon, fill=(74, 48, 39, 255))
+    wall_fill.composite_onto(canvas)
+    wall_mask = Layer(mode="L", blur=1.4)
+    wall_mask.polygon(wall_polygon, fill=255)
+    canvas.paste(shop_layer, (shop_box[0], shop_box[1]), wall_mask.crop(CANVAS_SIZE, shop_box))
+
+    wall_frame = Layer()
+    wall_frame.polygon([(812, 145), (1088, 145), (1434, 723), (982, 723)], fill=(52, 30, 24, 150))
+    wall_frame.line((1078, 145, 1428, 723), fill=(28, 16, 15, 235), width=7)
+    wall_frame.line((812, 145, 982, 723), fill=(88, 56, 40, 160), width=4)
+    wall_frame.line((812, 145, 1088, 145), fill=(34, 21, 19, 230), width=4)
+    wall_frame.composite_onto(canvas)
+
+    rail = Layer()
+    rail.rectangle((0, 544, 170, 560), fill=(53, 57, 73, 255))
     for x in (26, 86, 146):
-        rail_draw.rectangle((x, 518, x + 16, 560), fill=(45, 47, 59, 255))
-    canvas.alpha_composite(rail)
+        rail.rectangle((x, 518, x + 16, 560), fill=(45, 47, 59, 255))
+    rail.composite_onto(canvas)
 
     if with_placeholder:
         _overlay_silhouette(canvas)